@@ -0,0 +1,206 @@
+"""Per-request heap allocation check for request reception and discovery.
+
+Feeds requests through server.AlpacaServer's receive and parse path (a
+stand-in socket hands them to recv_into) and checks that every field the
+handlers use comes out the same as adafruit_httpserver's Request parsing
+them from one bytes object (exits non-zero on a mismatch). Then compares
+time and peak memory allocated per request against the way the server
+used to do it (recv into a scratch buffer, append to a bytes buffer,
+Request(raw)), and the same for discovery.DiscoveryResponder.handle_client
+and for its probe match alone (handle_client now also rate limits).
+With --budget, also exits non-zero if a request takes more than that many
+bytes at peak. --no-find runs the server and discovery as on a port
+without bytearray.find(), which search a bytes copy instead. Runs on CPython with the host/ stand-ins and the
+adafruit_httpserver, adafruit_logging and toml packages installed.
+
+    python bench/alloc.py --budget 2048
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+from errno import EAGAIN
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+import log
+import server
+import discovery
+
+PUT_BODY = b'Position=123.5&ClientID=123&ClientTransactionID=78'
+REQUESTS = {
+    'GET position': b'GET /api/v1/rotator/0/position?ClientID=123&ClientTransactionID=77 HTTP/1.1\r\n'
+                    b'Host: 192.168.0.42:5555\r\nUser-Agent: ASCOM Alpaca Client\r\n'
+                    b'Accept: application/json\r\nConnection: keep-alive\r\n\r\n',
+    'PUT moveabsolute': b'PUT /api/v1/rotator/0/moveabsolute HTTP/1.1\r\n'
+                        b'Host: 192.168.0.42:5555\r\nUser-Agent: ASCOM Alpaca Client\r\n'
+                        b'Accept: application/json\r\n'
+                        b'Content-Type: application/x-www-form-urlencoded\r\n'
+                        b'Content-Length: %d\r\n\r\n' % len(PUT_BODY) + PUT_BODY,
+}
+
+PROBE = b'alpacadiscovery1'
+
+
+class _Server:
+    debug = False
+    request_timeout = 5
+
+
+class _Sock:
+    """Stands in for a non-blocking client socket with ``data`` waiting."""
+    def __init__(self):
+        self.data = b''
+
+    def fileno(self):
+        return 3
+
+    def recv_into(self, buffer, nbytes=0):
+        if not self.data:
+            raise OSError(EAGAIN, 'EAGAIN')
+        n = min(len(self.data), len(buffer), nbytes or len(buffer))
+        buffer[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+    def recvfrom_into(self, buffer):
+        return self.recv_into(buffer), ('192.168.0.10', 40000)
+
+    def sendto(self, data, address):
+        return len(data)
+
+
+class _OldConn:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buf = b''
+
+
+def new_path(conn):
+    server.AlpacaServer._receive(_Server, conn)
+    return server.AlpacaServer._next_request(_Server, conn)
+
+
+_scratch = bytearray(1024)
+
+def old_path(conn):
+    # As the server did before: recv into a scratch buffer, append to the
+    # connection's bytes buffer, then Request() on a copy of the headers
+    try:
+        while True:
+            length = conn.sock.recv_into(_scratch, len(_scratch))
+            conn.buf += _scratch[:length]
+    except OSError:
+        pass
+    body_start = conn.buf.find(b'\r\n\r\n') + 4
+    request = Request(_Server, conn, ('127.0.0.1', 1), conn.buf[:body_start])
+    body_end = body_start + int(request.headers.get_directive('Content-Length', 0))
+    request.body = conn.buf[body_start:body_end]
+    conn.buf = conn.buf[body_end:]
+    return request
+
+
+def fields(request):
+    return (request.method, request.path, str(request.query_params), request.http_version,
+            dict(request.headers.items()), request.body)
+
+
+def check():
+    failed = 0
+    sock = _Sock()
+    conn = server.Connection(sock, ('127.0.0.1', 1), bytearray(server.REQUEST_BUFFER_BYTES))
+    for label, raw in REQUESTS.items():
+        ref = Request(_Server, None, ('127.0.0.1', 1), raw)
+        sock.data = raw
+        got = new_path(conn)
+        if fields(got) != fields(ref):
+            failed += 1
+            print(f'FAIL {label}:\n  {fields(ref)}\n  {fields(got)}')
+    # Two pipelined requests arriving in one read
+    sock.data = REQUESTS['PUT moveabsolute'] + REQUESTS['GET position']
+    first = new_path(conn)
+    second = server.AlpacaServer._next_request(_Server, conn)
+    if first is None or second is None or first.method != 'PUT' or second.method != 'GET' \
+                    or conn.fill != 0:
+        failed += 1
+        print('FAIL pipelined requests')
+    total = len(REQUESTS) + 1
+    print(f'{total - failed}/{total} requests parsed the same')
+    return failed == 0
+
+
+def measure(label, make):
+    n = 20000
+    us = min(timeit.repeat(make, number=n, repeat=7)) / n * 1e6
+    make()                              # Warm up anything cached
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    make()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    print(f'  {label:<10} {us:7.2f} us   {peak:6d} B peak')
+    return peak
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--budget', type=int, help='most bytes one request may allocate at peak')
+    ap.add_argument('--no-find', action='store_true', help='as on a port without bytearray.find()')
+    args = ap.parse_args()
+    if args.no_find:
+        server._find_in_place = discovery._find_in_place = False
+
+    server.logger = discovery.logger = log.Logger('bench')      # The app's, see log.init_logging()
+    discovery.logger.setLevel(logging.INFO)
+    ok = check()
+
+    worst = 0
+    sock = _Sock()
+    conn = server.Connection(sock, ('127.0.0.1', 1), bytearray(server.REQUEST_BUFFER_BYTES))
+    old_conn = _OldConn(sock)
+    for label, raw in REQUESTS.items():
+        print(label)
+        def new():
+            sock.data = raw
+            new_path(conn)
+        def old():
+            sock.data = raw
+            old_path(old_conn)
+        measure('old', old)
+        worst = max(worst, measure('new', new))
+
+    print('discovery probe')
+    disc = discovery.DiscoveryResponder('', 5555)
+    def old_disc():
+        sock.data = PROBE
+        data = bytearray(128)
+        size, address = sock.recvfrom_into(data)
+        if PROBE.decode() in data.decode('ascii'):
+            sock.sendto(disc.alpaca_response.encode(), address)
+    def new_disc():
+        sock.data = PROBE
+        disc._last_reply.clear()        # Not rate limited
+        disc.handle_client(sock)
+    measure('old', old_disc)
+    measure('new', new_disc)
+    print('probe match')
+    data = bytearray(128)
+    data[:len(PROBE)] = PROBE
+    measure('old', lambda: PROBE.decode() in data[:len(PROBE)].decode('ascii'))
+    measure('new', lambda: discovery._contains(data, len(PROBE), PROBE))
+
+    if args.budget is not None:
+        print(f'worst request {worst} B, budget {args.budget} B')
+        if worst > args.budget:
+            ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Status panel refresh time: one GET per member vs the ReadProperties action.
+
+Runs on CPython against a running device (or the device app running on a
+host with host/run.py). Connects the rotator and keeps it moving, then
+refreshes a client status panel (Position, IsMoving, TargetPosition,
+Reverse, Connected) over and over, first with one GET per member and then
+with a single Action('ReadProperties') PUT. Reports p50/p99 refresh time
+and how many of the separate-GET refreshes saw a Position that does not fit
+with the IsMoving/TargetPosition read beside it.
+
+    python bench/batch.py --host 192.168.0.42 -n 300
+"""
+import argparse
+import http.client
+import json
+import time
+from urllib.parse import urlencode
+
+from loopback import percentile
+
+PANEL = ['Position', 'IsMoving', 'TargetPosition', 'Reverse', 'Connected']
+
+
+class Client:
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=5)
+        self.tid = 0
+
+    def call(self, method, member, **fields):
+        self.tid += 1
+        fields.update(ClientID=1, ClientTransactionID=self.tid)
+        path = f'/api/v1/rotator/0/{member}'
+        if method == 'GET':
+            self.conn.request('GET', f'{path}?{urlencode(fields)}')
+        else:
+            self.conn.request('PUT', path, urlencode(fields),
+                              {'Content-Type': 'application/x-www-form-urlencoded'})
+        resp = self.conn.getresponse()
+        reply = json.loads(resp.read())
+        if resp.will_close:
+            self.conn.close()               # http.client reconnects on the next request
+        if reply['ErrorNumber']:
+            raise RuntimeError(f'{member}: {reply["ErrorMessage"]}')
+        return reply.get('Value')
+
+
+def panel_gets(client):
+    return {m: client.call('GET', m.lower()) for m in PANEL}
+
+
+def panel_action(client):
+    reply = client.call('PUT', 'action', ActionName='ReadProperties',
+                        ActionParameters=','.join(PANEL))
+    return {r['Name']: r.get('Value') for r in json.loads(reply)}
+
+
+def keep_moving(client, state):
+    if not state['IsMoving']:
+        client.call('PUT', 'moveabsolute', Position=(state['Position'] + 180.0) % 360.0)
+
+
+def run(client, refresh, n):
+    lat = []
+    torn = 0
+    for _ in range(n):
+        t0 = time.perf_counter()
+        state = refresh(client)
+        lat.append(time.perf_counter() - t0)
+        if not state['IsMoving'] and state['Position'] != state['TargetPosition']:
+            torn += 1                       # Stopped, yet not at the target
+        keep_moving(client, state)
+    return lat, torn
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555)
+    ap.add_argument('-n', '--refreshes', type=int, default=300)
+    args = ap.parse_args()
+
+    client = Client(args.host, args.port)
+    client.call('PUT', 'connected', Connected='True')
+    client.call('PUT', 'moveabsolute', Position=180.0)
+    for label, refresh, trips in (('one GET per member', panel_gets, len(PANEL)),
+                                  ('ReadProperties action', panel_action, 1)):
+        run(client, refresh, 10)            # Warm up
+        lat, torn = run(client, refresh, args.refreshes)
+        print(f'{label:<22} {trips} round trips  p50 {percentile(lat, 50) * 1000:6.2f} ms  '
+              f'p99 {percentile(lat, 99) * 1000:6.2f} ms  inconsistent {torn}/{args.refreshes}')
+    client.call('PUT', 'halt')
+
+
+if __name__ == '__main__':
+    main()
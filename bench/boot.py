@@ -0,0 +1,115 @@
+"""Startup time and memory, source against precompiled modules.
+
+The host stand-in for a board boot: starts the device app with
+host/run.py and times from launch to the first answered request
+(``/management/apiversions``). It then reads the app's own startup time
+from ``/diagnostics/memory``, which is measured from when code.py began,
+and the process's resident and peak memory. It does this --runs times
+each way:
+
+ - source:      every device module compiled from source at each start,
+                as CircuitPython does with .py files
+ - precompiled: device modules loaded already compiled (CPython's .pyc,
+                standing in for the .mpy files host/build.py makes)
+
+The libraries are precompiled both ways, as circup installs them. On the
+board, compare the "Started in" log line or ``/diagnostics/memory``
+(StartupSeconds, StartupMemFree) with the .py files on the drive and
+then with the host/build.py bundle.
+
+    python bench/boot.py --runs 5
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, '..')
+DEVICE_DIR = os.path.join(ROOT, 'device')
+sys.path[:0] = [os.path.join(ROOT, 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+from config import Config
+from loopback import percentile
+
+
+def library_dirs() -> list:
+    import adafruit_httpserver, adafruit_logging, toml
+    dirs = [os.path.join(ROOT, 'host')]
+    for mod in (adafruit_httpserver, adafruit_logging, toml):
+        path = mod.__file__
+        dirs.append(os.path.dirname(path) if path.endswith('__init__.py') else path)
+    return dirs
+
+
+def compile_into(prefix: str, paths: list):
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=prefix)
+    subprocess.run([sys.executable, '-m', 'compileall', '-q'] + paths, env=env, check=True)
+
+
+def memory(pid: int) -> tuple:
+    rss = hwm = None
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+            elif line.startswith('VmHWM:'):
+                hwm = int(line.split()[1])
+    return rss, hwm
+
+
+def start_once(prefix: str, port: int, timeout: float) -> tuple:
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=prefix, PYTHONDONTWRITEBYTECODE='1')
+    base = f'http://127.0.0.1:{port}'
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'host', 'run.py')], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(base + '/management/apiversions', timeout=1).read()
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - t0 > timeout:
+                    raise SystemExit('the app did not start, try host/run.py by hand')
+                time.sleep(0.002)
+        first = time.perf_counter() - t0
+        stats = json.loads(urllib.request.urlopen(base + '/diagnostics/memory', timeout=1).read())
+        return first, stats['StartupSeconds'], memory(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-n', '--runs', type=int, default=5)
+    ap.add_argument('--timeout', type=float, default=20.0, help='seconds to wait for the app to answer')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as precompiled:
+        libs = library_dirs()
+        compile_into(source, libs)
+        compile_into(precompiled, libs + [DEVICE_DIR])
+        print(f'{"":<12} {"first request":>14} {"app startup":>12} {"RSS":>9} {"peak RSS":>9}   (medians of {args.runs})')
+        for label, prefix in (('source', source), ('precompiled', precompiled)):
+            runs = [start_once(prefix, Config.port, args.timeout) for _ in range(args.runs)]
+            first = percentile([r[0] for r in runs], 50)
+            startup = percentile([r[1] for r in runs], 50)
+            rss = percentile([r[2][0] for r in runs], 50)
+            hwm = percentile([r[2][1] for r in runs], 50)
+            print(f'{label:<12} {first * 1000:>11.1f} ms {startup * 1000:>9.1f} ms {rss:>6} kB {hwm:>6} kB')
+
+
+if __name__ == '__main__':
+    main()
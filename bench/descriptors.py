@@ -0,0 +1,230 @@
+"""Member table against the class-per-member rotator responders.
+
+Loads the rotator module as it was before members.MemberTable (one
+responder class per member, from git) next to the current one. First
+sends the same sequence of requests to both, each with its own device,
+and checks the responses are the same bytes apart from the server
+transaction ID (exits non-zero on a failure). The sequence covers every
+member connected and not, good, bad, missing and out of range
+parameters, and bad device numbers. The out of range message now names
+the field ("0 <= position < 360", was "0 <= pos < 360"); that is
+allowed for. Driver errors are not compared: their traceback names the
+responder, and two of the old messages had typos ("Camera.Devicestate
+failed", "Rotator.IsMovingfailed") that the table no longer makes.
+
+Then reports the heap taken by importing each module (tracemalloc, the
+table's figure includes members.py), the size of the compiled code, and
+the time per request through each for a few members.
+
+    python bench/descriptors.py
+"""
+import argparse
+import gc
+import marshal
+import os
+import re
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+import types
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+import exceptions
+import shr
+import stream
+import rotatordevice
+
+_stid = re.compile(rb'"ServerTransactionID": \d+')
+_length = re.compile(rb'(?i)content-length: \d+')
+
+
+class _Server:
+    debug = False
+
+
+class _Sink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def send(self, data):
+        self.data += data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class _FixedTime:
+    """Stands in for the time module so TimeStamp does not tick over between the two"""
+    @staticmethod
+    def localtime():
+        return time.struct_time((2024, 2, 17, 0, 0, 10, 5, 48, 0))
+
+
+def request(method, member, fields='', devnum='0', sink=None):
+    path = f'/api/v1/rotator/{devnum}/{member}'
+    if method == 'GET':
+        raw = f'GET {path}?ClientID=1&ClientTransactionID=9{"&" + fields if fields else ""} HTTP/1.1\r\n' \
+              'Host: 127.0.0.1:5555\r\n\r\n'
+    else:
+        body = f'{fields + "&" if fields else ""}ClientID=1&ClientTransactionID=9'
+        raw = f'PUT {path} HTTP/1.1\r\nHost: 127.0.0.1:5555\r\n' \
+              f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n{body}'
+    return Request(_Server, sink, ('127.0.0.1', 1), raw.encode())
+
+
+def old_source():
+    """rotator.py from the commit before members.py was added (HEAD if it is not yet)"""
+    added = subprocess.run(['git', 'log', '--diff-filter=A', '--format=%H', '--', 'members.py'],
+                           capture_output=True, text=True, check=True).stdout.split()
+    rev = f'{added[-1]}^' if added else 'HEAD'
+    return subprocess.run(['git', 'show', f'{rev}:device/rotator.py'],
+                          capture_output=True, text=True, check=True).stdout
+
+
+def load(name, source):
+    mod = types.ModuleType(name)
+    mod.__file__ = name + '.py'
+    exec(compile(source, mod.__file__, 'exec'), mod.__dict__)
+    return mod
+
+
+def old_handler(mod):
+    def handle(req, devnum):
+        member = getattr(mod, req.path.rsplit('/', 1)[1])
+        return (member.on_get if req.method == 'GET' else member.on_put)(req, devnum)
+    return handle
+
+
+GETS = ['description', 'driverinfo', 'interfaceversion', 'driverversion', 'name', 'supportedactions',
+        'canreverse', 'connected', 'connecting', 'devicestate', 'ismoving', 'mechanicalposition',
+        'position', 'reverse', 'stepsize', 'targetposition']
+
+SEQUENCE = (
+    [('GET', m, '') for m in GETS] +
+    [('PUT', m, '') for m in ('commandblind', 'commandbool', 'commandstring', 'halt')] +
+    [('PUT', 'moveabsolute', 'Position=10'), ('PUT', 'reverse', 'Reverse=true'),
+     ('PUT', 'connected', ''), ('PUT', 'connected', 'Connected=maybe'), ('PUT', 'connected', 'connected=true'),
+     ('PUT', 'connected', 'Connected=true')] +
+    [('GET', m, '') for m in GETS] +
+    [('PUT', 'reverse', ''), ('PUT', 'reverse', 'Reverse=yes'), ('PUT', 'reverse', 'Reverse=True'),
+     ('GET', 'reverse', ''), ('PUT', 'reverse', 'Reverse=false')] +
+    [r for m in ('moveabsolute', 'movemechanical', 'sync')     # Halt after each, Sync refuses while moving
+       for r in [('PUT', m, p) for p in ('', 'Position=abc', 'Position=360', 'Position=-0.5',
+                                         'Position=359.9', 'Position=1e400', 'position=12',
+                                         'Position=123.5')] + [('PUT', 'halt', '')]] +
+    [('PUT', 'move', p) for p in ('Position=x', 'Position=-30', 'Position=500', 'Position=45')] +
+    [('GET', 'targetposition', ''), ('GET', 'position', ''), ('PUT', 'halt', ''),
+     ('GET', 'ismoving', ''), ('GET', 'devicestate', ''),
+     ('PUT', 'disconnect', ''), ('GET', 'connected', ''), ('PUT', 'connect', ''),
+     ('GET', 'connecting', ''), ('GET', 'connected', ''), ('PUT', 'connected', 'Connected=false'),
+     ('GET', 'position', ''), ('PUT', 'sync', 'Position=10')]
+)
+
+BAD_PATHS = [('GET', 'position', '', '1'), ('GET', 'position', '', 'x'),
+             ('PUT', 'halt', '', '1'), ('GET', 'position', 'ClientID=-1', '0')]
+
+
+def respond(handle, method, member, fields, devnum='0'):
+    sink = _Sink()
+    handle(request(method, member, fields, devnum, sink), devnum)._send()
+    return _stid.sub(b'"ServerTransactionID": N', bytes(sink.data))
+
+
+def check(logger, old, new):
+    failures = []
+    for mod in (old, new):
+        mod.logger = logger
+        mod.time = _FixedTime
+        mod.start_rot_device(logger)
+    handlers = ((old_handler(old), new.members.on_request))
+    for method, member, fields, *devnum in SEQUENCE + BAD_PATHS:
+        devnum = devnum[0] if devnum else '0'
+        got = [respond(h, method, member, fields, devnum) for h in handlers]
+        got[0] = _length.sub(b'', got[0].replace(b'<= pos <', b'<= position <'))
+        got[1] = _length.sub(b'', got[1])
+        if got[0] != got[1]:
+            failures.append(f'{method} {member} {fields!r} devnum {devnum}:\n'
+                            f'    classes {got[0]!r}\n    table   {got[1]!r}')
+    for f in failures:
+        print('FAIL', f)
+    print(f'{len(SEQUENCE) + len(BAD_PATHS)} requests compared' if not failures
+          else f'{len(failures)} check(s) failed')
+    return not failures
+
+
+def import_cost(source, name):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    mod = load(name, source)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return mod, after - before
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-n', '--number', type=int, default=20000, help='requests timed per member')
+    args = ap.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.CRITICAL)
+    shr.logger = exceptions.logger = stream.logger = logger
+
+    old_src = old_source()
+    with open('members.py') as f:
+        members_src = f.read()
+    with open('rotator.py') as f:
+        new_src = f.read()
+
+    old, old_heap = import_cost(old_src, 'rotator_classes')
+    sys.modules.pop('members', None)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    import members
+    new = load('rotator_table', new_src)
+    gc.collect()
+    new_heap = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    ok = check(logger, old, new)
+
+    code = [len(marshal.dumps(compile(old_src, 'rotator.py', 'exec'))),
+            len(marshal.dumps(compile(members_src, 'members.py', 'exec')))
+            + len(marshal.dumps(compile(new_src, 'rotator.py', 'exec')))]
+    print(f'{"":<22} {"classes":>10} {"table":>10}')
+    print(f'{"heap after import":<22} {old_heap:>8} B {new_heap:>8} B')
+    print(f'{"compiled code":<22} {code[0]:>8} B {code[1]:>8} B')
+
+    handlers = (old_handler(old), new.members.on_request)
+    # The old layout reached each class by route, not by name; time its
+    # responder directly so the lookup above is not counted against it
+    direct = {m: (getattr(old, m).on_get if v == 'GET' else getattr(old, m).on_put) for v, m, _ in (
+              ('GET', 'position', ''), ('GET', 'description', ''), ('PUT', 'moveabsolute', ''),
+              ('PUT', 'connected', ''))}
+    for mod in (old, new):
+        mod.rot_dev.connected = True
+    for method, member, fields in (('GET', 'position', ''), ('GET', 'description', ''),
+                                   ('PUT', 'moveabsolute', 'Position=123.5'),
+                                   ('PUT', 'connected', 'Connected=true')):
+        us = []
+        for handle in (direct[member], handlers[1]):
+            def one():
+                handle(request(method, member, fields), '0')
+            us.append(min(timeit.repeat(one, number=args.number, repeat=3)) / args.number * 1e6)
+        print(f'{method} {member:<18} {us[0]:>7.2f} us {us[1]:>7.2f} us')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
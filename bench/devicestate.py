@@ -0,0 +1,239 @@
+"""DeviceState snapshot checks and benchmark.
+
+Checks, on a simulated clock, that the shared DeviceState snapshot
+ - is byte for byte the response the per-request code used to build,
+ - always holds mutually consistent values during a move (Position is
+   MechanicalPosition plus the sync offset, IsMoving matches the engine),
+ - is retaken as soon as a move starts or stops, whatever its age,
+ - is taken at most once per state_interval while several clients poll,
+ - is what Action('ReadProperties') returns, without a snapshot of its own.
+Then times a DeviceState GET both ways. Exits non-zero on any failure.
+Runs on CPython with the adafruit_httpserver, adafruit_logging and toml
+packages installed.
+
+    python bench/devicestate.py --clients 8 --poll-hz 10
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+import exceptions
+import shr
+import rotator
+from rotatordevice import RotatorDevice
+
+GET_RAW = (b'GET /api/v1/rotator/0/devicestate?ClientID=1&ClientTransactionID=7 HTTP/1.1\r\n'
+           b'Host: 127.0.0.1:5555\r\n\r\n')
+
+failures = 0
+
+
+def check(cond, what):
+    global failures
+    if not cond:
+        failures += 1
+        print(f'FAIL {what}')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FixedTime:
+    """Stands in for the time module so TimeStamp does not tick over mid-check."""
+    @staticmethod
+    def localtime():
+        return time.struct_time((2024, 2, 17, 0, 0, 10, 5, 48, 0))
+
+
+class _Server:
+    debug = False
+
+
+class _Sink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def send(self, data):
+        self.data += data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def request(sink=None):
+    return Request(_Server, sink or _Sink(), ('127.0.0.1', 1), GET_RAW)
+
+
+def old_devicestate(req):
+    # The responder as it was, reading each property separately
+    dev = rotator.rot_dev
+    now = rotator.time.localtime()
+    asctime = (f"{now.tm_year}-{now.tm_mon:02d}-{now.tm_mday:02d} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}")
+    val = [shr.StateValue('IsMoving', dev.is_moving),
+           shr.StateValue('MechanicalPosition', dev.mechanical_position),
+           shr.StateValue('Position', dev.position),
+           shr.StateValue('TimeStamp', asctime)]
+    return shr.AlpacaResponse(req, shr.PropertyResponse(val, req))
+
+
+def new_devicestate(req):
+    return rotator.members.on_request(req, '0')
+
+
+def body(response):
+    response._send()
+    raw = bytes(response._request.connection.data)
+    return raw[raw.index(b'\r\n\r\n') + 4:]
+
+
+def state(response):
+    return {sv['Name']: sv['Value'] for sv in json.loads(body(response))['Value']}
+
+
+def setup(logger, clock, interval):
+    rotator.rot_dev = dev = RotatorDevice(logger, clock)
+    dev.steps_per_sec = 6
+    dev.step_size = 1.0
+    dev.connected = True
+    rotator._state = shr.StateSnapshot(rotator._capture_state, interval, clock)
+    return dev
+
+
+def check_bytes(logger):
+    clock = Clock()
+    dev = setup(logger, clock, 0.0)     # Fresh snapshot for every read
+    dev.Sync(30.0)
+    dev.MoveAbsolute(40.0)
+    for _ in range(20):
+        clock.now += 0.05
+        dev.tick(clock.now)
+        shr._stid = 99
+        old = body(old_devicestate(request()))
+        shr._stid = 99
+        new = body(new_devicestate(request()))
+        check(old == new, f'bytes differ:\n  {old!r}\n  {new!r}')
+
+
+def check_consistent(logger, rng):
+    clock = Clock()
+    dev = setup(logger, clock, 0.1)
+    dev.Sync(350.0)                     # Offset so Position wraps through 0/360
+    dev.MoveAbsolute(20.0)
+    target = None
+    for _ in range(2000):
+        clock.now += rng.uniform(0.0, 0.04)
+        dev.tick(clock.now)
+        if rng.random() < 0.01:
+            target = rng.uniform(0.0, 360.0)
+            dev.MoveAbsolute(target)
+            s = state(new_devicestate(request()))
+            check(s['IsMoving'] == dev.state()[0], 'IsMoving stale right after a move started')
+        s = state(new_devicestate(request()))
+        check(abs((s['MechanicalPosition'] + dev._pos_offset) % 360.0 - s['Position']) < 1e-9,
+              f'Position {s["Position"]} does not match MechanicalPosition {s["MechanicalPosition"]}')
+        if not s['IsMoving']:
+            check(abs(s['MechanicalPosition'] - dev._tgt_mech_pos) < 1e-9,
+                  'IsMoving false before the target was reached')
+    check(not dev._stopped or not state(new_devicestate(request()))['IsMoving'],
+          'IsMoving still true after the move stopped')
+    dev.Halt()
+    check(not state(new_devicestate(request()))['IsMoving'], 'IsMoving stale after Halt()')
+
+
+def check_read_properties(logger):
+    clock = Clock()
+    dev = setup(logger, clock, 0.1)
+    dev.MoveAbsolute(90.0)
+    names = ['IsMoving', 'MechanicalPosition', 'Position']
+    for _ in range(40):
+        clock.now += 0.03
+        dev.tick(clock.now)
+        s = state(new_devicestate(request()))
+        captures = rotator._state.captures
+        props = {p['Name']: p['Value'] for p in rotator._read_properties(names)}
+        check(props == {n: s[n] for n in names}, f'ReadProperties {props} differs from DeviceState {s}')
+        check(rotator._state.captures == captures, 'ReadProperties took its own snapshot')
+
+
+def check_coalesced(logger, rng, clients, poll_hz, interval, seconds):
+    clock = Clock()
+    dev = setup(logger, clock, interval)
+    dev.MoveAbsolute(180.0)
+    # Each client polls at poll_hz with a random phase and some jitter
+    due = [clock.now + rng.uniform(0.0, 1.0 / poll_hz) for _ in range(clients)]
+    end = clock.now + seconds
+    while True:
+        i = min(range(clients), key=due.__getitem__)
+        if due[i] > end:
+            break
+        clock.now = due[i]
+        dev.tick(clock.now)
+        new_devicestate(request())
+        due[i] += rng.uniform(0.8, 1.2) / poll_hz
+    snap = rotator._state
+    bound = seconds / interval + dev.state_changes + 1
+    check(snap.captures <= bound, f'{snap.captures} snapshots, expected at most {bound:.0f}')
+    print(f'{clients} clients at {poll_hz} Hz for {seconds:.0f} s: {snap.reads} reads, '
+          f'{snap.captures} snapshots ({snap.reads / snap.captures:.1f} reads per snapshot)')
+
+
+def measure(logger, interval):
+    clock = Clock()
+    setup(logger, clock, interval)
+    req = request(_Null())
+    n = 20000
+    for label, fn in (('per-request DeviceState', old_devicestate),
+                      ('shared snapshot DeviceState', new_devicestate)):
+        us = min(timeit.repeat(lambda: fn(req)._send(), number=n, repeat=3)) / n * 1e6
+        print(f'{label:<30} {us:6.2f} us/response')
+
+
+class _Null:
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--clients', type=int, default=8)
+    ap.add_argument('--poll-hz', type=float, default=10.0)
+    ap.add_argument('--interval', type=float, default=0.1, help='state_interval (sec)')
+    ap.add_argument('-t', '--seconds', type=float, default=30.0)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+
+    logger = logging.getLogger('devicestate')
+    logger.setLevel(logging.WARNING)
+    shr.logger = exceptions.logger = rotator.logger = logger
+    rotator.time = _FixedTime
+    rng = random.Random(args.seed)
+    check_bytes(logger)
+    check_consistent(logger, rng)
+    check_read_properties(logger)
+    check_coalesced(logger, rng, args.clients, args.poll_hz, args.interval, args.seconds)
+    measure(logger, args.interval)
+    print('ok' if failures == 0 else f'{failures} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
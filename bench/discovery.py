@@ -0,0 +1,247 @@
+"""Discovery responder checks and storm test.
+
+First checks DiscoveryResponder with a stand-in socket and a simulated
+clock (exits non-zero on a failure):
+ - a probe is answered with the prepared reply, other datagrams are not
+ - one address is answered at most once per min_interval, also when it
+   comes again as an IPv4-mapped IPv6 address
+ - no more than MAX_SOURCES addresses are tracked, and a new address is
+   answered again once an old one has gone quiet
+
+Then, unless --no-live, runs against the device app running on a host
+with host/run.py (or a device). Times discovery over IPv4 and over the
+IPv6 multicast group, and checks that an IPv4 broadcast probe gets exactly
+one reply (a dual-stack IPv6 socket must not answer it too). It then
+floods the responder with probes from one address for --seconds while a
+client polls over HTTP, and reports the replies sent and the HTTP latency
+with and without the flood.
+
+    python bench/discovery.py --host 192.168.0.42 --port 5555 --ifname wlan0 -t 5
+"""
+import argparse
+import http.client
+import os
+import socket
+import sys
+import threading
+import time
+from errno import EAGAIN
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+import discovery
+from loopback import percentile
+
+PROBE = b'alpacadiscovery1'
+GROUP_V6 = 'ff12::a1:9aca'
+
+
+class _Sock:
+    """Stands in for the discovery socket. Keeps what was sent."""
+    def __init__(self):
+        self.waiting = []
+        self.sent = []
+
+    def recvfrom_into(self, buffer):
+        if not self.waiting:
+            raise OSError(EAGAIN, 'EAGAIN')
+        data, address = self.waiting.pop(0)
+        buffer[:len(data)] = data
+        return len(data), address
+
+    def sendto(self, data, address):
+        self.sent.append((bytes(data), address))
+        return len(data)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def check():
+    failures = []
+
+    def check_that(ok, what):
+        if not ok:
+            failures.append(what)
+
+    clock = _Clock()
+    discovery.monotonic = clock
+    disc = discovery.DiscoveryResponder('', 5555)
+    sock = _Sock()
+
+    def probe(host, data=PROBE):
+        sock.waiting.append((data, (host, 40000)))
+        before = len(sock.sent)
+        disc.handle_client(sock)
+        return len(sock.sent) > before
+
+    check_that(probe('10.0.0.1'), 'probe not answered')
+    check_that(sock.sent[-1][0] == b'{"AlpacaPort": 5555}', f'reply was {sock.sent[-1][0]!r}')
+    check_that(not probe('10.0.0.2', b'alpacadiscovery'), 'short probe answered')
+    check_that(not probe('10.0.0.3', b'hello world'), 'other datagram answered')
+    check_that(probe('10.0.0.4', PROBE + b'\n'), 'probe with trailing newline not answered')
+
+    check_that(not probe('10.0.0.1'), 'second probe within min_interval answered')
+    check_that(not probe('::ffff:10.0.0.1'), 'same client as IPv4-mapped address answered again')
+    clock.now += disc.min_interval
+    check_that(probe('10.0.0.1'), 'probe after min_interval not answered')
+
+    clock.now += disc.min_interval
+    hosts = [f'10.0.1.{i}' for i in range(discovery.MAX_SOURCES)]
+    check_that(all(probe(h) for h in hosts), 'not every tracked address answered')
+    check_that(len(disc._last_reply) <= discovery.MAX_SOURCES,
+               f'{len(disc._last_reply)} addresses tracked')
+    check_that(not probe('10.0.2.1'), 'new address answered with the table full of recent ones')
+    clock.now += disc.min_interval
+    check_that(probe('10.0.2.1'), 'new address not answered once the others went quiet')
+    check_that(disc.limited == 3 and disc.ignored == 2,
+               f'counters limited={disc.limited} ignored={disc.ignored}, expected 3 and 2')
+
+    for f in failures:
+        print('FAIL', f)
+    print('checks ok' if not failures else f'{len(failures)} check(s) failed')
+    return not failures
+
+
+def time_probe(family, address, timeout=1.0):
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        t0 = time.perf_counter()
+        sock.sendto(PROBE, address)
+        reply, _ = sock.recvfrom(256)
+        return time.perf_counter() - t0, reply
+    except OSError:
+        return None, None
+    finally:
+        sock.close()
+
+
+def broadcast_replies(address, wait=1.0) -> int:
+    """Replies to one probe sent to the broadcast ``address`` within ``wait`` seconds"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.sendto(PROBE, address)
+    replies = 0
+    end = time.monotonic() + wait
+    try:
+        while True:
+            sock.settimeout(max(0.001, end - time.monotonic()))
+            sock.recvfrom(256)
+            replies += 1
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    return replies
+
+
+def flood(address, stop, counts):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    while not stop.is_set():
+        try:
+            sock.sendto(PROBE, address)
+            counts[0] += 1
+        except BlockingIOError:
+            pass
+        try:
+            while True:
+                sock.recv(256)
+                counts[1] += 1
+        except BlockingIOError:
+            pass
+        time.sleep(0.0002)
+    time.sleep(0.1)
+    try:
+        while True:
+            sock.recv(256)
+            counts[1] += 1
+    except BlockingIOError:
+        pass
+    sock.close()
+
+
+def http_latency(host, port, seconds):
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    lat = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        conn.request('GET', '/api/v1/rotator/0/position?ClientID=1&ClientTransactionID=1')
+        conn.getresponse().read()
+        lat.append(time.perf_counter() - t0)
+    conn.close()
+    return lat
+
+
+def live(args) -> bool:
+    # Wait out the rate limit between probes, they all come from this host
+    gap = discovery.Config.discovery_min_interval
+    for label, family, address in (
+            ('IPv4', socket.AF_INET, (args.host, discovery.DISCOVERY_PORT)),
+            ('IPv6 multicast', socket.AF_INET6, (GROUP_V6, discovery.DISCOVERY_PORT, 0,
+                                                 socket.if_nametoindex(args.ifname)))):
+        lat = []
+        for _ in range(10):
+            time.sleep(gap)
+            elapsed, _ = time_probe(family, address)
+            if elapsed is not None:
+                lat.append(elapsed)
+        line = f'{label + ":":<20} {len(lat)}/10 answered'
+        if lat:
+            line += f', p50 {percentile(lat, 50) * 1000:.2f} ms'
+        print(line)
+    time.sleep(gap)
+    replies = broadcast_replies((args.broadcast, discovery.DISCOVERY_PORT))
+    print(f'{"IPv4 broadcast:":<20} {replies} replies to one probe')
+    ok = replies == 1
+    if not ok:
+        print(f'FAIL {replies} replies to one IPv4 broadcast probe, expected 1')
+
+    quiet = http_latency(args.host, args.port, args.seconds)
+    stop = threading.Event()
+    counts = [0, 0]
+    t = threading.Thread(target=flood, daemon=True,
+                         args=((args.host, discovery.DISCOVERY_PORT), stop, counts))
+    t.start()
+    busy = http_latency(args.host, args.port, args.seconds)
+    stop.set()
+    t.join()
+    print(f'flood:               {counts[0]} probes sent, {counts[1]} replies in {args.seconds:.0f} s')
+    for label, lat in (('HTTP quiet', quiet), ('HTTP during flood', busy)):
+        print(f'{label + ":":<20} {len(lat):6d} requests   p50 {percentile(lat, 50) * 1000:.2f} ms'
+              f'   p99 {percentile(lat, 99) * 1000:.2f} ms')
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555, help='HTTP port')
+    ap.add_argument('--ifname', default='eth0',
+                    help='interface to send the IPv6 multicast probe on (lo has no multicast)')
+    ap.add_argument('--broadcast', default='255.255.255.255', help='address to send the broadcast probe to')
+    ap.add_argument('-t', '--seconds', type=float, default=5.0)
+    ap.add_argument('--no-live', action='store_true', help='only run the checks')
+    args = ap.parse_args()
+
+    discovery.logger = logging.getLogger('bench')
+    discovery.logger.setLevel(logging.INFO)
+    ok = check()
+    discovery.monotonic = time.monotonic
+    if not args.no_live:
+        ok = live(args) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
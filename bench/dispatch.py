@@ -0,0 +1,87 @@
+"""Route dispatch microbenchmark.
+
+Registers 30, 100 and 300 Alpaca members for one device type and times
+handler lookup with Server's linear pattern scan against AlpacaServer's
+dispatch table. Runs on CPython with the adafruit_httpserver package
+installed; nothing is sent over the network.
+
+First checks that the table finds the same routes as the scan, and that
+a member served under two API versions dispatches each to its own
+handler (exits non-zero on a failure).
+
+    python bench/dispatch.py
+"""
+import os
+import sys
+import timeit
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+from adafruit_httpserver import Server, Route, GET, PUT
+from server import AlpacaServer
+
+
+def handler(request, devnum=None):
+    return None
+
+
+def build(cls, members):
+    srv = cls(None)
+    srv.add_routes([Route('/management/apiversions', GET, handler)])
+    srv.add_routes([Route(f'/api/v1/telescope/<devnum>/member{i}', GET if i % 2 else PUT, handler)
+                    for i in range(members)])
+    return srv
+
+
+def check():
+    failures = []
+
+    def check_that(ok, what):
+        if not ok:
+            failures.append(what)
+
+    def versioned(version):
+        return lambda request, devnum=None: (version, devnum)
+
+    srv = AlpacaServer(None)
+    srv.add_routes([Route('/api/v1/rotator/<devnum>/position', GET, versioned('v1')),
+                    Route('/api/v2/rotator/<devnum>/position', GET, versioned('v2'))])
+    for version in ('v1', 'v2'):
+        found = srv._find_handler(GET, f'/api/{version}/rotator/0/position')
+        check_that(found is not None and found(None) == (version, '0'),
+                   f'/api/{version}/rotator/0/position dispatched to {found and found(None)}')
+    check_that(srv._find_handler(GET, '/api/v3/rotator/0/position') is None, 'unserved API version found')
+
+    linear, table = build(Server, 30), build(AlpacaServer, 30)
+    for i in range(30):
+        for method in (GET, PUT):
+            path = f'/api/v1/telescope/0/member{i}'
+            check_that((linear._find_handler(method, path) is None) == (table._find_handler(method, path) is None),
+                       f'{method} {path} found by one lookup only')
+
+    for f in failures:
+        print('FAIL', f)
+    print('checks ok' if not failures else f'{len(failures)} check(s) failed')
+    return not failures
+
+
+def main():
+    ok = check()
+    reps = 2000
+    print(f'{"members":>8} {"linear us":>10} {"table us":>10} {"speedup":>8}')
+    for members in (30, 100, 300):
+        paths = [(GET if i % 2 else PUT, f'/api/v1/telescope/0/member{i}') for i in range(members)]
+        results = []
+        for cls in (Server, AlpacaServer):
+            srv = build(cls, members)
+            find = srv._find_handler
+            t = timeit.timeit(lambda: [find(m, p) for m, p in paths], number=reps // members + 1)
+            results.append(t / ((reps // members + 1) * members) * 1e6)
+        print(f'{members:>8} {results[0]:>10.2f} {results[1]:>10.2f} {results[0] / results[1]:>7.1f}x')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Alpaca JSON response encoding check and benchmark.
+
+Checks that shr.AlpacaResponse sends exactly the bytes JSONResponse sent
+for the same PropertyResponse/MethodResponse (exits non-zero on a
+mismatch), then compares the two for time and peak memory allocated per
+response. Runs on CPython with the adafruit_httpserver, adafruit_logging
+and toml packages installed.
+
+    python bench/encode.py
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request, JSONResponse
+import exceptions
+import shr
+
+GET_RAW = (b'GET /api/v1/rotator/0/devicestate?ClientID=123&ClientTransactionID=321 HTTP/1.1\r\n'
+           b'Host: 127.0.0.1:5555\r\n\r\n')
+
+STATE = [shr.StateValue('IsMoving', False), shr.StateValue('MechanicalPosition', 123.4),
+         shr.StateValue('Position', 93.39999999999999), shr.StateValue('TargetPosition', 0.0),
+         shr.StateValue('TimeStamp', '2024-02-17T00:00:10.455Z')]
+VALUES = [True, False, 0, -7, 2**40, 1.0, 0.1, 1e-07, 123.456, 1e22, float('nan'),
+          float('inf'), '', 'Sample Rotator', 'quote " and \\ and \n', 'café ☃',
+          [], ['MyAction', 'YourAction'], [1], STATE, [STATE[0], 3, 'x'],
+          {'ServerName': 'Alpyca32', 'Location': 'Earth'},
+          [{'DeviceName': 'Sample Rotator', 'DeviceNumber': 0}], 'x' * 2000]
+
+
+class _Server:
+    debug = False
+
+
+class _Sink:
+    """Stands in for the client connection and keeps what was sent."""
+    def __init__(self):
+        self.data = bytearray()
+
+    def send(self, data):
+        self.data += data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def request():
+    return Request(_Server, _Sink(), ('127.0.0.1', 1), GET_RAW)
+
+
+def responses():
+    yield shr.MethodResponse(request())
+    yield shr.MethodResponse(request(), exceptions.InvalidValueException('Position x not a valid float.'))
+    for value in VALUES:
+        yield shr.PropertyResponse(value, request())
+
+
+def sent(response):
+    response._send()
+    return bytes(response._request.connection.data)
+
+
+def check():
+    failed = 0
+    total = 0
+    for resp in responses():
+        total += 1
+        old = sent(JSONResponse(resp_req(resp), resp.dict))
+        new = sent(shr.AlpacaResponse(resp_req(resp), resp))
+        if old != new:
+            failed += 1
+            print(f'FAIL {getattr(resp, "Value", None)!r}:\n  {old!r}\n  {new!r}')
+    print(f'{total - failed}/{total} responses byte-for-byte identical')
+    return failed == 0
+
+
+def resp_req(resp):
+    return request()                    # Fresh sink for each send
+
+
+def measure(label, make):
+    n = 20000
+    us = min(timeit.repeat(make, number=n, repeat=3)) / n * 1e6
+    make()                              # Warm up anything cached
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    make()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    print(f'{label:<28} {us:6.2f} us/response  {peak:5d} bytes peak allocation')
+
+
+def main():
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.CRITICAL)
+    shr.logger = exceptions.logger = logger
+    ok = check()
+    req = Request(_Server, _Null(), ('127.0.0.1', 1), GET_RAW)
+    for name, value in (('position', 123.4), ('devicestate', STATE)):
+        resp = shr.PropertyResponse(value, req)
+        measure(f'json.dumps {name}', lambda: json.dumps(resp.dict).encode('utf-8'))
+        measure(f'encode_response {name}', lambda: shr.encode_response(resp))
+        measure(f'JSONResponse {name}', lambda: JSONResponse(req, resp.dict)._send())
+        measure(f'AlpacaResponse {name}', lambda: shr.AlpacaResponse(req, resp)._send())
+    sys.exit(0 if ok else 1)
+
+
+class _Null:
+    """Client connection that throws the response away."""
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""Event stream checks, and polling vs streaming cost.
+
+First checks StreamHub on a simulated clock with stand-in connections
+(exits non-zero on a failure). The checks cover:
+ - the first event goes out at once
+ - a change makes next_due() now, so the I/O loop does not sleep through it
+ - changes within a stream's MinInterval fold into one event with the
+   latest state
+ - a heartbeat goes out after Heartbeat seconds of silence
+ - a slow reader's backlog holds back new events, and a reader that has
+   read nothing by the next heartbeat is cut off
+ - every rotator step, start and stop reaches the stream through the
+   RotatorDevice change hook
+
+Then, unless --no-live, runs against a running device (or the device app
+running on a host with host/run.py). While the rotator makes a move, it
+compares polling Position and IsMoving at --poll-hz with one event
+stream, in requests, bytes received, and answers that carried news.
+With --pid it also reads the server's CPU time. Then it makes --moves
+short moves with a MinInterval 0 stream open and reports how late the
+start, step and stop events arrive against when the move was asked for
+and the step schedule (steps_per_sec in config.toml). It fails if the
+99th percentile is over --late-ms.
+
+    python bench/events.py --host 192.168.0.42 --poll-hz 10 -t 10
+"""
+import argparse
+import errno
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+from loopback import percentile
+import stream
+from rotatordevice import RotatorDevice
+
+failures = 0
+
+
+def check(cond, what):
+    global failures
+    if not cond:
+        failures += 1
+        print(f'FAIL {what}')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Server:
+    debug = False
+
+
+class Conn:
+    """Stands in for server.Connection. Takes ``room`` bytes, then would block."""
+    def __init__(self, room=1 << 20):
+        self.data = bytearray()
+        self.room = room
+        self.hung_up = False
+
+    def send(self, data):
+        if self.hung_up:
+            raise OSError(errno.EBADF, 'closed')
+        if self.room == 0:
+            raise OSError(errno.EAGAIN, 'would block')
+        n = min(len(data), self.room)
+        self.room -= n
+        self.data += data[:n]
+        return n
+
+    def hang_up(self):
+        self.hung_up = True
+
+    def events(self):
+        return [e for e in bytes(self.data).decode().split('\n\n') if e.startswith('id:')]
+
+
+def new_stream(conn, min_interval, heartbeat):
+    req = Request(_Server, conn, ('127.0.0.1', 1), b'GET /events/v1/rotator/0 HTTP/1.1\r\nHost: x\r\n\r\n')
+    return stream.EventStream(req, min_interval, heartbeat)
+
+
+def check_hub():
+    clock = Clock()
+    state = {'n': 0}
+    encodes = []
+
+    def encode():
+        encodes.append(state['n'])
+        return json.dumps(state)
+
+    hub = stream.StreamHub(encode, 2, clock)
+    fast, slow = Conn(), Conn()
+    check(hub.add(new_stream(fast, 0.0, 5.0)), 'first stream refused')
+    check(hub.add(new_stream(slow, 0.5, 5.0)), 'second stream refused')
+    check(not hub.add(new_stream(Conn(), 0.0, 5.0)), 'stream over max_streams accepted')
+    hub.pump(clock.now)
+    check(len(fast.events()) == 1 and len(slow.events()) == 1, 'first event not sent at once')
+    check(len(encodes) == 1, 'state encoded more than once for one pass')
+    hub._due = clock.now + 5.0                  # As run() leaves it, waiting for the heartbeat
+    clock.now += 0.01
+    hub.notify()
+    check(hub.next_due() == clock.now, f'next_due() {hub.next_due()} after notify(), expected now')
+    hub.pump(clock.now)
+    # Ten changes in 0.1 s
+    for i in range(10):
+        clock.now += 0.01
+        state['n'] = i + 1
+        hub.notify()
+        hub.pump(clock.now)
+    check(len(fast.events()) == 12, f'MinInterval 0 stream got {len(fast.events())} events, expected 12')
+    check(len(slow.events()) == 1, 'MinInterval 0.5 stream got an event too soon')
+    due = hub.pump(clock.now)
+    check(due is not None and abs(due - 1000.5) < 1e-9, f'next due {due}, expected 1000.5')
+    clock.now = due
+    hub.pump(clock.now)
+    last = slow.events()[-1]
+    check(len(slow.events()) == 2 and '"n": 10' in last, f'folded event wrong: {last!r}')
+    # Silence, then a heartbeat
+    clock.now += 5.0
+    hub.pump(clock.now)
+    check(bytes(fast.data).endswith(b': heartbeat\n\n'), 'no heartbeat after 5 s of silence')
+    check(hub.heartbeats_sent == 2, f'{hub.heartbeats_sent} heartbeats, expected 2')
+    # A reader that falls behind, then stops reading
+    clock = Clock()
+    hub = stream.StreamHub(encode, 1, clock)
+    lagging = Conn(room=10)
+    hub.add(new_stream(lagging, 0.0, 5.0))
+    hub.pump(clock.now)
+    state['n'] = 99
+    for _ in range(49):
+        clock.now += 0.1
+        hub.notify()
+        hub.pump(clock.now)
+    check(len(lagging.data) == 10 and not lagging.hung_up,
+          'new event started, or reader cut off, before the next heartbeat')
+    lagging.room = 1 << 20
+    hub.pump(clock.now)
+    check(lagging.events()[-1].endswith('"n": 99}'), 'latest state not sent once the backlog cleared')
+    lagging.room = 10
+    state['n'] = 100
+    hub.notify()
+    hub.pump(clock.now)
+    clock.now += 5.0
+    hub.pump(clock.now)
+    check(lagging.hung_up and hub.streams == 0, 'stalled reader was not cut off')
+
+
+def check_device_hook():
+    clock = Clock()
+    logger = logging.getLogger('events')
+    dev = RotatorDevice(logger, clock)
+    dev.steps_per_sec = 10
+    dev.connected = True
+    positions = []
+    hub = stream.StreamHub(lambda: json.dumps([dev.state()[0], dev.state()[1]]), 1, clock)
+    dev.subscribe(hub.notify)
+    conn = Conn()
+    hub.add(new_stream(conn, 0.0, 60.0))
+    hub.pump(clock.now)
+    dev.MoveAbsolute(10.0)
+    hub.pump(clock.now)
+    while clock.now < 1002.0:
+        clock.now += 0.05
+        dev.tick(clock.now)
+        hub.pump(clock.now)
+    for e in conn.events():
+        positions.append(json.loads(e.split('data: ')[1]))
+    moving = [p for moving, p in positions if moving]
+    check(moving == [float(i) for i in range(0, 10)], f'step events {moving}')
+    check(positions[-1] == [False, 10.0], f'last event {positions[-1]}')
+
+
+# ---------------------
+# Polling vs streaming
+# ---------------------
+
+def cpu_seconds(pid):
+    if pid is None:
+        return None
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def call(conn, method, member, **fields):
+    body = urlencode(dict(fields, ClientID=1, ClientTransactionID=1))
+    path = f'/api/v1/rotator/0/{member}'
+    if method == 'GET':
+        conn.request('GET', f'{path}?{body}')
+    else:
+        conn.request('PUT', path, body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    resp = conn.getresponse()
+    data = resp.read()
+    return json.loads(data).get('Value'), len(data) + sum(len(k) + len(v) + 4 for k, v in resp.getheaders())
+
+
+def poll(host, port, hz, seconds):
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    requests = nbytes = news = 0
+    last = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t0 = time.monotonic()
+        values = []
+        for member in ('position', 'ismoving'):
+            value, n = call(conn, 'GET', member)
+            values.append(value)
+            requests += 1
+            nbytes += n
+        if values != last:
+            news += 1
+            last = values
+        time.sleep(max(0.0, 1.0 / hz - (time.monotonic() - t0)))
+    conn.close()
+    return requests, nbytes, news
+
+
+def listen(host, port, min_interval, seconds):
+    sock = socket.create_connection((host, port), timeout=5)
+    sock.sendall(f'GET /events/v1/rotator/0?MinInterval={min_interval} HTTP/1.1\r\n'
+                 f'Host: {host}\r\n\r\n'.encode())
+    data = b''
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sock.settimeout(max(0.01, end - time.monotonic()))
+        try:
+            chunk = sock.recv(4096)
+        except socket.timeout:
+            break
+        if not chunk:
+            break
+        data += chunk
+    sock.close()
+    if not data.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(f'event stream: {data[:40]!r}')
+    return 1, len(data), data.count(b'\nevent: ')
+
+
+def measure(label, pid, fn):
+    cpu0 = cpu_seconds(pid)
+    requests, nbytes, news = fn()
+    cpu = cpu_seconds(pid)
+    cpu = '' if cpu is None else f'  server CPU {(cpu - cpu0) * 1000:6.0f} ms'
+    print(f'{label:<18} {requests:5d} requests  {nbytes:7d} bytes received  {news:4d} with news{cpu}')
+
+
+def latency(host, port, moves, steps_per_sec):
+    """Lateness in seconds of each start, step and stop event over ``moves`` 2 step moves"""
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    call(conn, 'PUT', 'connected', Connected='True')
+    sock = socket.create_connection((host, port), timeout=5)
+    sock.sendall(f'GET /events/v1/rotator/0?MinInterval=0 HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode())
+    arrived = []                                # (time, state) of every event
+    buf = b''
+
+    def read():
+        nonlocal buf
+        while True:
+            try:
+                chunk = sock.recv(4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            now = time.monotonic()
+            buf += chunk
+            while b'\n\n' in buf:
+                event, buf = buf.split(b'\n\n', 1)
+                if b'\ndata: ' in event:
+                    arrived.append((now, json.loads(event.split(b'\ndata: ', 1)[1])))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    late = {'start': [], 'step': [], 'stop': []}
+    interval = 1.0 / steps_per_sec
+    for _ in range(moves):
+        time.sleep(0.3)
+        position, _ = call(conn, 'GET', 'position')
+        first = len(arrived)
+        t0 = time.monotonic()
+        call(conn, 'PUT', 'moveabsolute', Position=(position + 2.0) % 360.0)
+        while time.monotonic() < t0 + 5.0 and not any(not s['IsMoving'] for _, s in arrived[first:]):
+            time.sleep(0.01)
+        events = arrived[first:]
+        if not events or events[-1][1]['IsMoving']:
+            raise RuntimeError('move did not finish in 5 s')
+        # Start at once, then one step per interval, the last one stops
+        late['start'].append(events[0][0] - t0)
+        for n, (t, s) in enumerate(events[1:], 1):
+            late['step' if s['IsMoving'] else 'stop'].append(t - (t0 + n * interval))
+    sock.close()
+    conn.close()
+    return late
+
+
+def live(args):
+    conn = http.client.HTTPConnection(args.host, args.port, timeout=5)
+    call(conn, 'PUT', 'connected', Connected='True')
+    position, _ = call(conn, 'GET', 'position')
+    degrees = args.seconds * 6 / 2          # 6 steps/s (config.toml), over half the run
+    for label, fn in ((f'poll at {args.poll_hz:g} Hz', lambda: poll(args.host, args.port, args.poll_hz, args.seconds)),
+                      ('event stream', lambda: listen(args.host, args.port, args.min_interval, args.seconds))):
+        position = (position + degrees) % 360.0
+        timer = threading.Timer(0.5, call, (http.client.HTTPConnection(args.host, args.port, timeout=5),
+                                            'PUT', 'moveabsolute'), {'Position': position})
+        timer.start()
+        measure(label, args.pid, fn)
+        timer.join()
+    conn.close()
+    late = latency(args.host, args.port, args.moves, args.steps_per_sec)
+    for kind, samples in late.items():
+        print(f'{kind + " event late":<18} p50 {percentile(samples, 50) * 1000:6.1f} ms  '
+              f'p99 {percentile(samples, 99) * 1000:6.1f} ms  max {max(samples) * 1000:6.1f} ms  ({len(samples)} events)')
+    worst = percentile([x for samples in late.values() for x in samples], 99)
+    check(worst * 1000 <= args.late_ms, f'events p99 {worst * 1000:.1f} ms late, over {args.late_ms:g} ms')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555)
+    ap.add_argument('--poll-hz', type=float, default=10.0)
+    ap.add_argument('--min-interval', type=float, default=0.0, help='stream MinInterval (sec)')
+    ap.add_argument('-t', '--seconds', type=float, default=10.0)
+    ap.add_argument('--pid', type=int, help='server process to read CPU time from')
+    ap.add_argument('--moves', type=int, default=10, help='moves timed for event latency')
+    ap.add_argument('--steps-per-sec', type=float, default=6.0, help='the device\'s steps_per_sec (config.toml)')
+    ap.add_argument('--late-ms', type=float, default=50.0, help='most an event may be late (99th percentile)')
+    ap.add_argument('--no-live', action='store_true', help='only run the simulated checks')
+    args = ap.parse_args()
+
+    stream.logger = logging.getLogger('events')
+    stream.logger.setLevel(logging.ERROR)
+    check_hub()
+    check_device_hook()
+    print('checks ok' if failures == 0 else f'{failures} check failures')
+    if not args.no_live:
+        live(args)
+        if failures:
+            print(f'{failures} check failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
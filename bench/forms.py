@@ -0,0 +1,95 @@
+"""PUT form body parsing checks and moveabsolute benchmark.
+
+First checks shr's urlencoded body parser against well-formed and
+malformed bodies (exits non-zero on a mismatch), then times the whole
+rotator ``moveabsolute`` PUT responder, request parsing included. Runs on
+CPython with the adafruit_httpserver, adafruit_logging and toml packages
+installed.
+
+    python bench/forms.py
+"""
+import os
+import sys
+import timeit
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request, InvalidPathError
+import exceptions
+import rotator
+import shr
+
+# (body, field, caseless, expected value; None = missing, InvalidPathError = 400)
+CASES = [
+    (b'Position=123.5&ClientID=1', 'Position', False, '123.5'),
+    (b'Action=a+b%20c', 'Action', False, 'a b c'),
+    (b'P%6fsition=1', 'Position', False, '1'),          # Escaped name
+    (b'Position=%', 'Position', False, '%'),            # Truncated escapes kept as is
+    (b'Position=%4', 'Position', False, '%4'),
+    (b'Position=%zz1', 'Position', False, '%zz1'),
+    (b'Position=100%25', 'Position', False, '100%'),
+    (b'Position=a=b', 'Position', False, 'a=b'),        # Only the first '=' splits
+    (b'Position', 'Position', False, ''),               # No '='
+    (b'=5&Position=1', 'Position', False, '1'),         # Empty name
+    (b'&&Position=2&&', 'Position', False, '2'),        # Empty pairs
+    (b'Position=1&Position=2', 'Position', False, '1'), # First value wins
+    (b'position=1', 'Position', False, None),           # PUT is case-sensitive...
+    (b'position=1', 'Position', True, '1'),             # ...unless asked otherwise
+    (b'Position=%C3%A9', 'Position', False, 'é'),
+    (b'Position=%C3', 'Position', False, InvalidPathError),    # Not UTF-8
+    (b'Position=\xff', 'Position', False, InvalidPathError),
+    (b'', 'Position', False, None),
+]
+
+
+class _Server:
+    debug = False
+
+
+def put(path, body):
+    raw = (b'PUT ' + path + b' HTTP/1.1\r\nHost: 127.0.0.1:5555\r\n'
+           b'Content-Type: application/x-www-form-urlencoded\r\n'
+           b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+    return Request(_Server, None, ('127.0.0.1', 1), raw)
+
+
+def check():
+    failed = 0
+    for body, name, caseless, expected in CASES:
+        req = put(b'/x', body)
+        try:
+            got = shr.get_request_fields(req).get(name, caseless)
+        except InvalidPathError:
+            got = InvalidPathError
+        if got != expected:
+            failed += 1
+            print(f'FAIL {body!r} {name}: expected {expected!r}, got {got!r}')
+    print(f'{len(CASES) - failed}/{len(CASES)} form parsing checks passed')
+    return failed == 0
+
+
+def moveabsolute():
+    req = put(b'/api/v1/rotator/0/moveabsolute',
+              b'Position=123.5&ClientID=123&ClientTransactionID=321')
+    rotator.rot_dev._is_moving = False
+    return rotator.members.on_request(req, '0')
+
+
+def main():
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.CRITICAL)
+    shr.logger = exceptions.logger = rotator.logger = logger
+    ok = check()
+    rotator.start_rot_device(logger)
+    rotator.rot_dev.connected = True
+    n = 20000
+    us = min(timeit.repeat(moveabsolute, number=n, repeat=3)) / n * 1e6
+    print(f'PUT moveabsolute  {us:6.2f} us/request')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Idle-time garbage collection checks and pause model.
+
+First checks memory.MemoryManager and the server's idle hook (exits
+non-zero on a failure):
+ - pauses land in the right histogram buckets
+ - on_idle() collects only below the threshold, and not again until
+   something has been allocated since
+ - the server skips the hook while a request is part-received or the next
+   timer is closer than the hook's gap
+
+CPython has no gc.mem_free() and does not collect the way CircuitPython
+does, so the second part is a model. A simulated heap of --heap-kb bytes
+is drawn down by every request (a real handler's worth of garbage plus
+--alloc bytes on the meter). A big live object graph makes gc.collect()
+take tens of milliseconds, as on the board. When the simulated heap runs out
+mid-request, the request pays for a real gc.collect(), as it would on
+CircuitPython. With the manager, on_idle() runs between requests and
+collects once free heap is under the threshold. Reports request latency
+for both, and the manager's pause histogram.
+
+    python bench/gcpause.py
+"""
+import argparse
+import os
+import sys
+import time
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+import memory
+import server
+from config import Config
+from loopback import percentile
+
+
+class _Heap:
+    """Simulated CircuitPython heap: free bytes, refilled by gc.collect()"""
+    def __init__(self, size):
+        self.size = size
+        self.free = size
+
+    def mem_free(self):
+        return self.free
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def check():
+    failures = []
+
+    def check_that(ok, what):
+        if not ok:
+            failures.append(what)
+
+    clock = _Clock()
+    mgr = memory.MemoryManager(1000, 5.0, clock)
+    real_collect = memory.gc.collect
+    for ms in (0.5, 1.5, 7, 30, 250):
+        memory.gc.collect = lambda ms=ms: setattr(clock, 'now', clock.now + ms / 1000)
+        mgr.collect()
+    memory.gc.collect = real_collect
+    h = mgr.histogram
+    check_that(h == [1, 1, 0, 1, 0, 1, 0, 1], f'histogram {h}')
+    check_that(abs(mgr.pause_max - 0.25) < 1e-9, f'max pause {mgr.pause_max}')
+
+    heap = _Heap(10000)
+    mgr = memory.MemoryManager(1000, 5.0)
+    mgr._mem_free = heap.mem_free
+    memory.gc.collect = lambda: setattr(heap, 'free', heap.free + 200)
+    heap.free = 5000
+    check_that(not mgr.on_idle(), 'collected above the threshold')
+    heap.free = 500
+    check_that(mgr.on_idle(), 'did not collect below the threshold')
+    # Still under the threshold afterwards: the rest is live data
+    check_that(not mgr.on_idle(), 'collected again with nothing allocated since')
+    heap.free -= 100
+    check_that(mgr.on_idle(), 'did not collect once something was allocated')
+    check_that(mgr.low_water == 500, f'low water {mgr.low_water}')
+    memory.gc.collect = real_collect
+
+    class _Srv:
+        _idle = []
+        _conns = {}
+    calls = []
+    _Srv._idle = [(lambda: calls.append(1), 20)]
+    conn = server.Connection(None, ('127.0.0.1', 1), bytearray(16))
+    _Srv._conns = {3: conn}
+    check_that(server.AlpacaServer._run_idle(_Srv, 1000) and len(calls) == 1, 'hook not run when idle')
+    check_that(not server.AlpacaServer._run_idle(_Srv, 10) and len(calls) == 1, 'hook run in a short gap')
+    conn.deadline = 1.0
+    check_that(not server.AlpacaServer._run_idle(_Srv, 1000) and len(calls) == 1,
+               'hook run with a request part-received')
+
+    for f in failures:
+        print('FAIL', f)
+    print('checks ok' if not failures else f'{len(failures)} check(s) failed')
+    return not failures
+
+
+def handler(heap, alloc):
+    # A request's worth of garbage: parse, dict, JSON text
+    junk = [{'Name': f'position{i}', 'Value': float(i)} for i in range(20)]
+    text = str(junk)
+    heap.free -= alloc
+    return len(text)
+
+
+def model(args, managed):
+    heap = _Heap(args.heap_kb * 1024)
+    mgr = memory.MemoryManager(args.threshold_kb * 1024, 5.0)
+    mgr._mem_free = heap.mem_free
+    real_collect = memory.gc.collect
+
+    def collect():
+        real_collect()
+        heap.free = heap.size - args.live_kb * 1024
+    memory.gc.collect = collect
+    lat = []
+    mid_request = 0
+    for _ in range(args.requests):
+        t0 = time.perf_counter()
+        if heap.free < args.alloc:      # Heap full: the board collects right here
+            collect()
+            mid_request += 1
+        handler(heap, args.alloc)
+        lat.append(time.perf_counter() - t0)
+        if managed:
+            mgr.on_idle()
+    memory.gc.collect = real_collect
+    return lat, mid_request, mgr
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-n', '--requests', type=int, default=3000)
+    ap.add_argument('--heap-kb', type=int, default=128, help='simulated heap')
+    ap.add_argument('--live-kb', type=int, default=64, help='simulated live data')
+    ap.add_argument('--alloc', type=int, default=1600, help='simulated bytes per request')
+    ap.add_argument('--threshold-kb', type=int, default=Config.gc_threshold // 1024)
+    ap.add_argument('--objects', type=int, default=300000, help='live objects gc.collect() has to walk')
+    args = ap.parse_args()
+
+    memory.logger = server.logger = logging.getLogger('bench')
+    ok = check()
+
+    live = [[i] for i in range(args.objects)]       # So gc.collect() takes tens of ms, as on the board
+    for label, managed in (('collector on heap-full', False), ('idle-time collection', True)):
+        lat, mid, mgr = model(args, managed)
+        print(f'{label:<24} p50 {percentile(lat, 50) * 1000:6.3f} ms   p99 {percentile(lat, 99) * 1000:6.3f} ms'
+              f'   max {max(lat) * 1000:6.2f} ms   {mid} collections mid-request')
+        if managed:
+            print(f'  idle collections: {mgr.collections}, pause max {mgr.pause_max * 1000:.2f} ms')
+            print(f'  histogram: {mgr.stats()["PauseHistogram"]}')
+    del live
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Logging cost per request at INFO and WARNING levels.
+
+Times the rotator ``position`` GET and ``moveabsolute`` PUT responders end
+to end (request parsing included) with the app's logger set to each level.
+Records that pass the level are formatted as the app formats them and then
+discarded, so only the cost of logging itself is measured, not I/O. Runs
+on CPython with the adafruit_httpserver, adafruit_logging and toml
+packages installed. The host stand-ins in host/ supply the CircuitPython
+modules log.py imports.
+
+    python bench/logcost.py
+"""
+import os
+import sys
+import timeit
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+import exceptions
+import log
+import rotator
+import shr
+
+GET_RAW = (b'GET /api/v1/rotator/0/position?ClientID=123&ClientTransactionID=321 HTTP/1.1\r\n'
+           b'Host: 127.0.0.1:5555\r\n\r\n')
+PUT_BODY = b'Position=123.5&ClientID=123&ClientTransactionID=321'
+PUT_RAW = (b'PUT /api/v1/rotator/0/moveabsolute HTTP/1.1\r\nHost: 127.0.0.1:5555\r\n'
+           b'Content-Type: application/x-www-form-urlencoded\r\n'
+           b'Content-Length: ' + str(len(PUT_BODY)).encode() + b'\r\n\r\n' + PUT_BODY)
+
+
+class _Server:
+    debug = False
+
+
+class _Discard:
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def get_position():
+    return rotator.members.on_request(Request(_Server, None, ('127.0.0.1', 1), GET_RAW), '0')
+
+
+def put_moveabsolute():
+    rotator.rot_dev._is_moving = False
+    return rotator.members.on_request(Request(_Server, None, ('127.0.0.1', 1), PUT_RAW), '0')
+
+
+def main():
+    logger = getattr(log, 'Logger', logging.Logger)('bench')
+    handler = logging.StreamHandler(_Discard())
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s', '%Y-%m-%dT%H:%M:%S'))
+    logger.addHandler(handler)
+    shr.logger = exceptions.logger = rotator.logger = logger
+    rotator.start_rot_device(logger)
+    rotator.rot_dev.connected = True
+    n = 20000
+    for level in ('INFO', 'WARNING'):
+        logger.setLevel(getattr(logging, level))
+        for name, fn in (('GET position', get_position), ('PUT moveabsolute', put_moveabsolute)):
+            us = min(timeit.repeat(fn, number=n, repeat=3)) / n * 1e6
+            print(f'{level:<8} {name:<18} {us:6.2f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Request logging latency with the log file on (simulated) flash.
+
+Logs the two INFO lines a request produces, for a run of requests, through
+the stock RotatingFileHandler and through log.BufferedRotatingFileHandler.
+It reports the time spent in the logger per request and, for the buffered
+handler, the time of each batch write done by its writer task, and checks
+that a full buffer makes its next_due() now so the I/O loop wakes the
+writer at once (exits non-zero if not). Every flush
+of the log file to storage is slowed by --flush-ms to stand in for a
+CircuitPython board's flash filesystem. Runs on CPython with the
+adafruit_logging and toml packages installed. The host stand-ins in
+host/ supply the CircuitPython modules log.py imports.
+
+    python bench/logflash.py --flush-ms 5 -n 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+import log
+from loopback import percentile
+
+
+class SlowFile:
+    """Wraps the log file so each flush takes as long as a flash write."""
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+        self.flushes = 0
+
+    def write(self, text):
+        return self.stream.write(text)
+
+    def flush(self):
+        self.flushes += 1
+        self.stream.flush()
+        time.sleep(self.delay)
+
+    def close(self):
+        self.stream.close()
+
+
+def run(handler, requests, delay):
+    handler.stream = SlowFile(handler.stream, delay)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s', '%Y-%m-%dT%H:%M:%S'))
+    logger = log.Logger('bench')
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    lat = []
+    batches = []
+    stale = 0
+    if isinstance(handler, log.BufferedRotatingFileHandler):
+        handler._due = time.monotonic() + handler.flush_interval     # As its run() task sets it
+    for i in range(requests):
+        t0 = time.perf_counter()
+        logger.info('%s -> %s %s', ('192.168.0.10', 50000 + i), 'GET', '/api/v1/rotator/0/position')
+        logger.info('%s <- %s', ('192.168.0.10', 50000 + i), 123.4)
+        lat.append(time.perf_counter() - t0)
+        if isinstance(handler, log.BufferedRotatingFileHandler) and handler._wake.is_set():
+            due = handler.next_due()
+            if due is None or due > time.monotonic():
+                stale += 1
+            t0 = time.perf_counter()    # What the writer task would do when it next runs
+            handler._wake.clear()
+            handler.flush()
+            handler._due = time.monotonic() + handler.flush_interval
+            batches.append(time.perf_counter() - t0)
+    flushes = handler.stream.flushes
+    handler.close()
+    return lat, batches, flushes, stale
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-n', '--requests', type=int, default=200)
+    ap.add_argument('--flush-ms', type=float, default=5.0, help='simulated flash write time')
+    args = ap.parse_args()
+    delay = args.flush_ms / 1000
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        name = os.path.join(tmp, 'alpyca.log')
+        for label, handler in (('RotatingFileHandler', logging.RotatingFileHandler(name, 'w', 5000000, 2)),
+                               ('BufferedRotatingFileHandler',
+                                log.BufferedRotatingFileHandler(name, 'w', 5000000, 2))):
+            lat, batches, flushes, stale = run(handler, args.requests, delay)
+            print(f'{label}: {flushes} flash writes for {args.requests} requests')
+            print(f'  logging per request  p50 {percentile(lat, 50) * 1000:7.3f} ms'
+                  f'  p99 {percentile(lat, 99) * 1000:7.3f} ms')
+            if batches:
+                print(f'  writer task batches  {len(batches)}, p50 {percentile(batches, 50) * 1000:.3f} ms each')
+            if stale:
+                print(f'FAIL {stale} full buffer(s) left next_due() in the future')
+                ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Loopback latency/throughput benchmark for the Alpaca HTTP server.
+
+Runs on CPython against a running device (or the device app running on a
+host with host/run.py). Sends GET requests and reports p50/p99 latency, requests per second
+and the number of TCP connections that had to be set up. By default every
+request uses a fresh connection; --keep-alive reuses one for as long as the
+server allows. Run once against the old firmware and once against the new
+one to compare.
+
+    python bench/loopback.py --host 192.168.0.42 --port 5555 -n 1000 --keep-alive
+"""
+import argparse
+import http.client
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Client:
+    def __init__(self, host, port, keep_alive):
+        self.host = host
+        self.port = port
+        self.keep_alive = keep_alive
+        self.conn = None
+        self.setups = 0
+
+    def get(self, path, retry=True):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=5)
+            self.setups += 1
+        headers = {} if self.keep_alive else {'Connection': 'close'}
+        try:
+            self.conn.request('GET', path, headers=headers)
+            resp = self.conn.getresponse()
+            body = resp.read()
+        except (http.client.HTTPException, ConnectionError):
+            self.close()                # Server dropped an idle connection, retry once
+            if not retry:
+                raise
+            return self.get(path, retry=False)
+        if resp.will_close:
+            self.close()
+        return body
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555)
+    ap.add_argument('-n', '--requests', type=int, default=500)
+    ap.add_argument('--keep-alive', action='store_true', help='reuse connections')
+    ap.add_argument('--path', default='/api/v1/rotator/0/position?ClientID=1&ClientTransactionID=1')
+    args = ap.parse_args()
+
+    client = Client(args.host, args.port, args.keep_alive)
+    client.get(args.path)               # Warm up
+    client.close()
+    client.setups = 0
+    lat = []
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        t0 = time.perf_counter()
+        client.get(args.path)
+        lat.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    client.close()
+
+    print(f'requests:    {args.requests}')
+    print(f'connections: {client.setups}')
+    print(f'p50:         {percentile(lat, 50) * 1000:.2f} ms')
+    print(f'p99:         {percentile(lat, 99) * 1000:.2f} ms')
+    print(f'req/s:       {args.requests / elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""mDNS advertisement resolver test.
+
+Runs on CPython with the host/ stand-ins for the CircuitPython modules.
+A small resolver here, written independently of dnssd, builds queries
+and parses the answers. It checks dnssd.Advertiser through a stand-in
+socket (exits non-zero on a failure):
+ - PTR, SRV, TXT and A queries for the service, instance and host names
+   are answered, in any letter case and with compressed names
+ - the records carry Config.port, the host address and every device in
+   management's configureddevices
+ - a one-shot resolver (not port 5353) gets the reply back with its query
+   ID and questions, no cache-flush bits and TTLs of at most 10 s; a
+   multicast reply keeps them, and goes out at most once a second
+ - the hostname ends in the MAC address, and two boards with different
+   MAC addresses publish different SRV owner (instance) names
+ - responses and queries for other names are ignored
+
+Then, unless --no-live, sends one query to 224.0.0.251 from an ephemeral
+port (as an inventory script would) to the device app running on a host
+with host/run.py, and reports the answer and the round trip time.
+
+    python bench/mdns.py
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+from errno import EAGAIN
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path[:0] = [os.path.join(DEVICE_DIR, '..', 'host'), DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from config import Config
+import dnssd
+import management
+import registry
+from shr import DeviceMetadata
+
+TYPES = {'A': 1, 'PTR': 12, 'TXT': 16, 'SRV': 33, 'ANY': 255}
+
+
+def query(qid, questions, compress=False):
+    """A DNS query for ``[(name, type)]``. With compress, later names point at the first"""
+    out = struct.pack('>HHHHHH', qid, 0, len(questions), 0, 0, 0)
+    first = None
+    for name, qtype in questions:
+        labels = name.split('.')
+        if compress and first is not None and name.endswith(first[0]) and name != first[0]:
+            head = name[:-len(first[0]) - 1]
+            enc = b''.join(bytes([len(l)]) + l.encode() for l in head.split('.'))
+            enc += struct.pack('>H', 0xc000 | first[1])
+        else:
+            enc = b''.join(bytes([len(l)]) + l.encode() for l in labels) + b'\0'
+            if first is None:
+                first = (name, len(out))
+        out += enc + struct.pack('>HH', TYPES[qtype], 1)
+    return out
+
+
+def read_name(data, pos):
+    labels = []
+    end = None
+    while True:
+        n = data[pos]
+        if n & 0xc0 == 0xc0:
+            if end is None:
+                end = pos + 2
+            pos = (n & 0x3f) << 8 | data[pos + 1]
+            continue
+        if n == 0:
+            return '.'.join(labels), (end if end is not None else pos + 1)
+        labels.append(data[pos + 1:pos + 1 + n].decode())
+        pos += n + 1
+
+
+def parse(data, full=False):
+    """Records in a DNS response: [(name, type, rdata as parsed)]
+
+    With full, also the questions, [(name, type)], and each record's class
+    and TTL: [(name, type, rdata, class, ttl)].
+    """
+    qid, flags, qd, an, ns, ar = struct.unpack('>HHHHHH', data[:12])
+    pos = 12
+    questions = []
+    for _ in range(qd):
+        name, pos = read_name(data, pos)
+        questions.append((name.lower(), struct.unpack('>H', data[pos:pos + 2])[0]))
+        pos += 4
+    records = []
+    for _ in range(an + ns + ar):
+        name, pos = read_name(data, pos)
+        rtype, rclass, ttl, length = struct.unpack('>HHIH', data[pos:pos + 10])
+        pos += 10
+        rdata = data[pos:pos + length]
+        if rtype == 12:
+            value = read_name(data, pos)[0]
+        elif rtype == 33:
+            prio, weight, port = struct.unpack('>HHH', rdata[:6])
+            value = (port, read_name(data, pos + 6)[0])
+        elif rtype == 16:
+            value, i = [], 0
+            while i < len(rdata):
+                value.append(rdata[i + 1:i + 1 + rdata[i]].decode())
+                i += 1 + rdata[i]
+        elif rtype == 1:
+            value = socket.inet_ntoa(rdata)
+        else:
+            value = rdata
+        records.append((name.lower(), rtype, value) + ((rclass, ttl) if full else ()))
+        pos += length
+    if full:
+        return qid, flags, questions, records
+    return qid, flags, records
+
+
+class _Sock:
+    """Stands in for the mDNS socket. Keeps what was sent."""
+    def __init__(self):
+        self.waiting = []
+        self.sent = []
+
+    def recvfrom_into(self, buffer):
+        if not self.waiting:
+            raise OSError(EAGAIN, 'EAGAIN')
+        data, address = self.waiting.pop(0)
+        buffer[:len(data)] = data
+        return len(data), address
+
+    def sendto(self, data, address):
+        self.sent.append((bytes(data), address))
+        return len(data)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def check():
+    failures = []
+
+    def check_that(ok, what):
+        if not ok:
+            failures.append(what)
+
+    clock = _Clock()
+    dnssd.monotonic = clock
+    registry.load(Config.devices)
+    management.init()
+    devices = management.configured_devices()
+    hostname = dnssd.hostname(Config.mdns_hostname, b'\x02\x00\x00\xa1\xb2\xc3')
+    check_that(hostname.endswith('a1b2c3') or '{mac}' not in Config.mdns_hostname,
+               f'hostname {hostname} does not end in the MAC address')
+    adv = dnssd.Advertiser(hostname, DeviceMetadata.Description, Config.port, devices)
+    adv.build('192.168.0.42')
+    sock = _Sock()
+    service = '_alpaca._tcp.local'
+    instance = f'{DeviceMetadata.Description} ({hostname}).{service}'
+    host = f'{hostname}.local'
+
+    owners = []
+    for mac in (b'\x02\x00\x00\xa1\xb2\xc3', b'\x02\x00\x00\xd4\xe5\xf6'):
+        other = dnssd.Advertiser(dnssd.hostname(Config.mdns_hostname, mac), DeviceMetadata.Description,
+                                 Config.port, devices)
+        owners.append({name for name, rtype, value in parse(other.build('192.168.0.42'))[2] if rtype == 33})
+    check_that(owners[0] and owners[1] and not owners[0] & owners[1],
+               f'two boards publish SRV records for the same names {owners}')
+
+    def ask(data, port=40000):
+        sock.waiting.append((data, ('192.168.0.10', port)))
+        before = len(sock.sent)
+        adv.handle_query(sock)
+        return sock.sent[-1] if len(sock.sent) > before else None
+
+    reply = ask(query(0x1234, [(service, 'PTR')]))
+    check_that(reply is not None, 'PTR query not answered')
+    if reply is not None:
+        check_that(reply[1] == ('192.168.0.10', 40000), f'one-shot reply went to {reply[1]}')
+        qid, flags, records = parse(reply[0])
+        check_that(qid == 0x1234, f'query ID {qid:#x} not echoed')
+        check_that(flags & 0x8400 == 0x8400, f'flags {flags:#x}, not an authoritative response')
+        found = {(name, rtype): value for name, rtype, value in records}
+        check_that(found.get((service, 12)) == instance, f'PTR {found.get((service, 12))!r}')
+        check_that(found.get((instance.lower(), 33)) == (Config.port, host),
+                   f'SRV {found.get((instance.lower(), 33))!r}')
+        check_that(found.get((host, 1)) == '192.168.0.42', f'A {found.get((host, 1))!r}')
+        txt = found.get((instance.lower(), 16), [])
+        for d in devices:
+            item = f'{d["DeviceType"]}/{d["DeviceNumber"]}={d["UniqueID"]}'
+            check_that(item in txt, f'TXT {txt!r} lacks {item!r}')
+        check_that(found.get(('_services._dns-sd._udp.local', 12)) == service,
+                   'service type not listed for DNS-SD enumeration')
+        questions, records = parse(reply[0], full=True)[2:]
+        check_that(questions == [(service, 12)], f'one-shot reply questions {questions}')
+        check_that(all(rclass == 1 and ttl <= 10 for *_, rclass, ttl in records),
+                   f'one-shot reply classes and TTLs {[r[3:] for r in records]}')
+    reply = ask(query(0x99, [('_http._tcp.local', 'PTR'), (instance, 'SRV')], compress=True))
+    if reply is not None:
+        questions = parse(reply[0], full=True)[2]
+        check_that(questions == [('_http._tcp.local', 12), (instance.lower(), 33)],
+                   f'compressed questions echoed as {questions}')
+
+    for name, qtype in ((instance.upper(), 'SRV'), (instance, 'TXT'), (host, 'A'),
+                        (host.upper(), 'ANY'), ('_services._dns-sd._udp.local', 'PTR')):
+        check_that(ask(query(7, [(name, qtype)])) is not None, f'{qtype} {name} not answered')
+    check_that(ask(query(8, [('_http._tcp.local', 'PTR'), (instance, 'SRV')], compress=True))
+               is not None, 'compressed second question not answered')
+
+    check_that(ask(query(9, [('_http._tcp.local', 'PTR')])) is None, 'other service answered')
+    check_that(ask(query(10, [('other.local', 'A')])) is None, 'other host answered')
+    check_that(ask(query(11, [(service, 'PTR')])[:20]) is None, 'truncated query answered')
+    response = bytearray(query(12, [(service, 'PTR')]))
+    response[2] |= 0x80
+    check_that(ask(bytes(response)) is None, 'a response was answered')
+
+    reply = ask(query(0, [(service, 'PTR')]), port=5353)
+    check_that(reply is not None and reply[1] == ('224.0.0.251', 5353), 'multicast query not answered to the group')
+    if reply is not None:
+        questions, records = parse(reply[0], full=True)[2:]
+        flushed = {(name, rtype) for name, rtype, value, rclass, ttl in records if rclass & 0x8000}
+        check_that(not questions and flushed == {(instance.lower(), 33), (instance.lower(), 16), (host, 1)},
+                   f'multicast reply questions {questions}, cache-flush set on {flushed}')
+    check_that(ask(query(0, [(service, 'PTR')]), port=5353) is None, 'second multicast within a second')
+    clock.now += 1.0
+    check_that(ask(query(0, [(service, 'PTR')]), port=5353) is not None, 'multicast after a second not answered')
+
+    for f in failures:
+        print('FAIL', f)
+    print('checks ok' if not failures else f'{len(failures)} check(s) failed')
+    return not failures
+
+
+def live(ifaddr):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(ifaddr))
+    sock.settimeout(2)
+    t0 = time.perf_counter()
+    sock.sendto(query(0x4242, [('_alpaca._tcp.local', 'PTR')]), ('224.0.0.251', 5353))
+    try:
+        data, address = sock.recvfrom(1500)
+    except socket.timeout:
+        print('live: no answer')
+        return
+    elapsed = time.perf_counter() - t0
+    records = parse(data)[2]
+    print(f'live: answered by {address[0]} in {elapsed * 1000:.2f} ms, one round trip')
+    for name, rtype, value in records:
+        print(f'  {name} {[k for k, v in TYPES.items() if v == rtype][0]} {value}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--ifaddr', default='0.0.0.0', help='address of the interface to query on')
+    ap.add_argument('--no-live', action='store_true', help='only run the checks')
+    args = ap.parse_args()
+
+    dnssd.logger = registry.logger = logging.getLogger('bench')
+    dnssd.logger.setLevel(logging.INFO)
+    ok = check()
+    if not args.no_live:
+        live(args.ifaddr)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
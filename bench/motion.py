@@ -0,0 +1,180 @@
+"""Rotator motion engine checks on a simulated clock.
+
+Drives RotatorDevice.tick() from a fake monotonic clock. Ticks arrive at
+random, sometimes long, intervals to mimic an event loop busy serving
+HTTP. At every tick the position must be exactly where the step schedule
+says it should be, and a move must finish on time. The checks also cover
+retargeting and halting a move in progress, and moves across 0/360. A
+final check runs the real run() task on asyncio alongside a coroutine
+that hogs the loop. Exits non-zero on any failure. Runs on CPython with
+adafruit_logging installed.
+
+    python bench/motion.py
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+
+import adafruit_logging as logging
+from rotatordevice import RotatorDevice
+
+failures = 0
+
+
+def check(cond, what):
+    global failures
+    if not cond:
+        failures += 1
+        print(f'FAIL {what}')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def device(clock, steps_per_sec=6, step_size=1.0):
+    logger = logging.getLogger('motion')
+    logger.setLevel(logging.WARNING)
+    dev = RotatorDevice(logger, clock)
+    dev.steps_per_sec = steps_per_sec
+    dev.step_size = step_size
+    dev.connected = True
+    return dev
+
+
+def expected(start, steps, direction, step_size):
+    return (start + direction * steps * step_size) % 360.0
+
+
+def run_ticks(dev, clock, until, rng, max_gap):
+    """Advance the clock in random jumps, calling tick() at each."""
+    samples = []
+    while clock.now < until:
+        clock.now = min(until, clock.now + rng.uniform(0.0, max_gap))
+        dev.tick(clock.now)
+        samples.append((clock.now, dev.mechanical_position, dev.is_moving))
+    return samples
+
+
+def check_schedule(name, start, target, direction, rate, step_size, max_gap, seed):
+    rng = random.Random(seed)
+    clock = Clock()
+    dev = device(clock, rate, step_size)
+    dev._mech_pos = start
+    t0 = clock.now
+    dev.MoveMechanical(target)
+    nsteps = round(abs((target - start + 180.0) % 360.0 - 180.0) / step_size)
+    finish = t0 + nsteps / rate
+    samples = run_ticks(dev, clock, finish + 2.0, rng, max_gap)
+    worst = 0.0
+    for now, pos, moving in samples:
+        steps = min(nsteps, math.floor((now - t0) * rate + 1e-9))
+        want = expected(start, steps, direction, step_size)
+        err = abs((pos - want + 180.0) % 360.0 - 180.0)
+        worst = max(worst, err)
+        if now >= finish + 1.0 / rate:
+            check(not moving, f'{name}: still moving at t+{now - t0:.3f}s')
+    check(worst < 1e-9, f'{name}: position off schedule by up to {worst}')
+    check(abs(dev.mechanical_position - target) < 1e-9,
+          f'{name}: ended at {dev.mechanical_position}, target {target}')
+    print(f'{name:<34} {nsteps:4d} steps, {len(samples):5d} ticks, worst error {worst:.1e} deg')
+
+
+def check_retarget_and_halt():
+    clock = Clock()
+    dev = device(clock, 10)
+    dev.MoveMechanical(90.0)
+    clock.now += 2.0                    # 20 steps
+    dev.tick(clock.now)
+    check(dev.mechanical_position == 20.0, f'retarget: at {dev.mechanical_position} before retarget')
+    dev.MoveMechanical(10.0)            # Turn around mid-move, same step schedule
+    clock.now += 1.0
+    dev.tick(clock.now)
+    check(dev.mechanical_position == 10.0, f'retarget: at {dev.mechanical_position} after 10 steps back')
+    clock.now += 0.5
+    check(dev.tick(clock.now) is None and not dev.is_moving, 'retarget: did not stop at new target')
+    dev.MoveMechanical(300.0)
+    clock.now += 1.55                   # 15 steps, the short way round through 0
+    dev.tick(clock.now)
+    check(dev.mechanical_position == 355.0, f'wrap: at {dev.mechanical_position}')
+    dev.Halt()
+    clock.now += 5.0
+    check(dev.tick(clock.now) is None, 'halt: still scheduled')
+    check(dev.mechanical_position == 355.0 and not dev.is_moving, f'halt: moved on to {dev.mechanical_position}')
+    dev.MoveAbsolute(355.0)             # Already there
+    check(not dev.is_moving and dev.tick(clock.now) is None, 'null move did not finish at once')
+    dev.MoveMechanical(0.0)
+    clock.now += 0.2                    # 2 steps, then back to where it is mid-move
+    dev.tick(clock.now)
+    dev.MoveMechanical(dev.mechanical_position)
+    at = dev.mechanical_position
+    seen = []
+    for _ in range(5):
+        clock.now += 0.1
+        dev.tick(clock.now)
+        seen.append(dev.mechanical_position)
+    check(seen == [at] * 5 and not dev.is_moving, f'retarget to {at} mid-move went to {seen}')
+    print('retarget / halt / wrap / null move  checked')
+
+
+async def hog(stop):
+    # Blocks the loop for 10 ms at a time, like a slow request would.
+    while not stop.is_set():
+        time.sleep(0.01)
+        await asyncio.sleep(0)
+
+
+async def check_asyncio():
+    dev = device(time.monotonic, 50)
+    late = []
+    tick = dev.tick
+
+    def timed_tick(now):
+        # Position must be on schedule however late the task wakes.
+        due = tick(now)
+        steps = min(20, math.floor((now - t0) * 50 + 1e-9))
+        late.append(abs(dev._mech_pos - steps))
+        return due
+
+    dev.tick = timed_tick
+    task = asyncio.create_task(dev.run())
+    stop = asyncio.Event()
+    hog_task = asyncio.create_task(hog(stop))
+    t0 = time.monotonic()
+    dev.MoveMechanical(20.0)            # 20 steps at 50/s = 0.4 s
+    while dev.is_moving and time.monotonic() - t0 < 5.0:
+        await asyncio.sleep(0.005)
+    elapsed = time.monotonic() - t0
+    stop.set()
+    task.cancel()
+    await hog_task
+    check(max(late) < 1e-9, f'asyncio: position off schedule by up to {max(late)}')
+    check(dev.mechanical_position == 20.0, f'asyncio: ended at {dev.mechanical_position}')
+    check(0.4 <= elapsed < 0.4 + 0.1, f'asyncio: move took {elapsed:.3f}s, expected 0.400s')
+    print(f'asyncio run() with a busy loop       20 steps in {elapsed:.3f}s (0.400s scheduled), '
+          f'{len(late)} wakeups')
+
+
+def main():
+    check_schedule('0 -> 90, 6/s, ticks every 0-50 ms', 0.0, 90.0, 1, 6, 1.0, 0.05, 1)
+    check_schedule('0 -> 90, 6/s, ticks every 0-2 s', 0.0, 90.0, 1, 6, 1.0, 2.0, 2)
+    check_schedule('350 -> 20 across 0, 0.5 deg steps', 350.0, 20.0, 1, 10, 0.5, 0.3, 3)
+    check_schedule('45 -> 300 the short way, 20/s', 45.0, 300.0, -1, 20, 1.0, 0.1, 4)
+    check_retarget_and_halt()
+    asyncio.run(check_asyncio())
+    print('all checks passed' if not failures else f'{failures} checks FAILED')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Overload test for the Alpaca server's admission control.
+
+Runs more polling clients than the server has connection slots, each
+sending its next request as soon as the last one is answered. A client
+that is sent a 503 waits as long as its Retry-After says and then tries
+again on a new connection. Reports how many requests were answered, turned
+away or failed (timed out or reset), and the latency of every attempt.
+Run it against a server with admission control on (the default config)
+and off (max_inflight = 0) to compare. With --p99-ms, exits non-zero if
+p99 latency is over that.
+
+First, one client pipelines --pipeline requests on one connection, which
+are all answered (exits non-zero if not): max_inflight counts clients,
+not requests. Last, it prints the server's counters from
+/diagnostics/server.
+
+    python bench/overload.py --host 192.168.0.42 -c 20 -t 20 --p99-ms 500
+"""
+import argparse
+import http.client
+import json
+import socket
+import threading
+import time
+
+from loopback import percentile
+
+
+def client(host, port, path, stop, results):
+    conn = None
+    while not stop.is_set():
+        if conn is None:
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+        t0 = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            resp = conn.getresponse()
+            resp.read()
+        except (http.client.HTTPException, OSError):
+            results.append(('failed', time.perf_counter() - t0))
+            conn.close()
+            conn = None
+            continue
+        elapsed = time.perf_counter() - t0
+        if resp.status == 503:
+            results.append(('shed', elapsed))
+            conn.close()
+            conn = None
+            stop.wait(float(resp.getheader('Retry-After', '1')))
+            continue
+        results.append(('ok', elapsed))
+        if resp.will_close:
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def pipelined(host, port, path, n):
+    """Status of each of ``n`` requests sent at once on one connection"""
+    sock = socket.create_connection((host, port), timeout=10)
+    sock.sendall(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode() * n)
+    data = b''
+    try:
+        while data.count(b'HTTP/1.1 ') < n:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    except socket.timeout:
+        pass
+    sock.close()
+    return [int(part[:3]) for part in data.split(b'HTTP/1.1 ')[1:]]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555)
+    ap.add_argument('-c', '--clients', type=int, default=20)
+    ap.add_argument('-t', '--seconds', type=float, default=10.0)
+    ap.add_argument('--path', default='/api/v1/rotator/0/position?ClientID=1&ClientTransactionID=1')
+    ap.add_argument('--p99-ms', type=float, help='fail if p99 latency is over this')
+    ap.add_argument('--pipeline', type=int, default=20, help='requests one client pipelines')
+    args = ap.parse_args()
+
+    statuses = pipelined(args.host, args.port, args.path, args.pipeline)
+    print(f'pipelined: {statuses.count(200)}/{args.pipeline} answered 200')
+    if statuses != [200] * args.pipeline:
+        raise SystemExit(f'pipelined requests got {statuses}')
+
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=client, daemon=True,
+                                args=(args.host, args.port, args.path, stop, results))
+               for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=15)
+
+    print(f'clients:   {args.clients}')
+    for outcome in ('ok', 'shed', 'failed'):
+        lat = [x for o, x in results if o == outcome]
+        line = f'{outcome + ":":<10} {len(lat):6d}'
+        if lat:
+            line += f'   p50 {percentile(lat, 50) * 1000:8.2f} ms   p99 {percentile(lat, 99) * 1000:8.2f} ms'
+        print(line)
+    lat = [x for _, x in results]
+    if not lat:
+        return
+    p99 = percentile(lat, 99) * 1000
+    print(f'all:       {len(lat):6d}   p99 {p99:.2f} ms   max {max(lat) * 1000:.2f} ms')
+    conn = http.client.HTTPConnection(args.host, args.port, timeout=10)
+    conn.request('GET', '/diagnostics/server')
+    print('server:   ', json.loads(conn.getresponse().read()))
+    conn.close()
+    if args.p99_ms is not None and p99 > args.p99_ms:
+        raise SystemExit(f'p99 {p99:.2f} ms is over {args.p99_ms} ms')
+
+
+if __name__ == '__main__':
+    main()
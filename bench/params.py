@@ -0,0 +1,66 @@
+"""Per-request parameter handling benchmark.
+
+Times the parameter work the Alpaca responders do for one request: the
+ClientID/ClientTransactionID checks in PreProcessRequest, the responder's
+own field lookup, and the ClientTransactionID lookup in the response
+object. A fresh Request is parsed for each iteration. Runs on CPython with
+the adafruit_httpserver, adafruit_logging and toml packages installed.
+
+    python bench/params.py
+"""
+import os
+import sys
+import timeit
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+import exceptions
+import shr
+
+GET_RAW = (b'GET /api/v1/rotator/0/position?ClientID=123&ClientTransactionID=321 HTTP/1.1\r\n'
+           b'Host: 127.0.0.1:5555\r\nUser-Agent: bench\r\nAccept: */*\r\n\r\n')
+PUT_BODY = b'Position=123.5&ClientID=123&ClientTransactionID=321'
+PUT_RAW = (b'PUT /api/v1/rotator/0/moveabsolute HTTP/1.1\r\nHost: 127.0.0.1:5555\r\n'
+           b'Content-Type: application/x-www-form-urlencoded\r\n'
+           b'Content-Length: ' + str(len(PUT_BODY)).encode() + b'\r\n\r\n' + PUT_BODY)
+
+
+class _Server:
+    debug = False
+
+
+def get_request():
+    req = Request(_Server, None, ('127.0.0.1', 1), GET_RAW)
+    shr.PreProcessRequest(0)._check_request(req, '0')
+    return shr.PropertyResponse(1.0, req)
+
+
+def put_request():
+    req = Request(_Server, None, ('127.0.0.1', 1), PUT_RAW)
+    shr.PreProcessRequest(0)._check_request(req, '0')
+    float(shr.get_request_field('Position', req))
+    return shr.MethodResponse(req)
+
+
+def parse_only(raw):
+    return Request(_Server, None, ('127.0.0.1', 1), raw)
+
+
+def main():
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.CRITICAL)
+    shr.logger = exceptions.logger = logger
+    n = 20000
+    for name, fn, raw in (('GET position', get_request, GET_RAW),
+                          ('PUT moveabsolute', put_request, PUT_RAW)):
+        total = timeit.timeit(fn, number=n) / n * 1e6
+        base = timeit.timeit(lambda: parse_only(raw), number=n) / n * 1e6
+        print(f'{name:<18} {total:6.2f} us/request, {total - base:6.2f} us beyond request parsing')
+
+
+if __name__ == '__main__':
+    main()
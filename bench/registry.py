@@ -0,0 +1,163 @@
+"""Device registry checks and heap per configured device type.
+
+Checks registry.load() and what is derived from it (exits non-zero on a
+failure):
+ - importing app imports no device type module; load() imports only the
+   configured ones
+ - configureddevices lists each configured instance with the UniqueID
+   the module gives it, a count above the type's MaxDeviceNumber is cut
+   down, and an unknown type, a count that is not a number and a module
+   without ``<Type>Metadata`` or ``configure()`` are logged and skipped
+ - the count reaches the module: a type that could serve more device
+   numbers only serves the configured ones
+ - the Alpaca, event and setup routes exist only for served types
+
+Then, each in a fresh interpreter, measures the heap that ``import app``
+plus ``registry.load()`` takes with no devices configured and with the
+rotator (tracemalloc, CPython).
+
+    python bench/registry.py
+"""
+import json
+import os
+import subprocess
+import sys
+import types
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+HOST_DIR = os.path.join(DEVICE_DIR, '..', 'host')
+sys.path[:0] = [HOST_DIR, DEVICE_DIR]
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+DEVICE_MODULES = ('rotator', 'rotatordevice', 'members')
+
+# Run in a fresh interpreter: heap taken by importing the app and loading the devices
+MEASURE = f'''
+import gc, json, sys, tracemalloc
+sys.path[:0] = [{HOST_DIR!r}, {DEVICE_DIR!r}]
+import adafruit_logging as logging
+import adafruit_httpserver, asyncio, toml
+gc.collect()
+tracemalloc.start()
+import app, registry
+registry.logger = logging.getLogger('bench')
+registry.logger.setLevel(logging.CRITICAL)
+registry.load(json.loads(sys.argv[1]))
+app.management.init()
+gc.collect()
+print(json.dumps([tracemalloc.get_traced_memory()[0], sorted(m for m in {DEVICE_MODULES!r} if m in sys.modules)]))
+'''
+
+
+class _Log:
+    def __init__(self):
+        self.lines = []
+
+    def _keep(self, msg, *args):
+        self.lines.append(msg % args)
+
+    info = warning = error = _keep
+
+
+def bench_type():
+    """A device type module that supports device numbers 0 to 3"""
+    from shr import PreProcessRequest
+    mod = types.ModuleType('benchtype')
+
+    class BenchtypeMetadata:
+        Name = 'Bench device'
+        DeviceType = 'Benchtype'
+        MaxDeviceNumber = 3
+
+    mod.BenchtypeMetadata = BenchtypeMetadata
+    mod.preprocess = PreProcessRequest(3)
+
+    def configure(count):
+        mod.preprocess.maxdev = count - 1
+        return [f'uid-{n}' for n in range(count)]
+
+    mod.configure = configure
+    mod.init_routes = lambda server, api_version: None
+    return mod
+
+
+def check():
+    failures = []
+
+    def check_that(ok, what):
+        if not ok:
+            failures.append(what)
+
+    import app
+    import management
+    import registry
+    from server import AlpacaServer
+    check_that(not any(m in sys.modules for m in DEVICE_MODULES),
+               f'import app imported {[m for m in DEVICE_MODULES if m in sys.modules]}')
+
+    log = registry.logger = _Log()
+    registry.load({})
+    check_that(not any(m in sys.modules for m in DEVICE_MODULES), 'load({}) imported a device module')
+    management.init()
+    check_that(management.configured_devices() == [], 'devices listed with none configured')
+    srv = AlpacaServer(None)
+    registry.init_routes(srv, 1)
+    check_that(not srv._api_routes and not srv._routes, 'routes added with none configured')
+
+    registry.load({'rotator': 3, 'nosuchtype': 1})
+    check_that(sys.modules.get('rotator') is not None, 'rotator not imported')
+    check_that([s[0] for s in registry.served] == ['rotator'], f'served {registry.served}')
+    check_that(any('nosuchtype' in line for line in log.lines), 'unknown type not logged')
+    check_that(any('not 3' in line for line in log.lines), 'count above MaxDeviceNumber not logged')
+    management.init()
+    devices = management.configured_devices()
+    check_that(len(devices) == 1 and devices[0]['DeviceType'] == 'Rotator' and devices[0]['DeviceNumber'] == 0
+               and devices[0]['UniqueID'] == sys.modules['rotator'].RotatorMetadata.DeviceID,
+               f'configureddevices {devices}')
+    srv = AlpacaServer(None)
+    registry.init_routes(srv, 1)
+    check_that(('GET', 'v1', 'rotator', 'position') in srv._api_routes, 'rotator member routes missing')
+    paths = [r.path for r in srv._routes]
+    for path in ('/setup/v1/rotator/<devnum>/setup', '/events/v1/rotator/<devnum>'):
+        check_that(path in paths, f'{path} route missing')
+
+    sys.modules['benchtype'] = mod = bench_type()
+    registry.load({'benchtype': 2})
+    management.init()
+    devices = management.configured_devices()
+    check_that([(d['DeviceNumber'], d['UniqueID']) for d in devices] == [(0, 'uid-0'), (1, 'uid-1')],
+               f'configureddevices {devices}')
+    check_that(mod.preprocess.maxdev == 1, f'module serves up to device {mod.preprocess.maxdev}, not 1')
+
+    sys.modules['notatype'] = types.ModuleType('notatype')
+    del log.lines[:]
+    try:
+        registry.load({'rotator': '1', 'notatype': 1, 'benchtype': 1})
+    except (TypeError, AttributeError) as ex:
+        check_that(False, f'bad [devices] entries raised {ex!r}')
+    check_that([s[0] for s in registry.served] == ['benchtype'], f'served {registry.served}')
+    check_that(any("'1'" in line for line in log.lines), 'count that is not a number not logged')
+    check_that(any('notatype' in line for line in log.lines), 'module without Metadata not logged')
+
+    for f in failures:
+        print('FAIL', f)
+    print('checks ok' if not failures else f'{len(failures)} check(s) failed')
+    return not failures
+
+
+def measure(devices: dict) -> tuple:
+    out = subprocess.run([sys.executable, '-c', MEASURE, json.dumps(devices)],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    ok = check()
+    for label, devices in (('no devices', {}), ('rotator = 1', {'rotator': 1})):
+        heap, imported = measure(devices)
+        print(f'{label:<12} {heap:>8} B after import app + load   device modules: {", ".join(imported) or "none"}')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Replay the thunder-tests request collections as a load test.
+
+Reads the Thunder Client collections under thunder-tests/collections (or
+the ones given) and replays their requests, in collection order, against
+one server. The host and port in each collection URL are replaced with
+--host/--port. Each of --concurrency workers sends over its own kept-alive
+connection, either flat out or paced so that together they offer --rate
+requests per second.
+
+For each endpoint it reports throughput, p50/p95/p99 latency, HTTP and
+transport errors, and Alpaca errors (a 200 response with a non-zero
+ErrorNumber). With --pid, the server's resident memory is read before and
+after the run. That works for the app running on this machine under
+host/run.py. --json writes everything, with the run settings, to a file
+so runs can be compared over time.
+
+    python bench/replay.py -c 4 -t 10 --rate 200 --json results.json
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlencode
+
+from loopback import percentile
+
+COLLECTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                           'thunder-tests', 'collections', '*.json')
+
+
+def load_requests(paths, exclude):
+    """Returns [(name, method, path, body)] from Thunder Client collections."""
+    reqs = []
+    for path in paths:
+        with open(path) as f:
+            col = json.load(f)
+        for r in sorted(col['requests'], key=lambda r: r.get('sortNum', 0)):
+            if r['name'] in exclude:
+                continue
+            url = urlsplit(r['url'])
+            target = url.path + ('?' + url.query if url.query else '')
+            body = None
+            if r.get('body', {}).get('type') == 'formencoded':
+                body = urlencode([(f['name'], f['value']) for f in r['body']['form']
+                                  if f.get('isDisabled') is not True])
+            reqs.append((f"{r['method']} {url.path}", r['method'], target, body))
+    return reqs
+
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.errors = {}
+        self.alpaca_errors = {}
+
+    def add(self, name, latency, error, alpaca_error):
+        with self.lock:
+            if latency is not None:
+                self.latency.setdefault(name, []).append(latency)
+            self.errors[name] = self.errors.get(name, 0) + error
+            self.alpaca_errors[name] = self.alpaca_errors.get(name, 0) + alpaca_error
+
+
+def worker(host, port, reqs, offset, interval, stop, stats):
+    conn = None
+    i = offset
+    next_send = time.perf_counter()
+    while not stop.is_set():
+        if interval:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += interval
+        name, method, target, body = reqs[i % len(reqs)]
+        i += 1
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body is not None else {}
+        if conn is None:
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, target, body, headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            conn = None
+            stats.add(name, None, 1, 0)
+            continue
+        latency = time.perf_counter() - t0
+        alpaca_error = 0
+        if resp.status == 200:
+            try:
+                alpaca_error = int(json.loads(data).get('ErrorNumber', 0) != 0)
+            except ValueError:
+                pass
+        stats.add(name, latency, int(resp.status >= 400), alpaca_error)
+        if resp.will_close:
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def summarize(stats, seconds):
+    endpoints = {}
+    names = sorted(set(stats.latency) | set(stats.errors))
+    for name in names:
+        lat = stats.latency.get(name, [])
+        endpoints[name] = {
+            'requests': len(lat),
+            'req_per_sec': round(len(lat) / seconds, 1),
+            'p50_ms': round(percentile(lat, 50) * 1000, 3) if lat else None,
+            'p95_ms': round(percentile(lat, 95) * 1000, 3) if lat else None,
+            'p99_ms': round(percentile(lat, 99) * 1000, 3) if lat else None,
+            'errors': stats.errors.get(name, 0),
+            'alpaca_errors': stats.alpaca_errors.get(name, 0),
+        }
+    return endpoints
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555)
+    ap.add_argument('-c', '--concurrency', type=int, default=1)
+    ap.add_argument('--rate', type=float, default=0, help='total requests/s offered (0 = flat out)')
+    ap.add_argument('-t', '--seconds', type=float, default=10.0)
+    ap.add_argument('--collection', action='append', help='collection file (default: all)')
+    ap.add_argument('--exclude', action='append', default=[], help='request name to leave out')
+    ap.add_argument('--pid', type=int, help='server process to read memory from')
+    ap.add_argument('--json', help='write results to this file')
+    args = ap.parse_args()
+
+    reqs = load_requests(args.collection or sorted(glob.glob(COLLECTIONS)), set(args.exclude))
+    stats = Stats()
+    stop = threading.Event()
+    interval = args.concurrency / args.rate if args.rate else 0
+    mem_before = rss_kb(args.pid) if args.pid else None
+    threads = [threading.Thread(target=worker, daemon=True,
+                                args=(args.host, args.port, reqs, i * len(reqs) // args.concurrency,
+                                      interval, stop, stats))
+               for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=15)
+    elapsed = time.perf_counter() - start
+    mem_after = rss_kb(args.pid) if args.pid else None
+
+    endpoints = summarize(stats, elapsed)
+    merged = [x for lat in stats.latency.values() for x in lat]
+    total = {
+        'requests': len(merged),
+        'req_per_sec': round(len(merged) / elapsed, 1),
+        'p50_ms': round(percentile(merged, 50) * 1000, 3) if merged else None,
+        'p95_ms': round(percentile(merged, 95) * 1000, 3) if merged else None,
+        'p99_ms': round(percentile(merged, 99) * 1000, 3) if merged else None,
+        'errors': sum(stats.errors.values()),
+        'alpaca_errors': sum(stats.alpaca_errors.values()),
+    }
+    print(f'{"endpoint":<48} {"req":>6} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"err":>5} {"alpaca":>6}')
+    for name, e in list(endpoints.items()) + [('TOTAL', total)]:
+        fmt = lambda v: f'{v:8.2f}' if v is not None else f'{"-":>8}'
+        print(f'{name:<48} {e["requests"]:6d} {e["req_per_sec"]:8.1f} {fmt(e["p50_ms"])} '
+              f'{fmt(e["p95_ms"])} {fmt(e["p99_ms"])} {e["errors"]:5d} {e["alpaca_errors"]:6d}')
+    if args.pid:
+        print(f'server RSS: {mem_before} kB before, {mem_after} kB after')
+    if args.json:
+        result = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'settings': {'host': args.host, 'port': args.port, 'concurrency': args.concurrency,
+                         'rate': args.rate, 'seconds': args.seconds, 'exclude': args.exclude},
+            'elapsed_s': round(elapsed, 3),
+            'memory_kb': {'before': mem_before, 'after': mem_after},
+            'total': total,
+            'endpoints': endpoints,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Pre-serialized constant responses check and benchmark.
+
+Checks that every shr.StaticResponse the rotator and management responders
+send is byte for byte what AlpacaResponse(PropertyResponse(...)) sends for
+the same value and transaction IDs (exits non-zero on a mismatch), then
+compares the two for time and peak memory allocated per response, for the
+body alone and for the whole response with headers. Runs on
+CPython with the adafruit_httpserver, adafruit_logging and toml packages
+installed.
+
+    python bench/static.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+DEVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'device')
+sys.path.insert(0, DEVICE_DIR)
+os.chdir(DEVICE_DIR)                    # config.py reads ./config.toml at import
+
+import adafruit_logging as logging
+from adafruit_httpserver import Request
+import exceptions
+import shr
+import rotator
+import management
+import registry
+from config import Config
+
+GET_RAW = (b'GET /api/v1/rotator/0/name?ClientID=123&ClientTransactionID=%s HTTP/1.1\r\n'
+           b'Host: 127.0.0.1:5555\r\n\r\n')
+
+MEMBERS = [('rotator', n) for n in ('_description', '_driverinfo', '_driverversion',
+                                     '_interfaceversion', '_name', '_supportedactions',
+                                     '_canreverse')] \
+        + [('management', n) for n in ('_apiversions', '_description', '_configureddevices')]
+
+
+class _Server:
+    debug = False
+
+
+class _Sink:
+    """Stands in for the client connection and keeps what was sent."""
+    def __init__(self):
+        self.data = bytearray()
+
+    def send(self, data):
+        self.data += data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def request(ctid=b'321', sink=None):
+    return Request(_Server, sink or _Sink(), ('127.0.0.1', 1), GET_RAW % ctid)
+
+
+def sent(response):
+    response._send()
+    return bytes(response._request.connection.data)
+
+
+def check():
+    failed = 0
+    total = 0
+    for module, attr in MEMBERS:
+        prop = getattr(sys.modules[module], attr)
+        for ctid in (b'321', b'0', b'007', b'4294967295'):
+            total += 1
+            shr._stid = 41
+            old = sent(shr.AlpacaResponse(request(ctid), shr.PropertyResponse(prop.value, request(ctid))))
+            shr._stid = 41
+            new = sent(shr.StaticResponse(request(ctid), prop))
+            if old != new:
+                failed += 1
+                print(f'FAIL {module}.{attr} ctid={ctid}:\n  {old!r}\n  {new!r}')
+    print(f'{total - failed}/{total} responses byte-for-byte identical')
+    return failed == 0
+
+
+def measure(label, make):
+    n = 20000
+    us = min(timeit.repeat(make, number=n, repeat=3)) / n * 1e6
+    make()                              # Warm up anything cached
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    make()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    print(f'{label:<44} {us:6.2f} us/response  {peak:5d} bytes peak allocation')
+
+
+def main():
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.CRITICAL)
+    shr.logger = exceptions.logger = registry.logger = logger
+    registry.load(Config.devices)       # As app.main() does, ConfiguredDevices lists what it loads
+    management.init()
+    ok = check()
+    req = request(sink=_Null())
+    for module, attr in (('rotator', '_name'), ('rotator', '_supportedactions'),
+                         ('management', '_configureddevices')):
+        prop = getattr(sys.modules[module], attr)
+        label = f'{module}.{attr[1:]}'
+        measure(f'PropertyResponse body {label}',
+                lambda: shr.encode_response(shr.AlpacaResponse(req, shr.PropertyResponse(prop.value, req))._resp))
+        measure(f'StaticResponse body {label}', lambda: shr.StaticResponse(req, prop).encode())
+        measure(f'PropertyResponse {label}',
+                lambda: shr.AlpacaResponse(req, shr.PropertyResponse(prop.value, req))._send())
+        measure(f'StaticResponse {label}', lambda: shr.StaticResponse(req, prop)._send())
+    sys.exit(0 if ok else 1)
+
+
+class _Null:
+    """Client connection that throws the response away."""
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    main()
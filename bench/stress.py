@@ -0,0 +1,99 @@
+"""Multi-client stress harness for the Alpaca HTTP server.
+
+Runs N simulated clients, each polling over its own kept-alive connection
+for a fixed time, plus optional "stalled" clients that send half a request
+and then go quiet. Reports per-client request counts, Jain's fairness index
+(1.0 = perfectly even service) and overall tail latency.
+
+    python bench/stress.py --host 192.168.0.42 -c 4 --stalled 1 -t 10
+"""
+import argparse
+import http.client
+import socket
+import threading
+import time
+
+from loopback import percentile
+
+
+def poller(host, port, path, stop, latencies, counts, idx):
+    conn = None
+    while not stop.is_set():
+        if conn is None:
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+        t0 = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            resp = conn.getresponse()
+            resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            conn = None
+            continue
+        latencies[idx].append(time.perf_counter() - t0)
+        counts[idx] += 1
+        if resp.will_close:
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def staller(host, port, stop):
+    # Send the request line and part of a PUT body, then stop talking.
+    while not stop.is_set():
+        try:
+            sock = socket.create_connection((host, port), timeout=10)
+            sock.sendall(b'PUT /api/v1/rotator/0/move HTTP/1.1\r\nHost: x\r\n'
+                         b'Content-Type: application/x-www-form-urlencoded\r\n'
+                         b'Content-Length: 40\r\n\r\nPosit')
+            sock.recv(1024)             # Blocks until the server drops us
+            sock.close()
+        except OSError:
+            time.sleep(0.1)
+
+
+def jain(values):
+    total = sum(values)
+    squares = sum(v * v for v in values)
+    return (total * total) / (len(values) * squares) if squares else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5555)
+    ap.add_argument('-c', '--clients', type=int, default=4)
+    ap.add_argument('--stalled', type=int, default=0, help='clients that stall mid-request')
+    ap.add_argument('-t', '--seconds', type=float, default=10.0)
+    ap.add_argument('--path', default='/api/v1/rotator/0/position?ClientID=1&ClientTransactionID=1')
+    args = ap.parse_args()
+
+    stop = threading.Event()
+    latencies = [[] for _ in range(args.clients)]
+    counts = [0] * args.clients
+    threads = [threading.Thread(target=poller, daemon=True,
+                                args=(args.host, args.port, args.path, stop, latencies, counts, i))
+               for i in range(args.clients)]
+    threads += [threading.Thread(target=staller, daemon=True, args=(args.host, args.port, stop))
+                for _ in range(args.stalled)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=15)
+
+    merged = [x for lat in latencies for x in lat]
+    print(f'clients:   {args.clients} (+{args.stalled} stalled)')
+    print(f'requests:  {sum(counts)}  ({sum(counts) / args.seconds:.1f} req/s)')
+    print(f'per-client: {counts}')
+    print(f'fairness:  {jain(counts):.3f}')
+    if merged:
+        print(f'p50:       {percentile(merged, 50) * 1000:.2f} ms')
+        print(f'p99:       {percentile(merged, 99) * 1000:.2f} ms')
+        print(f'max:       {max(merged) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
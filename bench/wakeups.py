@@ -0,0 +1,85 @@
+"""Idle wakeups and discovery latency benchmark.
+
+Runs against the device app running on a Linux host with host/run.py,
+since the wakeup count comes from /proc. First leaves the server idle for
+--idle seconds and reports how often its process woke up: voluntary
+context switches summed over its threads, plus CPU time. Then sends
+--probes Alpaca discovery probes, one at a time at a random moment, and
+reports how long each reply took. The probes are at least
+--min-interval apart, the server's discovery_min_interval, or it would
+not answer them (they all come from one address). Run once against the old firmware and
+once against the new one to compare.
+
+    python bench/wakeups.py --pid $(pgrep -nf "host/run.py") --idle 10 --probes 200
+"""
+import argparse
+import os
+import random
+import socket
+import time
+
+from loopback import percentile
+
+PROBE = b'alpacadiscovery1'
+
+
+def wakeups(pid):
+    total = 0
+    for tid in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{tid}/status') as f:
+            for line in f:
+                if line.startswith('voluntary_ctxt_switches'):
+                    total += int(line.split()[1])
+    return total
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=32227, help='discovery port')
+    ap.add_argument('--pid', type=int, required=True, help='server process')
+    ap.add_argument('--idle', type=float, default=10.0, help='seconds to leave the server idle')
+    ap.add_argument('--probes', type=int, default=100)
+    ap.add_argument('--min-interval', type=float, default=0.25,
+                    help='the server\'s discovery_min_interval (config.toml)')
+    args = ap.parse_args()
+
+    w0, c0 = wakeups(args.pid), cpu_seconds(args.pid)
+    time.sleep(args.idle)
+    w1, c1 = wakeups(args.pid), cpu_seconds(args.pid)
+    print(f'idle wakeups: {(w1 - w0) / args.idle:8.1f} /s')
+    print(f'idle CPU:     {(c1 - c0) / args.idle * 100:8.2f} %')
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(2)
+    lat = []
+    lost = 0
+    last = None
+    for _ in range(args.probes):
+        if last is not None:                    # Not rate limited
+            time.sleep(max(0.0, last + args.min_interval - time.perf_counter()))
+        time.sleep(random.uniform(0.0, 0.2))    # Land anywhere in the server's cycle
+        t0 = last = time.perf_counter()
+        sock.sendto(PROBE, (args.host, args.port))
+        try:
+            sock.recvfrom(256)
+        except socket.timeout:
+            lost += 1
+            continue
+        lat.append(time.perf_counter() - t0)
+    sock.close()
+    print(f'discovery:    {len(lat)} replies, {lost} lost')
+    if lat:
+        print(f'  p50         {percentile(lat, 50) * 1000:8.2f} ms')
+        print(f'  p99         {percentile(lat, 99) * 1000:8.2f} ms')
+        print(f'  max         {max(lat) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
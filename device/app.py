@@ -38,71 +38,102 @@ from adafruit_connection_manager import get_radio_socketpool
 import asyncio
 
 import discovery
+import dnssd
 import exceptions
 from adafruit_httpserver import Server, Route, GET
+from server import AlpacaServer
 import management
+import server
 import setup
+import stream
 import log
+import memory
+import registry
 from config import Config
 import shr
 
-##############################
-# FOR EACH ASCOM DEVICE TYPE #
-##############################
-import rotator
+# Device type modules (rotator.py ...) are imported by registry.load(),
+# only those config.toml [devices] lists
 
 #--------------
 API_VERSION = 1
 #--------------
 
 def init_routes(server: Server):
-    #########################
-    # FOR EACH ASCOM DEVICE #
-    #########################
-    rotator.init_routes(server, API_VERSION)
+    registry.init_routes(server, API_VERSION)
 
-async def main():
-    """ Application startup"""
+async def main(started: float = None):
+    """ Application startup
+
+        ``started`` is ``monotonic()`` when code.py began, for the startup
+        time in the log and ``/diagnostics/memory``.
+    """
 
     logger = log.init_logging()
     # Share this logger throughout
     log.logger = logger
     exceptions.logger = logger
-    rotator.start_rot_device(logger)
     discovery.logger = logger
+    dnssd.logger = logger
+    server.logger = logger
+    stream.logger = logger
     shr.logger = logger
     management.logger = logger
+    memory.logger = logger
+    registry.logger = logger
 
-    #########################
-    # FOR EACH ASCOM DEVICE #
-    #########################
-    rotator.logger = logger
+    registry.load(Config.devices)
+    management.init()
 
     wifi.radio.connect(ssid=Config.wifi_ssid, password=Config.wifi_password)
     logger.info('Connected to wifi at: %s', str(wifi.radio.ipv4_address))
     
     pool = get_radio_socketpool(wifi.radio)
-    server = Server(pool, "/", debug=True)
+    httpd = AlpacaServer(pool, None, debug=True)      # No static files, 404 for unrouted paths
     
-    server.add_routes([
+    httpd.add_routes([
         Route('/management/apiversions', GET, management.apiversions.on_get),
         Route(f'/management/v{API_VERSION}/description', GET, management.description.on_get),
         Route(f'/management/v{API_VERSION}/configureddevices', GET, management.configureddevices.on_get),
         Route('/setup', GET, setup.srvsetup.on_get),
-        Route(f'/setup/v{API_VERSION}/rotator/<devnum>/setup', GET, setup.devsetup.on_get),
+        Route('/diagnostics/memory', GET, memory.diagnostics.on_get),
+        Route('/diagnostics/server', GET, httpd.on_diagnostics),
     ])
     
-    init_routes(server)
+    init_routes(httpd)
     
     dsc = discovery.DiscoveryResponder(Config.ip_address, Config.port)
-    dsc_task = asyncio.create_task(dsc.run(pool))
+    for sock in dsc.open(pool):
+        httpd.watch(sock, lambda sock=sock: dsc.handle_client(sock))
+    mdns = None
+    if Config.mdns_hostname:
+        mdns = dnssd.Advertiser(dnssd.hostname(Config.mdns_hostname, wifi.radio.mac_address),
+                                shr.DeviceMetadata.Description, Config.port, management.configured_devices())
+        sock = mdns.open(pool, str(wifi.radio.ipv4_address))
+        if sock is not None:
+            httpd.watch(sock, lambda: mdns.handle_query(sock))
+        else:
+            mdns = None
     
-    poll_task = asyncio.create_task(poll(server))
+    # The server task is the only I/O loop. It wakes for the other tasks' timers
+    http_task = asyncio.create_task(httpd.serve(str(wifi.radio.ipv4_address), Config.port))
+    tasks = [http_task]
+    tasks += registry.start(logger, httpd)
+    memory.manager = memory.MemoryManager(Config.gc_threshold, Config.mem_sample_interval)
+    httpd.add_idle(memory.manager.on_idle, Config.gc_idle_gap_ms)
+    tasks.append(asyncio.create_task(memory.manager.run()))
+    httpd.add_timer(memory.manager.next_due)
+    if mdns is not None:
+        tasks.append(asyncio.create_task(mdns.run()))
+        httpd.add_timer(mdns.next_due)
+    if log.file_handler is not None:
+        tasks.append(asyncio.create_task(log.file_handler.run()))
+        httpd.add_timer(log.file_handler.next_due)
+    memory.manager.startup_done(started)
+    logger.info('Started in %s s, %s bytes free', memory.manager.startup_seconds, memory.manager.startup_free)
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        log.shutdown()
 
-    await asyncio.gather(poll_task, dsc_task)
-    
-async def poll(server: Server):
-    server.start(str(wifi.radio.ipv4_address), Config.port)
-    while True:
-        server.poll()
-        await asyncio.sleep(.01)
@@ -1,4 +1,6 @@
+from time import monotonic
+started = monotonic()           # Before any imports, see MemoryManager.startup_done()
 import app
 import asyncio
 
-asyncio.run(app.main())
\ No newline at end of file
+asyncio.run(app.main(started))
\ No newline at end of file
@@ -28,6 +28,8 @@ class Config:
     # ---------------
     ip_address: str = get_toml('network', 'ip_address')
     port: int = get_toml('network', 'port')
+    discovery_min_interval: float = get_toml('network', 'discovery_min_interval')
+    mdns_hostname: str = get_toml('network', 'mdns_hostname')
     wifi_ssid: str = get_toml('network', 'wifi_ssid')
     wifi_password: str = get_toml('network', 'wifi_password')
     ap_ssid: str = get_toml('network', 'ap_ssid')
@@ -37,6 +39,21 @@ class Config:
     # --------------
     location: str = get_toml('server', 'location')
     verbose_driver_exceptions: bool = get_toml('server', 'verbose_driver_exceptions')
+    poll_timeout_ms: int = get_toml('server', 'poll_timeout_ms')
+    max_connections: int = get_toml('server', 'max_connections')
+    request_timeout: float = get_toml('server', 'request_timeout')
+    keepalive_timeout: float = get_toml('server', 'keepalive_timeout')
+    keepalive_max_requests: int = get_toml('server', 'keepalive_max_requests')
+    max_streams: int = get_toml('server', 'max_streams')
+    stream_min_interval: float = get_toml('server', 'stream_min_interval')
+    stream_heartbeat: float = get_toml('server', 'stream_heartbeat')
+    max_inflight: int = get_toml('server', 'max_inflight')
+    queue_budget: float = get_toml('server', 'queue_budget')
+    retry_after: int = get_toml('server', 'retry_after')
+    # ---------------
+    # Devices Section
+    # ---------------
+    devices: dict = _dict.get('devices', {})
     # --------------
     # Device Section
     # --------------
@@ -44,6 +61,13 @@ class Config:
     step_size: float = get_toml('device', 'step_size')
     steps_per_sec: int = get_toml('device', 'steps_per_sec')
     sync_write_connected: bool = get_toml('device', 'sync_write_connected')
+    state_interval: float = get_toml('device', 'state_interval')
+    # --------------
+    # Memory Section
+    # --------------
+    gc_threshold: int = get_toml('memory', 'gc_threshold')
+    gc_idle_gap_ms: int = get_toml('memory', 'gc_idle_gap_ms')
+    mem_sample_interval: float = get_toml('memory', 'mem_sample_interval')
     # ---------------
     # Logging Section
     # ---------------
@@ -54,3 +78,6 @@ class Config:
     log_to_stdout: str = get_toml('logging', 'log_to_stdout')
     max_size_mb: int = get_toml('logging', 'max_size_mb')
     num_keep_logs: int = get_toml('logging', 'num_keep_logs')
+    buffer_lines: int = get_toml('logging', 'buffer_lines')
+    flush_bytes: int = get_toml('logging', 'flush_bytes')
+    flush_interval: float = get_toml('logging', 'flush_interval')
@@ -1,38 +1,119 @@
 from adafruit_logging import Logger
-import asyncio
 from socketpool import SocketPool
-import select
+from time import monotonic
+from config import Config
 
 logger: Logger = None
 
+DISCOVERY_PORT = 32227
+DISCOVERY_PROBE = b'alpacadiscovery1'
+DISCOVERY_GROUP_V6 = b'\xff\x12' + bytes(10) + b'\x00\xa1\x9a\xca'   # ff12::a1:9aca
+MAX_SOURCES = 16                # Addresses remembered for the rate limit
+
+try:
+    bytearray(1).find(b'\0', 0, 1)
+    _find_in_place = True
+except AttributeError:
+    _find_in_place = False          # Ports without bytearray.find() search a bytes copy
+
+def _contains(buf: bytearray, size: int, sub: bytes) -> bool:
+    # 'sub in buf[:size]', without copying the datagram where the port allows
+    if _find_in_place:
+        return buf.find(sub, 0, size) >= 0
+    return sub in bytes(memoryview(buf)[:size])
+
 class DiscoveryResponder:
-    def handle_client(self):
-        data = bytearray(128)
-        size, address = self.sock.recvfrom_into(data)
-        dataascii = data.decode('ascii')
-        logger.debug(f'Disc rcv {dataascii}')
-        if 'alpacadiscovery1' in dataascii:
-            self.sock.sendto(self.alpaca_response.encode(), address)
-    
+    """Answers Alpaca discovery probes on UDP port 32227.
+
+    ``open()`` binds an IPv4 socket and, where the socket pool supports
+    it, an IPv6 one that joins the Alpaca multicast group ff12::a1:9aca.
+    The server's I/O loop then calls ``handle_client()`` whenever one of
+    them has a datagram waiting (see :py:meth:`server.AlpacaServer.watch`).
+
+    The reply is encoded once. A source address is answered at most once
+    every ``min_interval`` seconds, so clients scanning a busy network
+    cost a ``recvfrom_into()`` each and nothing more. At most
+    ``MAX_SOURCES`` addresses are remembered; while they are all recent,
+    probes from new ones are not answered either.
+    """
+    def handle_client(self, sock):
+        size, address = sock.recvfrom_into(self._buf)
+        logger.debug('Disc rcv %s bytes from %s', size, address)
+        if not _contains(self._buf, size, DISCOVERY_PROBE):
+            self.ignored += 1
+            return
+        if not self._allow(address[0], monotonic()):
+            self.limited += 1
+            return
+        sock.sendto(self._reply, address)
+        self.replies += 1
+
+    def _allow(self, host: str, now: float) -> bool:
+        if host.startswith('::ffff:'):      # IPv4-mapped, the same client as over IPv4
+            host = host[7:]
+        last = self._last_reply.get(host)
+        if last is not None and now - last < self.min_interval:
+            return False
+        if last is None and len(self._last_reply) >= MAX_SOURCES:
+            for h in list(self._last_reply):
+                if now - self._last_reply[h] >= self.min_interval:
+                    del self._last_reply[h]
+            if len(self._last_reply) >= MAX_SOURCES:
+                return False
+        self._last_reply[host] = now
+        return True
+
     def __init__(self, ADDR, PORT):
-        self.device_address = ('', 32227)
+        self.device_address = ('', DISCOVERY_PORT)
         self.alpaca_response  = "{\"AlpacaPort\": " + str(PORT) + "}"
-            
-        
-    async def run(self, socket_pool: SocketPool):
-        self.sock = socket_pool.socket(socket_pool.AF_INET, socket_pool.SOCK_DGRAM)
-        self.sock.setsockopt(SocketPool.SOL_SOCKET, SocketPool.SO_REUSEADDR, 1)
-        self.sock.bind(self.device_address)
-        
-        poller = select.poll()
-        poller.register(self.sock, select.POLLIN)
-        
-        while True:
-            evts = poller.poll(0)
-            for _sock, evt in evts:
-                logger.debug('Evt received')
-                if evt and select.POLLIN:
-                    logger.debug('Broadcast received')
-                    self.handle_client()
-                    
-            await asyncio.sleep(0.1)
+        self._reply = self.alpaca_response.encode()
+        self._buf = bytearray(128)          # Reused for every datagram
+        self.min_interval = Config.discovery_min_interval
+        self._last_reply = {}               # Source address -> when it was last answered
+        self.sockets = []
+        #
+        # Counters
+        #
+        self.replies = 0
+        self.limited = 0                    # Probes not answered, too soon
+        self.ignored = 0                    # Datagrams that were not probes
+
+    def open(self, socket_pool: SocketPool) -> list:
+        """Bind the discovery sockets
+
+        Returns:
+            The sockets, for the I/O loop to watch.
+        """
+        sock = socket_pool.socket(socket_pool.AF_INET, socket_pool.SOCK_DGRAM)
+        sock.setsockopt(SocketPool.SOL_SOCKET, SocketPool.SO_REUSEADDR, 1)
+        sock.bind(self.device_address)
+        sock.setblocking(False)
+        self.sockets.append(sock)
+        sock = self._open_ipv6(socket_pool)
+        if sock is not None:
+            self.sockets.append(sock)
+        return self.sockets
+
+    def _open_ipv6(self, socket_pool: SocketPool):
+        if not hasattr(socket_pool, 'AF_INET6') or not hasattr(socket_pool, 'IPV6_JOIN_GROUP'):
+            logger.info('No IPv6 multicast in this socket pool, IPv4 discovery only')
+            return None
+        sock = None
+        try:
+            sock = socket_pool.socket(socket_pool.AF_INET6, socket_pool.SOCK_DGRAM)
+            sock.setsockopt(socket_pool.SOL_SOCKET, socket_pool.SO_REUSEADDR, 1)
+            if hasattr(socket_pool, 'IPV6_V6ONLY'):
+                # Or a dual-stack socket gets the IPv4 probes too, and answers them twice
+                sock.setsockopt(socket_pool.IPPROTO_IPV6, socket_pool.IPV6_V6ONLY, 1)
+            sock.bind(('::', DISCOVERY_PORT))
+            # struct ipv6_mreq: the group, then interface 0 (the default)
+            sock.setsockopt(socket_pool.IPPROTO_IPV6, socket_pool.IPV6_JOIN_GROUP,
+                            DISCOVERY_GROUP_V6 + bytes(4))
+            sock.setblocking(False)
+        except OSError as ex:
+            logger.info('IPv6 discovery not available: %s', ex)
+            if sock is not None:
+                sock.close()
+            return None
+        logger.info('Discovery also on IPv6 group ff12::a1:9aca')
+        return sock
@@ -0,0 +1,254 @@
+from adafruit_logging import Logger
+import asyncio
+from socketpool import SocketPool
+from time import monotonic
+from config import Config
+
+logger: Logger = None
+
+MDNS_GROUP = '224.0.0.251'
+MDNS_PORT = 5353
+SERVICE = '_alpaca._tcp.local'
+SERVICES_META = '_services._dns-sd._udp.local'     # DNS-SD service type enumeration
+
+TYPE_A = 1
+TYPE_PTR = 12
+TYPE_TXT = 16
+TYPE_SRV = 33
+TYPE_ANY = 255
+CLASS_IN = 1
+CACHE_FLUSH = 0x8000            # Set on records only this host owns
+HOST_TTL = 120                  # RFC 6762 recommendations
+OTHER_TTL = 4500
+LEGACY_TTL = 10                 # Most a one-shot resolver is told to cache for (RFC 6762 6.7)
+ANNOUNCEMENTS = 2               # Sent one second apart at startup
+
+def _wire_name(name: str) -> bytes:
+    """``name`` in DNS wire format (length-prefixed labels, no compression)"""
+    out = b''
+    for label in name.split('.'):
+        label = label.encode()[:63]
+        out += bytes([len(label)]) + label
+    return out + b'\0'
+
+def _lower(wire: bytes) -> bytes:
+    # Labels are at most 63 long, so no length byte is an upper case letter
+    return bytes(c + 32 if 65 <= c <= 90 else c for c in wire)
+
+def hostname(name: str, mac_address: bytes) -> str:
+    """``name`` with ``{mac}`` replaced by the last 3 bytes of ``mac_address`` in hex"""
+    return name.replace('{mac}', ''.join(f'{b:02x}' for b in mac_address[3:]))
+
+def _u16(n: int) -> bytes:
+    return bytes([n >> 8 & 0xff, n & 0xff])
+
+def _record(name: bytes, rtype: int, flush: bool, ttl: int, rdata: bytes) -> bytes:
+    return name + _u16(rtype) + _u16(CLASS_IN | (CACHE_FLUSH if flush else 0)) \
+           + _u16(ttl >> 16) + _u16(ttl & 0xffff) + _u16(len(rdata)) + rdata
+
+def _name_matches(buf: bytearray, pos: int, size: int, wire: bytes) -> bool:
+    """Compare the name at ``buf[pos]`` with lower-case ``wire``, in place.
+
+    Follows compression pointers and ignores ASCII case.
+    """
+    i = 0
+    hops = 0
+    while pos < size:
+        n = buf[pos]
+        if n & 0xc0 == 0xc0:
+            if pos + 1 >= size or hops == 8:
+                return False
+            pos = (n & 0x3f) << 8 | buf[pos + 1]
+            hops += 1
+            continue
+        if n != wire[i]:
+            return False
+        if n == 0:
+            return True
+        if pos + n >= size:
+            return False
+        for k in range(1, n + 1):
+            c = buf[pos + k]
+            if 65 <= c <= 90:
+                c += 32
+            if c != wire[i + k]:
+                return False
+        pos += n + 1
+        i += n + 1
+    return False
+
+def _skip_name(buf: bytearray, pos: int, size: int) -> int:
+    while pos < size:
+        n = buf[pos]
+        if n & 0xc0 == 0xc0:
+            return pos + 2
+        if n == 0:
+            return pos + 1
+        pos += n + 1
+    return size
+
+class Advertiser:
+    """Advertises the Alpaca server over multicast DNS (DNS-SD).
+
+    Publishes ``<ServerName> (<hostname>)._alpaca._tcp.local`` with an SRV record for
+    ``Config.port`` on ``<hostname>.local``, that host's A record, and a
+    TXT record listing the configured devices (``Rotator/0=<UniqueID>``).
+    A client can then find the server with one mDNS query instead of
+    repeating discovery broadcasts.
+
+    Every record goes into one response packet, built once by ``open()``.
+    A query that asks about any of the names is answered with it,
+    multicast, at most once a second (RFC 6762). A query that did not come
+    from port 5353 (a one-shot "legacy" resolver such as an inventory
+    script) is answered straight back to the sender with its query ID and
+    questions, and the records without cache-flush bits and with TTLs of
+    at most ``LEGACY_TTL`` (RFC 6762 6.7). Anything else on the group
+    costs an in-place name comparison. ``run()`` announces the records at
+    startup.
+
+    There is no probing for a name already in use. The default hostname
+    in config.toml ends in the board's MAC address (see ``hostname()``)
+    and the instance name includes the hostname, so that boards on one
+    network do not claim, and cache-flush, each other's names.
+    """
+    def __init__(self, hostname: str, server_name: str, port: int, devices: list):
+        self.hostname = hostname
+        self.server_name = server_name
+        self.instance = f'{server_name} ({hostname})'     # Unique as the hostname is
+        self.port = port
+        self.devices = devices
+        self.sock = None
+        self._buf = bytearray(512)          # Reused for every query
+        self._packet = None
+        self._legacy = None                 # The records as a one-shot resolver gets them
+        self._answers = 0
+        self._names = []                    # Lower-case wire names to answer for
+        self._last_multicast = None
+        self._announced = 0
+        self._due = None
+        #
+        # Counters
+        #
+        self.answered = 0
+        self.throttled = 0                  # Within a second of the last multicast
+        self.ignored = 0                    # Not about us, or not a query
+
+    def build(self, ipv4_address: str) -> bytes:
+        """Build the response packet for the server at ``ipv4_address``"""
+        service = _wire_name(SERVICE)
+        instance = _wire_name(f'{self.instance}.{SERVICE}')
+        host = _wire_name(f'{self.hostname}.local')
+        txt = b''
+        for item in ['txtvers=1'] + [f'{d["DeviceType"]}/{d["DeviceNumber"]}={d["UniqueID"]}'
+                                     for d in self.devices]:
+            item = item.encode()[:255]
+            txt += bytes([len(item)]) + item
+        records = [     # name, type, cache flush, TTL, data
+            (_wire_name(SERVICES_META), TYPE_PTR, False, OTHER_TTL, service),
+            (service, TYPE_PTR, False, OTHER_TTL, instance),
+            (instance, TYPE_SRV, True, HOST_TTL, _u16(0) + _u16(0) + _u16(self.port) + host),
+            (instance, TYPE_TXT, True, OTHER_TTL, txt),
+            (host, TYPE_A, True, HOST_TTL, bytes([int(x) for x in ipv4_address.split('.')])),
+        ]
+        self._answers = len(records)
+        # ID 0, flags: response, authoritative. All records are answers
+        header = _u16(0) + _u16(0x8400) + _u16(0) + _u16(self._answers) + _u16(0) + _u16(0)
+        self._names = [_lower(_wire_name(SERVICES_META)), _lower(service), _lower(instance), _lower(host)]
+        self._packet = header + b''.join(_record(*r) for r in records)
+        self._legacy = b''.join(_record(name, rtype, False, min(ttl, LEGACY_TTL), rdata)
+                                for name, rtype, flush, ttl, rdata in records)
+        return self._packet
+
+    def open(self, socket_pool: SocketPool, ipv4_address: str):
+        """Join the mDNS group and build the packet
+
+        Returns:
+            The socket for the I/O loop to watch, or None if the socket
+            pool cannot do multicast.
+        """
+        if not hasattr(socket_pool, 'IP_ADD_MEMBERSHIP'):
+            logger.info('No IPv4 multicast in this socket pool, not advertising over mDNS')
+            return None
+        self.build(ipv4_address)
+        sock = socket_pool.socket(socket_pool.AF_INET, socket_pool.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket_pool.SOL_SOCKET, socket_pool.SO_REUSEADDR, 1)
+            sock.bind(('', MDNS_PORT))
+            # struct ip_mreq: the group, then the interface (any)
+            sock.setsockopt(socket_pool.IPPROTO_IP, socket_pool.IP_ADD_MEMBERSHIP,
+                            bytes([224, 0, 0, 251]) + bytes(4))
+            if hasattr(socket_pool, 'IP_MULTICAST_TTL'):
+                sock.setsockopt(socket_pool.IPPROTO_IP, socket_pool.IP_MULTICAST_TTL, 255)
+            sock.setblocking(False)
+        except OSError as ex:
+            logger.info('mDNS not available: %s', ex)
+            sock.close()
+            return None
+        self.sock = sock
+        self._due = monotonic()
+        logger.info('Advertising %s.local:%s over mDNS', self.hostname, self.port)
+        return sock
+
+    def _wanted(self, size: int) -> bool:
+        """True if the datagram in ``_buf`` is a query about one of our names"""
+        buf = self._buf
+        if size < 12 or buf[2] & 0x80:             # Too short, or a response
+            return False
+        pos = 12
+        for _ in range(buf[4] << 8 | buf[5]):
+            end = _skip_name(buf, pos, size)
+            if end + 4 > size:
+                return False
+            qtype = buf[end] << 8 | buf[end + 1]
+            if qtype in (TYPE_PTR, TYPE_SRV, TYPE_TXT, TYPE_A, TYPE_ANY):
+                for wire in self._names:
+                    if _name_matches(buf, pos, size, wire):
+                        return True
+            pos = end + 4
+        return False
+
+    def handle_query(self, sock):
+        size, address = sock.recvfrom_into(self._buf)
+        if not self._wanted(size):
+            self.ignored += 1
+            return
+        if address[1] != MDNS_PORT:
+            sock.sendto(self._legacy_response(size), address)
+        else:
+            now = monotonic()
+            if self._last_multicast is not None and now - self._last_multicast < 1.0:
+                self.throttled += 1
+                return
+            self._last_multicast = now
+            sock.sendto(self._packet, (MDNS_GROUP, MDNS_PORT))
+        self.answered += 1
+        logger.debug('mDNS answered %s', address)
+
+    def _legacy_response(self, size: int) -> bytes:
+        """The answer to the one-shot query in ``_buf``: its ID and questions, then the records"""
+        buf = self._buf
+        pos = 12
+        questions = 0
+        for _ in range(buf[4] << 8 | buf[5]):
+            end = _skip_name(buf, pos, size) + 4
+            if end > size:
+                break
+            pos = end
+            questions += 1
+        # Copied to the same offset, so compression pointers in the questions still hold
+        return bytes(buf[0:2]) + _u16(0x8400) + _u16(questions) + _u16(self._answers) + _u16(0) + _u16(0) \
+               + bytes(buf[12:pos]) + self._legacy
+
+    def next_due(self) -> float:
+        """When ``run()`` next announces, or None once it is done"""
+        return self._due
+
+    async def run(self):
+        """Announce the records at startup"""
+        while self.sock is not None and self._announced < ANNOUNCEMENTS:
+            self.sock.sendto(self._packet, (MDNS_GROUP, MDNS_PORT))
+            self._last_multicast = monotonic()
+            self._announced += 1
+            self._due = self._last_multicast + 1.0
+            await asyncio.sleep(1.0)
+        self._due = None
@@ -33,12 +33,140 @@
 # -----------------------------------------------------------------------------
 
 import adafruit_logging as logging
+import asyncio
 import storage
+from time import monotonic
 from config import Config
 
 global logger
 #logger: logging.Logger = None  # Master copy (root) of the logger
 logger = None                   # Safe on Python 3.7 but no intellisense in VSCode etc.
+file_handler = None             # BufferedRotatingFileHandler if logging to flash
+
+class Logger(logging.Logger):
+    """ adafruit_logging Logger that checks the level before doing any work
+
+        The stock Logger formats ``msg % args`` and builds a log record before
+        it looks at the level. Here a call at a disabled level costs one
+        integer comparison, and the message is only formatted once the level
+        passes. So pass values as args rather than formatting them into the
+        message with an f-string::
+
+            logger.debug('[position] %s', res)
+
+        Use ``isEnabledFor()`` to skip work done only to produce a log message.
+    """
+    def isEnabledFor(self, level: int) -> bool:
+        return level >= self._level
+
+    def log(self, level: int, msg: str, *args) -> None:
+        if level >= self._level:
+            self._log(level, msg, *args)
+
+    def debug(self, msg: str, *args) -> None:
+        if self._level <= logging.DEBUG:
+            self._log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args) -> None:
+        if self._level <= logging.INFO:
+            self._log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args) -> None:
+        if self._level <= logging.WARNING:
+            self._log(logging.WARNING, msg, *args)
+
+    def error(self, msg: str, *args) -> None:
+        if self._level <= logging.ERROR:
+            self._log(logging.ERROR, msg, *args)
+
+    def critical(self, msg: str, *args) -> None:
+        if self._level <= logging.CRITICAL:
+            self._log(logging.CRITICAL, msg, *args)
+
+class BufferedRotatingFileHandler(logging.RotatingFileHandler):
+    """ RotatingFileHandler that holds records in RAM and writes them in batches
+
+        The stock handler writes (and flushes, and stats the file) for every
+        record, which stalls the event loop on flash and wears it. Here each
+        formatted line goes into a ring buffer of ``capacity`` lines, and the
+        ``run()`` task writes the whole buffer in one go once it holds
+        ``flush_bytes`` of text or ``flush_interval`` seconds have passed.
+        Call ``flush()`` at shutdown to write out what is left.
+
+        If the buffer fills before the task gets to run, the oldest line is
+        dropped to make room. ``dropped`` counts them, and the next write
+        notes how many were lost at that point in the log.
+    """
+    def __init__(self, filename: str, mode: str = 'a', maxBytes: int = 0, backupCount: int = 0,
+                 capacity: int = 64, flush_bytes: int = 2048, flush_interval: float = 2.0):
+        super().__init__(filename, mode, maxBytes, backupCount)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._ring = [None] * capacity
+        self._head = 0                  # Oldest line
+        self._count = 0
+        self._bytes = 0
+        self._lost = 0                  # Dropped since the last write
+        self._wake = asyncio.Event()
+        self._due = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        line = self.format(record) + self.terminator
+        cap = len(self._ring)
+        if self._count == cap:          # Full, drop the oldest
+            self._bytes -= len(self._ring[self._head])
+            self._ring[self._head] = line
+            self._head = (self._head + 1) % cap
+            self.dropped += 1
+            self._lost += 1
+        else:
+            self._ring[(self._head + self._count) % cap] = line
+            self._count += 1
+        self._bytes += len(line)
+        if self._bytes >= self.flush_bytes:
+            self._due = monotonic()     # So the I/O loop does not block until the old deadline
+            self._wake.set()
+
+    def flush(self) -> None:
+        """ Write out all buffered lines """
+        if self._count == 0 and self._lost == 0:
+            return
+        cap = len(self._ring)
+        lines = [self._ring[(self._head + i) % cap] for i in range(self._count)]
+        if self._lost:
+            lines.insert(0, f'*** {self._lost} log messages dropped, buffer full{self.terminator}')
+        for i in range(cap):
+            self._ring[i] = None
+        self._head = self._count = self._bytes = self._lost = 0
+        logsize = self.GetLogSize()
+        if logsize is not None and logsize >= self._maxBytes > 0 and self._backupCount > 0:
+            self.doRollover()
+        self.stream.write(''.join(lines))
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+    def next_due(self) -> float:
+        """When ``run()`` next writes, or None if nothing is buffered"""
+        return self._due if self._count or self._lost else None
+
+    async def run(self):
+        while True:
+            self._due = monotonic() + self.flush_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            self.flush()
+
+def shutdown():
+    """ Write out any buffered log lines - call at app exit """
+    if file_handler is not None:
+        file_handler.flush()
 
 def init_logging():
     """ Create the logger - called at app startup
@@ -63,8 +191,10 @@ def init_logging():
         Customized Python logger.
 
     """
+    global file_handler
 
-    logger = logging.getLogger()                # Root logger, see above
+    logger = Logger('')                         # Root logger, see above
+    logging.logger_cache[''] = logger           # So getLogger() hands back this one
     logger.setLevel(Config.log_level)
     formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s', '%Y-%m-%dT%H:%M:%S')
     logging._default_handler.setFormatter(formatter)  # This is the stdout handler, level set above
@@ -72,14 +202,18 @@ def init_logging():
     fat = storage.getmount("/")
     if not fat.readonly:
         # Add a logfile handler, same formatter and level
-        handler = logging.RotatingFileHandler('alpyca.log',
+        handler = BufferedRotatingFileHandler('alpyca.log',
                                                         mode='w',
                                                         maxBytes=Config.max_size_mb * 1000000,
-                                                        backupCount=Config.num_keep_logs)
+                                                        backupCount=Config.num_keep_logs,
+                                                        capacity=Config.buffer_lines,
+                                                        flush_bytes=Config.flush_bytes,
+                                                        flush_interval=Config.flush_interval)
         handler.setLevel(Config.log_level)
         handler.setFormatter(formatter)
         handler.doRollover()                                            # Always start with fresh log
         logger.addHandler(handler)
+        file_handler = handler                                          # app.main() runs its writer task
 
     if not Config.log_to_stdout:
         """
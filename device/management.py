@@ -33,11 +33,10 @@
 # SOFTWARE.
 # -----------------------------------------------------------------------------
 
-from adafruit_httpserver import Request, JSONResponse
-from shr import PropertyResponse, DeviceMetadata
+from adafruit_httpserver import Request
+from shr import StaticProperty, StaticResponse, DeviceMetadata
 from config import Config
-# For each *type* of device served
-from rotator import RotatorMetadata
+import registry
 
 global logger
 logger = None                   # Safe on Python 3.7 but no intellisense in VSCode etc.
@@ -45,35 +44,40 @@ logger = None                   # Safe on Python 3.7 but no intellisense in VSCo
 # -----------
 # APIVersions
 # -----------
+_apiversions = StaticProperty([ 1 ])   # TODO MAKE CONFIG OR GLOBAL
+
 class apiversions:
     def on_get(req: Request):
-        apis = [ 1 ]                            # TODO MAKE CONFIG OR GLOBAL
-        return JSONResponse(req, PropertyResponse(apis, req).dict)
+        return StaticResponse(req, _apiversions)
 
 # -------------------------
 # Alpaca Server Description
 # -------------------------
+_description = StaticProperty({
+    'ServerName'   : DeviceMetadata.Description,
+    'Manufacturer' : DeviceMetadata.Manufacturer,
+    'Version'      : DeviceMetadata.Version,
+    'Location'     : Config.location
+    })
+
 class description:
     def on_get(req: Request):
-        desc = {
-            'ServerName'   : DeviceMetadata.Description,
-            'Manufacturer' : DeviceMetadata.Manufacturer,
-            'Version'      : DeviceMetadata.Version,
-            'Location'     : Config.location
-            }
-        return JSONResponse(req, PropertyResponse(desc, req).dict)
+        return StaticResponse(req, _description)
 
 # -----------------
 # ConfiguredDevices
 # -----------------
+_configureddevices: StaticProperty = None     # See init()
+
+def init():
+    """Serialize the ConfiguredDevices response, once registry.load() has run"""
+    global _configureddevices
+    _configureddevices = StaticProperty(registry.configured_devices())
+
+def configured_devices() -> list:
+    """The devices served, as ``configureddevices`` reports them"""
+    return _configureddevices.value
+
 class configureddevices():
     def on_get(req: Request):
-        confarray = [    # TODO ADD ONE FOR EACH DEVICE TYPE AND INSTANCE SERVED
-            {
-            'DeviceName'    : RotatorMetadata.Name,
-            'DeviceType'    : RotatorMetadata.DeviceType,
-            'DeviceNumber'  : 0,
-            'UniqueID'      : RotatorMetadata.DeviceID
-            }
-        ]
-        return JSONResponse(req, PropertyResponse(confarray, req).dict)
\ No newline at end of file
+        return StaticResponse(req, _configureddevices)
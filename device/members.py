@@ -0,0 +1,98 @@
+from adafruit_httpserver import Request, Route, GET, InvalidPathError
+from shr import PropertyResponse, MethodResponse, AlpacaResponse, PreProcessRequest, \
+                StaticProperty, StaticResponse, get_request_field, to_bool
+from exceptions import DriverException, InvalidValueException, NotConnectedException, \
+                NotImplementedException
+
+_type_names = {float: 'float', int: 'integer', to_bool: 'boolean'}    # For "not a valid ..."
+
+class MemberTable:
+    """Responders for the members of one device type, run from a table.
+
+    Each row of ``table`` describes one member and HTTP method::
+
+        (Name, method, accessor, needs_connected, param)
+
+    ``Name`` is the ASCOM member name (the route is its lower case, the
+    DriverException message ``<device_type>.<Name> failed``). ``accessor``
+    is one of
+
+    * a :py:class:`~shr.StaticProperty`, sent as it is
+    * the name of a device attribute: read on GET; on PUT, a property is
+      set to the parameter, a method is called (with the parameter if the
+      row has one)
+    * a function, called with no arguments on GET (returning the value, or
+      a StaticProperty) or with the parameter on PUT
+    * None for a member that is not implemented
+
+    ``param`` is None or ``(field, convert)``, or ``(field, convert, lo, hi)``
+    to also require ``lo <= value < hi``. A missing field and a bad boolean
+    are a 400 Bad Request, as before. Another conversion failure or a value
+    out of range is an InvalidValueException. ``device()`` returns the
+    device instance, which is checked for ``connected`` first if the row
+    needs it.
+
+    ``on_request`` is the one responder for every route from ``routes()``,
+    decorated with ``preprocess``, the device type's PreProcessRequest
+    (shared with its other responders, so one ``maxdev`` covers them all). It finds the row from the method and the last part
+    of the path.
+    """
+    def __init__(self, device_type: str, preprocess: PreProcessRequest, device, table: tuple):
+        self.device_type = device_type
+        self.device = device
+        self._rows = {(row[1], row[0].lower()): row for row in table}
+        self.on_request = preprocess(self._respond)
+
+    def routes(self, api_version) -> list:
+        prefix = f'/api/v{api_version}/{self.device_type.lower()}/<devnum>/'
+        return [Route(prefix + member, method, self.on_request) for method, member in self._rows]
+
+    @staticmethod
+    def _error(req: Request, is_get: bool, err):
+        if is_get:
+            return AlpacaResponse(req, PropertyResponse(None, req, err))
+        return AlpacaResponse(req, MethodResponse(req, err))
+
+    def _respond(self, req: Request, devnum: str):
+        path = req.path
+        name, method, accessor, needs_connected, param = self._rows[(req.method, path[path.rfind('/') + 1:])]
+        is_get = method == GET
+        if accessor is None:
+            return self._error(req, is_get, NotImplementedException())
+        if isinstance(accessor, StaticProperty):
+            return StaticResponse(req, accessor)
+        dev = self.device()
+        if needs_connected and not dev.connected:
+            return self._error(req, is_get, NotConnectedException())
+        if param is not None:
+            field = param[0]
+            raw = get_request_field(field, req)         # 400 if missing
+            try:
+                value = param[1](raw)
+            except InvalidPathError:                    # Bad boolean, also a 400
+                raise
+            except Exception:
+                return self._error(req, is_get, InvalidValueException(
+                            f'{field} {raw} not a valid {_type_names.get(param[1], "value")}.'))
+            if len(param) > 2 and not param[2] <= value < param[3]:
+                what = field.lower()
+                return self._error(req, is_get, InvalidValueException(
+                            f'Invalid {what} {value} outside range {param[2]} <= {what} < {param[3]}.'))
+        try:
+            if is_get:
+                value = accessor() if callable(accessor) else getattr(dev, accessor)
+                if isinstance(value, StaticProperty):
+                    return StaticResponse(req, value)
+                return AlpacaResponse(req, PropertyResponse(value, req))
+            if not callable(accessor):
+                if isinstance(getattr(type(dev), accessor, None), property):
+                    setattr(dev, accessor, value)
+                    return AlpacaResponse(req, MethodResponse(req))
+                accessor = getattr(dev, accessor)
+            if param is None:
+                accessor()
+            else:
+                accessor(value)
+            return AlpacaResponse(req, MethodResponse(req))
+        except Exception as ex:
+            return self._error(req, is_get, DriverException(0x500, f'{self.device_type}.{name} failed', ex))
@@ -0,0 +1,137 @@
+from adafruit_logging import Logger
+import asyncio
+import gc
+from time import monotonic
+from adafruit_httpserver import Request, JSONResponse
+
+logger: Logger = None
+
+PAUSE_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100)      # Upper edges; the last bucket is above 100
+
+class MemoryManager:
+    """Runs the garbage collector when nothing else is going on.
+
+    CircuitPython collects when an allocation finds the heap full, which
+    is usually in the middle of a request (a 20-50 ms pause on a
+    ``position`` GET). The server calls ``on_idle()`` when it is about to
+    wait with no request part-received and nothing due for a while (see
+    :py:meth:`server.AlpacaServer.add_idle`). If free heap is below
+    ``threshold`` bytes then, it is collected there and then, so the heap
+    rarely fills up mid-request. It is not collected again until something
+    has been allocated since.
+
+    Every collection made here is timed into a pause histogram.
+    ``run()`` samples free heap every ``sample_interval`` seconds and keeps
+    its low-water mark. ``stats()`` is what the diagnostics endpoint
+    reports. On CPython (the host) there is no ``gc.mem_free()``; the heap
+    figures are None and ``on_idle()`` only collects when ``threshold`` is
+    0, which means after every idle gap.
+    """
+    def __init__(self, threshold: int, sample_interval: float, clock = monotonic):
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self._clock = clock
+        self._mem_free = getattr(gc, 'mem_free', None)
+        self._due = None
+        self._after = None                  # Free heap after the last collection
+        self.low_water = None               # Least free heap seen
+        self.startup_seconds = None         # See startup_done()
+        self.startup_free = None
+        #
+        # Counters
+        #
+        self.collections = 0
+        self.pause_total = 0.0
+        self.pause_max = 0.0
+        self.histogram = [0] * (len(PAUSE_BUCKETS_MS) + 1)
+
+    def mem_free(self) -> int:
+        """Free heap in bytes, or None if this port does not say"""
+        if self._mem_free is None:
+            return None
+        free = self._mem_free()
+        if self.low_water is None or free < self.low_water:
+            self.low_water = free
+        return free
+
+    def collect(self) -> float:
+        """Collect now and record the pause.
+
+        Returns:
+            The pause in seconds.
+        """
+        t0 = self._clock()
+        gc.collect()
+        pause = self._clock() - t0
+        self.collections += 1
+        self.pause_total += pause
+        if pause > self.pause_max:
+            self.pause_max = pause
+        ms = pause * 1000
+        i = 0
+        while i < len(PAUSE_BUCKETS_MS) and ms > PAUSE_BUCKETS_MS[i]:
+            i += 1
+        self.histogram[i] += 1
+        return pause
+
+    def on_idle(self) -> bool:
+        """The server's idle hook. True if it collected."""
+        free = self.mem_free()
+        if free is None:
+            if self.threshold:
+                return False
+        elif free >= self.threshold or (self._after is not None and free >= self._after):
+            return False
+        self.collect()
+        self._after = self.mem_free()
+        return True
+
+    def startup_done(self, started: float):
+        """Record the time since ``started`` and the free heap, once the app is set up
+
+        ``started`` is ``monotonic()`` when code.py began, before it imported
+        anything, so the time includes loading (or compiling) every module.
+        The heap is collected first: what is left is the code and data the
+        app keeps, not the compiler's garbage.
+        """
+        if started is not None:
+            self.startup_seconds = round(self._clock() - started, 3)
+        gc.collect()
+        self.startup_free = self.mem_free()
+
+    def stats(self) -> dict:
+        buckets = {f'<={ms}ms': n for ms, n in zip(PAUSE_BUCKETS_MS, self.histogram)}
+        buckets[f'>{PAUSE_BUCKETS_MS[-1]}ms'] = self.histogram[-1]
+        alloc = getattr(gc, 'mem_alloc', None)
+        return {
+            'MemFree': self.mem_free(),
+            'MemAlloc': alloc() if alloc is not None else None,
+            'LowWater': self.low_water,
+            'Threshold': self.threshold,
+            'StartupSeconds': self.startup_seconds,
+            'StartupMemFree': self.startup_free,
+            'Collections': self.collections,
+            'PauseMeanMs': round(self.pause_total / self.collections * 1000, 3) if self.collections else None,
+            'PauseMaxMs': round(self.pause_max * 1000, 3),
+            'PauseHistogram': buckets,
+        }
+
+    def next_due(self) -> float:
+        """When ``run()`` next samples the heap"""
+        return self._due
+
+    async def run(self):
+        """Heap sampling task"""
+        while True:
+            self.mem_free()
+            self._due = self._clock() + self.sample_interval
+            await asyncio.sleep(self.sample_interval)
+
+manager: MemoryManager = None       # Set by app.main()
+
+# -----------
+# Diagnostics
+# -----------
+class diagnostics:
+    def on_get(req: Request):
+        return JSONResponse(req, manager.stats())
@@ -0,0 +1,80 @@
+from adafruit_logging import Logger
+from adafruit_httpserver import Server, Route, GET
+import setup
+
+logger: Logger = None
+
+served = []     # (name, module, metadata, UniqueIDs) per device type served, as load() found them
+
+def load(devices: dict) -> list:
+    """Import the device type modules named in config.toml ``[devices]``
+
+    ``devices`` maps a device type module (``rotator`` for rotator.py, also
+    the device type in the URLs) to how many instances of it to serve,
+    device numbers 0 to count - 1. Only those modules are imported, so the
+    heap holds just the types this board serves. A type whose count is not
+    a number, or whose module is missing or lacks the parts below, is logged
+    and skipped, and a count above what the module's
+    ``<Type>Metadata.MaxDeviceNumber`` allows is cut down to it.
+
+    A device type module has, as the templates do, a ``<Type>Metadata``
+    class, ``configure(count)`` which makes its responders serve device
+    numbers 0 to count - 1 and returns their UniqueIDs,
+    ``init_routes(server, api_version)``, and ``start(logger, server)``
+    which starts the device and returns its asyncio tasks.
+    """
+    served.clear()
+    for name, count in devices.items():
+        if not isinstance(count, int) or isinstance(count, bool):
+            logger.error('Device type %s has count %r, not a number of devices', name, count)
+            continue
+        if count < 1:
+            continue
+        try:
+            module = __import__(name)
+        except ImportError as ex:
+            logger.error('Device type %s is configured but cannot be imported: %s', name, ex)
+            continue
+        try:
+            metadata = getattr(module, name.capitalize() + 'Metadata')
+            configure = module.configure
+        except AttributeError as ex:
+            logger.error('Device type %s is not a device type module: %s', name, ex)
+            continue
+        if count > metadata.MaxDeviceNumber + 1:
+            logger.warning('%s supports %d device(s), serving that many, not %d', name,
+                           metadata.MaxDeviceNumber + 1, count)
+            count = metadata.MaxDeviceNumber + 1
+        served.append((name, module, metadata, configure(count)))
+        logger.info('Serving %d %s device(s)', count, name)
+    if not served:
+        logger.warning('No devices configured, see [devices] in config.toml')
+    return served
+
+def configured_devices() -> list:
+    """The ``configureddevices`` list for the device types served"""
+    devices = []
+    for name, module, metadata, uids in served:
+        for devnum, uid in enumerate(uids):
+            devices.append({
+                'DeviceName'    : metadata.Name,
+                'DeviceType'    : metadata.DeviceType,
+                'DeviceNumber'  : devnum,
+                'UniqueID'      : uid
+            })
+    return devices
+
+def init_routes(server: Server, api_version):
+    """Each served device type's routes, and its setup page"""
+    for name, module, metadata, uids in served:
+        module.init_routes(server, api_version)
+        server.add_routes([
+            Route(f'/setup/v{api_version}/{name}/<devnum>/setup', GET, setup.devsetup.on_get),
+        ])
+
+def start(logger: Logger, server: Server) -> list:
+    """Start every served device; returns their tasks"""
+    tasks = []
+    for name, module, metadata, uids in served:
+        tasks += module.start(logger, server)
+    return tasks
@@ -63,13 +63,18 @@
 # 16-Sep-2024   rbd 1.0 Add logic for proper InvalidValueException on
 #               string to float conversions instead of just 400 errors.
 #
+import asyncio
+import json
 import time
-from adafruit_httpserver import Request, Response, JSONResponse, Server, Route, GET, PUT, BAD_REQUEST_400, InvalidPathError
+from adafruit_httpserver import Request, Response, Server, Route, GET, PUT, BAD_REQUEST_400, \
+                SERVICE_UNAVAILABLE_503
 from adafruit_logging import Logger
-from shr import PropertyResponse, MethodResponse, PreProcessRequest, \
-                StateValue, get_request_field, to_bool
+from shr import MethodResponse, AlpacaResponse, PreProcessRequest, StateValue, StaticProperty, \
+                StateSnapshot, get_request_field, to_bool
 from exceptions import *        # Nothing but exception classes
+from members import MemberTable
 from rotatordevice import RotatorDevice
+from stream import EventStream, StreamHub
 
 logger: Logger = None           # Really should use Pyton 3.10 or later
 #logger = None                  # Safe on Python 3.7 but no intellisense in VSCode etc.
@@ -81,8 +86,10 @@ logger: Logger = None           # Really should use Pyton 3.10 or later
 # Each responder on_get() and on_put() is called with a devnum parameter to indicate
 # which instance of the device (0-based) is being called by the client. Leave this
 # set to 0 for the simple case of controlling only one instance of this device type.
+# How many are actually served comes from config.toml, see configure().
 #
 maxdev = 0                      # Single instance
+_preprocess = PreProcessRequest(maxdev)     # Every responder's, configure() sets its maxdev
 
 # -------------------
 # ROTATOR DEVICE INFO
@@ -99,20 +106,53 @@ class RotatorMetadata:
     MaxDeviceNumber = maxdev
     InterfaceVersion = 4        # IRotatorV4 (Platform 7)
 
+# Responses to the members above, serialized once. See StaticProperty.
+_description = StaticProperty(RotatorMetadata.Description)
+_driverinfo = StaticProperty(RotatorMetadata.Info)
+_driverversion = StaticProperty(RotatorMetadata.Version)
+_interfaceversion = StaticProperty(RotatorMetadata.InterfaceVersion)
+_name = StaticProperty(RotatorMetadata.Name)
+_supportedactions = StaticProperty(['MyAction', 'YourAction', 'ReadProperties'])  # See action.on_put()
+_canreverse = StaticProperty(True)      # IRotatorV3, CanReverse must be True
+
 # --------------------
 # SIMULATED ROTATOR ()
 # --------------------
 rot_dev = None
+rot_events = None
+_state: StateSnapshot = None
 # At app init not import :-)
 def start_rot_device(logger: Logger):
     logger = logger
-    global rot_dev
+    global rot_dev, rot_events, _state
     rot_dev = RotatorDevice(logger)
+    rot_events = StreamHub(_event_data, Config.max_streams)
+    rot_dev.subscribe(rot_events.notify)
+    _state = StateSnapshot(_capture_state, Config.state_interval)
     rot_dev.can_reverse = Config.can_reverse
     rot_dev.step_size = Config.step_size
     rot_dev.steps_per_sec = Config.steps_per_sec
     rot_dev.sync_write_connected = Config.sync_write_connected
 
+def configure(count: int) -> list:
+    """Serve device numbers 0 to ``count`` - 1 (see registry.load())
+
+    Returns:
+        The UniqueID of each device number served.
+    """
+    _preprocess.maxdev = count - 1
+    return [RotatorMetadata.DeviceID]       # maxdev is 0, so count is 1
+
+def start(log: Logger, server: Server) -> list:
+    """Start the rotator and its tasks (see registry.start())"""
+    global logger
+    logger = log
+    start_rot_device(log)
+    # So the server's I/O loop wakes when these tasks are due
+    server.add_timer(rot_dev.next_due)
+    server.add_timer(rot_events.next_due)
+    return [asyncio.create_task(rot_dev.run()), asyncio.create_task(rot_events.run())]
+
 # --------------------
 # RESOURCE CONTROLLERS
 # --------------------
@@ -121,8 +161,10 @@ class action:
     """Invoke the specified device-specific custom action
 
         See https://ascom-standards.org/newdocs/rotator.html#Rotator.Action
+
+        ReadProperties is described below with ``_read_properties()``.
     """
-    @PreProcessRequest(maxdev)
+    @_preprocess
     def on_put(req: Request, devnum: int):
         name = get_request_field('ActionName', req)
         params = get_request_field('ActionParameters', req)
@@ -133,529 +175,208 @@ class action:
         elif name.lower() == 'youraction':
             logger.info('YourAction called')
             # Execute rot_dev.YourAction(params)
+        elif name.lower() == 'readproperties':
+            try:
+                names = _member_names(params)
+            except ValueError:
+                return AlpacaResponse(req, MethodResponse(req,
+                            InvalidValueException(f'ReadProperties: bad member list {params}')))
+            return AlpacaResponse(req, MethodResponse(req, value=json.dumps(_read_properties(names))))
         else:
-            return JSONResponse(req, MethodResponse(req, ActionNotImplementedException()).dict)
+            return AlpacaResponse(req, MethodResponse(req, ActionNotImplementedException()))
         # If you don't want to implement this at all then
-        # return JSONResponse(req, MethodResponse(req, NotImplementedException()).dict)
-
-
-class commandblind:
-    # Do not use
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        return JSONResponse(req, MethodResponse(req, NotImplementedException()).dict)
-
-
-class commandbool:
-    # Do not use
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        return JSONResponse(req, MethodResponse(req, NotImplementedException()).dict)
-
-
-class commandstring:
-    # Do not use
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        return JSONResponse(req, MethodResponse(req, NotImplementedException()).dict)
-
-# Connected, though common, is implemented in rotator.py
-
-class description:
-    """Description of the device such as manufacturer and model number.
-        Any ASCII characters may be used.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Description
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(RotatorMetadata.Description, req).dict)
-
-
-class driverinfo:
-    """Descriptive and version information about the ASCOM **driver**
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.DriverInfo
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(RotatorMetadata.Info, req).dict)
-
-
-class interfaceversion:
-    """ASCOM Device interface definition version that this device supports.
-        Should return 4 for this interface version IRotatorV4.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.InterfaceVersion
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(RotatorMetadata.InterfaceVersion, req).dict)
-
-
-class driverversion:
-    """String containing only the major and minor version of the **driver**.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.DriverVersion
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(RotatorMetadata.Version, req).dict)
-
-
-class name:
-    """The short name of the **driver**, for display purposes.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Name
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(RotatorMetadata.Name, req).dict)
-
-
-class supportedactions:
-    """Returns the list of custom action names, to be used with ``Action()``,
-        supported by this driver.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.SupportedActions
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        val = []
-        val.append('MyAction')
-        val.append('YourAction')
-        return JSONResponse(req, PropertyResponse(val, req).dict)  # Not PropertyNotImplemented
-
-
-class canreverse:
-    """True if the rotator supports the ``Reverse`` method
-
-        Seehttps://ascom-standards.org/newdocs/rotator.html#Rotator.CanReverse
-
-        Always True for IRotatorV3 (InterfaceVersion >= 3).
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(True, req).dict)    # IRotatorV3, CanReverse must be True
-
-
-class connect:
-    """Connect to the device asynchronously
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Connect
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        try:
-            rot_dev.Connect()
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.Connect failed', ex)).dict)
-
-
-class connected:
-    """Retrieves or sets the connected state of the device
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Connected
-
-        Notes:
-            There is a setting ``sync_write_connected`` in config.toml that
-            determines whether connecting by writing ``Connected = True`` behaves
-            synchronously or acts asynchronously. Conform requires this to be synchronous
-            per IRotatorV3 (PLatform 6).
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        return JSONResponse(req, PropertyResponse(rot_dev.connected, req).dict)
-
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        conn_str = get_request_field('Connected', req)
-
-        try:
-            conn = to_bool(conn_str)              # Raises 400 Bad Request if str to bool fails
-            # ----------------------
-            rot_dev.connected = conn
-            # ----------------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except InvalidPathError as e:
-            return Response(req, str(e), status=BAD_REQUEST_400)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req, # Put is actually like a method :-(
-                            DriverException(0x500, 'Rotator.Connected failed', ex)).dict)
-
-
-class connecting:
-    """True while the device is undertaking an asynchronous connect or disconnect operation.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Connecting
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        try:
-            val = rot_dev.connecting
-            return JSONResponse(req, PropertyResponse(val, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.Connecting failed', ex)).dict)
-
-
-class devicestate:
-    """List of StateValue objects representing the operational properties of this device.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.DeviceState
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            now = time.localtime()
-            asctime = (f"{now.tm_year}-{now.tm_mon:02d}-{now.tm_mday:02d} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}")
-            val = []
-            val.append(StateValue('IsMoving', rot_dev.is_moving))
-            val.append(StateValue('MechanicalPosition', rot_dev.mechanical_position))
-            val.append(StateValue('Position', rot_dev.position))
-            val.append(StateValue('TimeStamp', asctime))
-            return JSONResponse(req, PropertyResponse(val, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Camera.Devicestate failed', ex)).dict)
-
-
-class disconnect:
-    """Disconnect from the device asynchronously.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Disconnect
-
-        NOTE: In this sample, Disconnect is instantaneous
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        try:
-            rot_dev.Disconnect()
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.Disconnect failed', ex)).dict)
-
-
-class ismoving:
-    """True if the rotator is currently moving to a new angle
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.IsMoving
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            # ---------------------
-            moving = rot_dev.is_moving
-            # ---------------------
-            return JSONResponse(req, PropertyResponse(moving, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.IsMovingfailed', ex)).dict)
-
-
-class mechanicalposition:
-    """The raw mechanical position of the rotator in degrees.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.MechanicalPosition
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            # -------------------------------
-            pos = rot_dev.mechanical_position
-            # -------------------------------
-            return JSONResponse(req, PropertyResponse(pos, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.MechanicalPosition failed', ex)).dict)
-
-
-class position:
-    """Current instantaneous Rotator position, allowing for any sync offset, in degrees.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Position
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            # -------------------------------
-            pos = rot_dev.position
-            # -------------------------------
-            return JSONResponse(req, PropertyResponse(pos, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.Position failed', ex)).dict)
-
-
-class reverse:
-    """The direction of rotation CCW or CW
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Reverse
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            # -------------------
-            rev = rot_dev.reverse
-            # -------------------
-            return JSONResponse(req, PropertyResponse(rev, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.Reverse failed', ex)).dict)
-
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, MethodResponse(req,
-                            NotConnectedException()).dict)
-        revstr = get_request_field('Reverse', req)
-        try:
-            rev = to_bool(revstr)
-        except InvalidPathError as e:
-            return Response(req, str(e), status=BAD_REQUEST_400)
-        except:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Reverse {revstr} not a valid boolean.')).dict)
-        try:
-            # ----------------------
-            rot_dev.reverse = rev
-            # ----------------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req, # Put is actually like a method :-(
-                            DriverException(0x500, 'Rotator.Reverse failed', ex)).dict)
-
-
-class stepsize:
-    """Minimum rotation step size (deg)
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.StepSize
-    """
-    @PreProcessRequest(maxdev)
-    def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            # ---------------------
-            steps = rot_dev.step_size
-            # ---------------------
-            return JSONResponse(req, PropertyResponse(steps, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.StepSize failed', ex)).dict)
-
-
-class targetposition:
-    """The destination angle for ``Move()`` and ``MoveAbsolute()``
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.TargetPosition
+        # return AlpacaResponse(req, MethodResponse(req, NotImplementedException()))
+
+
+# ----------------------------
+# READPROPERTIES CUSTOM ACTION
+# ----------------------------
+# Action('ReadProperties', 'Position,IsMoving,TargetPosition') returns the
+# values of several members at once, all read at the same instant, so a
+# client refreshing its status display needs one round trip instead of one
+# per member. The parameter is a comma-separated list or a JSON array of
+# member names (any case). The returned string is a JSON array with one
+#   {"Name": ..., "Value": ..., "ErrorNumber": ..., "ErrorMessage": ...}
+# per name, in the order asked for, with no Value when ErrorNumber is not 0.
+
+# Members that can be read, and whether each needs the device connected
+# (as its own GET responder does)
+_readable = {
+    'canreverse'        : False,
+    'connected'         : False,
+    'connecting'        : False,
+    'ismoving'          : True,
+    'mechanicalposition': True,
+    'position'          : True,
+    'reverse'           : True,
+    'stepsize'          : True,
+    'targetposition'    : True,
+}
+
+def _member_names(params: str) -> list:
+    if params.lstrip().startswith('['):
+        names = json.loads(params)                  # ValueError if malformed
+        if not isinstance(names, list):
+            raise ValueError('not a list')
+    else:
+        names = params.split(',')
+    names = [str(n).strip() for n in names]
+    if not all(names):
+        raise ValueError('empty member name')
+    return names
+
+def _read_properties(names: list) -> list:
+    # All read in one go without yielding, so the values are from one instant.
+    # The moving state comes from the DeviceState snapshot, so the two agree
+    # and a status panel polling both does not take extra snapshots.
+    is_moving, mech_pos, pos, _ = (sv.Value for sv in _device_state().value)
+    connected = rot_dev.connected
+    values = {
+        'canreverse'        : True,             # IRotatorV3, CanReverse must be True
+        'connected'         : connected,
+        'connecting'        : rot_dev.connecting,
+        'ismoving'          : is_moving,
+        'mechanicalposition': mech_pos,
+        'position'          : pos,
+        'reverse'           : rot_dev.reverse,
+        'stepsize'          : rot_dev.step_size,
+        'targetposition'    : rot_dev.target_position,
+    }
+    not_connected = None
+    result = []
+    for name in names:
+        key = name.lower()
+        needs_conn = _readable.get(key)
+        if needs_conn is None:
+            err = InvalidValueException(f'ReadProperties: no member {name}')
+        elif needs_conn and not connected:
+            if not_connected is None:
+                not_connected = NotConnectedException()
+            err = not_connected
+        else:
+            result.append({'Name': name, 'Value': values[key], 'ErrorNumber': 0, 'ErrorMessage': ''})
+            continue
+        result.append({'Name': name, 'ErrorNumber': err.Number, 'ErrorMessage': err.Message})
+    return result
+
+
+# ------------------
+# STATE EVENT STREAM
+# ------------------
+# Not an Alpaca member. The route is added by init_routes().
+
+def _event_data() -> str:
+    if not rot_dev.connected:
+        return '{"Connected": false}'
+    is_moving, mech_pos, pos = rot_dev.state()
+    return json.dumps({
+        'Connected'         : True,
+        'IsMoving'          : is_moving,
+        'MechanicalPosition': mech_pos,
+        'Position'          : pos,
+        'TargetPosition'    : rot_dev.target_position,
+        'Reverse'           : rot_dev.reverse,
+    })
+
+class events:
+    """Server-sent event stream of the rotator state
+
+        ``GET /events/v1/rotator/0?MinInterval=0.5&Heartbeat=15`` keeps the
+        connection open and sends a ``state`` event (the JSON from
+        ``_event_data()``) at once and then each time the state changes: a
+        step, a move starting or stopping, sync, reverse, connect or
+        disconnect. ``MinInterval`` (seconds) limits how often events are
+        sent, changes in between are folded into the next one. A comment
+        line is sent after ``Heartbeat`` seconds without any event. Both
+        default to config.toml settings. 503 if ``max_streams`` clients
+        are already streaming.
     """
-    @PreProcessRequest(maxdev)
+    @_preprocess
     def on_get(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            NotConnectedException()).dict)
-        try:
-            # ---------------------------
-            pos = rot_dev.target_position
-            # ---------------------------
-            return JSONResponse(req, PropertyResponse(pos, req).dict)
-        except Exception as ex:
-            return JSONResponse(req, PropertyResponse(None, req,
-                            DriverException(0x500, 'Rotator.TargetPosition failed', ex)).dict)
-
-
-class halt:
-    """Immediately stop any rotator motion
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Halt
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, MethodResponse(req,
-                            NotConnectedException()).dict)
-        try:
-            # ------------
-            rot_dev.Halt()
-            # ------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.Halt failed', ex)).dict)
-
-
-
-class move:
-    """Start rotation relative to the current position (degrees)
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Move
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, MethodResponse(req,
-                            NotConnectedException()).dict)
-        newpos_str = get_request_field('Position', req)    # May raise 400 bad request
-        try:
-            newpos = origpos = float(newpos_str)
-        except:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Position {newpos_str} not a valid float.')).dict)
-        # The spec calls for "anything goes" requires you to range the
-        # final value modulo 360 degrees.
-        if newpos >= 360.0:
-            newpos -= 360.0
-            logger.debug('Result would be >= 360, setting to {newpos}')
-        if newpos < 0:
-            newpos += 360
-            logger.debug('Result would be < 0, setting to {newpos}')
-        try:
-            # ------------------
-            rot_dev.Move(newpos)    # async
-            # ------------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.Move failed', ex)).dict)
-
-
-class moveabsolute:
-    """Start rotation to the given ``Position`` (degrees)
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.MoveAbsolute
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        if not rot_dev.connected:
-            return JSONResponse(req, MethodResponse(req,
-                            NotConnectedException()).dict)
-        pos_str = get_request_field('Position', req)
-        try:
-            newpos = float(pos_str)
-        except:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Position {pos_str} not a valid float.')).dict)
-        if newpos < 0.0 or newpos >= 360.0:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Invalid position {str(newpos)} outside range 0 <= pos < 360.')).dict)
-        try:
-            # --------------------------
-            rot_dev.MoveAbsolute(newpos)    # async
-            # --------------------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.MoveAbsolute failed', ex)).dict)
-
-
-class movemechanical:
-    """Start rotation to the given new mechanical position (degrees)
-
-    See https://ascom-standards.org/newdocs/rotator.html#Rotator.MoveMechanical
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        formdata = req.get_media()
-        if not rot_dev.connected:
-            return JSONResponse(req, MethodResponse(req,
-                            NotConnectedException()).dict)
-        pos_str = get_request_field('Position', req)
-        try:
-            newpos = float(pos_str)
-        except:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Position {pos_str} not a valid float.')).dict)
-        if newpos < 0.0 or newpos >= 360.0:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Invalid position {str(newpos)} outside range 0 <= pos < 360.')).dict)
-        try:
-            # ----------------------------
-            rot_dev.MoveMechanical(newpos)    # async
-            # ----------------------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.MoveMechanical failed', ex)).dict)
-
-
-class sync:
-    """Syncs the rotator to the specified position angle (degrees) without moving it.
-
-        See https://ascom-standards.org/newdocs/rotator.html#Rotator.Sync
-    """
-    @PreProcessRequest(maxdev)
-    def on_put(req: Request, devnum: int):
-        formdata = req.get_media()
-        if not rot_dev.connected:
-            return JSONResponse(req, MethodResponse(req,
-                            NotConnectedException()).dict)
-        pos_str = get_request_field('Position', req)
-        try:
-            newpos = float(pos_str)
-        except:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Position {pos_str} not a valid float.')).dict)
-        if newpos < 0.0 or newpos >= 360.0:
-            return JSONResponse(req, MethodResponse(req,
-                            InvalidValueException(f'Invalid position {str(newpos)} outside range 0 <= pos < 360.')).dict)
         try:
-            # ------------------
-            rot_dev.Sync(newpos)
-            # ------------------
-            return JSONResponse(req, MethodResponse(req).dict)
-        except Exception as ex:
-            return JSONResponse(req, MethodResponse(req,
-                            DriverException(0x500, 'Rotator.Sync failed', ex)).dict)
+            min_interval = float(get_request_field('MinInterval', req, True, str(Config.stream_min_interval)))
+            heartbeat = float(get_request_field('Heartbeat', req, True, str(Config.stream_heartbeat)))
+        except ValueError:
+            return Response(req, 'MinInterval and Heartbeat must be numbers', status=BAD_REQUEST_400)
+        if not min_interval >= 0.0 or not heartbeat >= 1.0:
+            return Response(req, 'MinInterval must be >= 0 and Heartbeat >= 1', status=BAD_REQUEST_400)
+        stream = EventStream(req, min_interval, heartbeat)
+        if not rot_events.add(stream):
+            return Response(req, 'Too many event streams', status=SERVICE_UNAVAILABLE_503)
+        logger.info('%s <- event stream', req.client_address)
+        return stream
+
+
+# ------------
+# MEMBER TABLE
+# ------------
+# Every other member is a row here, run by members.MemberTable (see there
+# for what each column means). The members themselves are described at
+# https://ascom-standards.org/newdocs/rotator.html#Rotator.<Name>
+
+def _device_state() -> StaticProperty:
+    return _state.get(rot_dev.state_changes)
+
+
+def _capture_state() -> list:
+    is_moving, mech_pos, pos = rot_dev.state()
+    now = time.localtime()
+    asctime = (f"{now.tm_year}-{now.tm_mon:02d}-{now.tm_mday:02d} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}")
+    return [StateValue('IsMoving', is_moving),
+            StateValue('MechanicalPosition', mech_pos),
+            StateValue('Position', pos),
+            StateValue('TimeStamp', asctime)]
+
+
+def _move(newpos: float):
+    # The spec calls for "anything goes" requires you to range the
+    # final value modulo 360 degrees.
+    if newpos >= 360.0:
+        newpos -= 360.0
+        logger.debug('Result would be >= 360, setting to %s', newpos)
+    if newpos < 0:
+        newpos += 360
+        logger.debug('Result would be < 0, setting to %s', newpos)
+    rot_dev.Move(newpos)    # async
+
+
+_angle = ('Position', float, 0, 360)    # 0 <= Position < 360
+
+members = MemberTable('Rotator', _preprocess, lambda: rot_dev, (
+    # Name                 Verb Accessor               Conn.  Parameter
+    ('CommandBlind',       PUT, None,                  False, None),  # Do not use
+    ('CommandBool',        PUT, None,                  False, None),
+    ('CommandString',      PUT, None,                  False, None),
+    ('Description',        GET, _description,          False, None),
+    ('DriverInfo',         GET, _driverinfo,           False, None),
+    ('InterfaceVersion',   GET, _interfaceversion,     False, None),
+    ('DriverVersion',      GET, _driverversion,        False, None),
+    ('Name',               GET, _name,                 False, None),
+    ('SupportedActions',   GET, _supportedactions,     False, None),  # Not PropertyNotImplemented
+    ('CanReverse',         GET, _canreverse,           False, None),  # Always True for IRotatorV3
+    ('Connect',            PUT, 'Connect',             False, None),
+    ('Connected',          GET, 'connected',           False, None),  # Whether writing Connected = True is synchronous is up to sync_write_connected
+    # in config.toml. Conform requires it to be per IRotatorV3 (Platform 6).
+    ('Connected',          PUT, 'connected',           False, ('Connected', to_bool)),
+    ('Connecting',         GET, 'connecting',          False, None),
+    ('DeviceState',        GET, _device_state,         True,  None),
+    ('Disconnect',         PUT, 'Disconnect',          False, None),  # Instantaneous in this sample
+    ('IsMoving',           GET, 'is_moving',           True,  None),
+    ('MechanicalPosition', GET, 'mechanical_position', True,  None),
+    ('Position',           GET, 'position',            True,  None),
+    ('Reverse',            GET, 'reverse',             True,  None),
+    ('Reverse',            PUT, 'reverse',             True,  ('Reverse', to_bool)),
+    ('StepSize',           GET, 'step_size',           True,  None),
+    ('TargetPosition',     GET, 'target_position',     True,  None),
+    ('Halt',               PUT, 'Halt',                True,  None),
+    ('Move',               PUT, _move,                 True,  ('Position', float)),
+    ('MoveAbsolute',       PUT, 'MoveAbsolute',        True,  _angle),
+    ('MoveMechanical',     PUT, 'MoveMechanical',      True,  _angle),
+    ('Sync',               PUT, 'Sync',                True,  _angle),
+))
 
 def init_routes(server: Server, api_version):
     server.add_routes([
         Route(f'/api/v{api_version}/rotator/<devnum>/action', PUT, action.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/commandblind', PUT, commandblind.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/commandbool', PUT, commandbool.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/commandstring', PUT, commandstring.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/description', GET, description.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/driverinfo', GET, driverinfo.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/interfaceversion', GET, interfaceversion.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/driverversion', GET, driverversion.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/name', GET, name.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/supportedactions', GET, supportedactions.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/canreverse', GET, canreverse.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/connect', PUT, connect.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/connected', GET, connected.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/connected', PUT, connected.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/connecting', GET, connecting.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/devicestate', GET, devicestate.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/disconnect', PUT, disconnect.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/ismoving', GET, ismoving.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/mechanicalposition', GET, mechanicalposition.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/position', GET, position.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/reverse', GET, reverse.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/reverse', PUT, reverse.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/stepsize', GET, stepsize.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/targetposition', GET, targetposition.on_get),
-        Route(f'/api/v{api_version}/rotator/<devnum>/halt', PUT, halt.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/move', PUT, move.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/moveabsolute', PUT, moveabsolute.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/movemechanical', PUT, movemechanical.on_put),
-        Route(f'/api/v{api_version}/rotator/<devnum>/sync', PUT, sync.on_put),
-    ])
+        Route(f'/events/v{api_version}/rotator/<devnum>', GET, events.on_get),
+    ] + members.routes(api_version))
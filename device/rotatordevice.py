@@ -52,14 +52,32 @@
 # 20-Feb-2024   rbd 0.7 Setting for Connected-Write to be sync or async
 #
 from adafruit_logging import Logger
+import asyncio
+from time import monotonic
 
 class RotatorDevice:
-    """Simulated rotator device that does moves in separate Timer threads.
+    """Simulated rotator device that does moves in an asyncio task.
 
     Properties and  methods generally follow the Alpaca interface.
-    Debug tracing here via (commented out) print() to avoid locking issues.
-    Hopefully you are familiar with Python threading and the need to lock
-    shared data items.
+    Debug tracing here via (commented out) print().
+
+    **Motion Engine**
+
+    ``run()`` is a task on the app's event loop. While a move is in progress
+    it steps ``_mech_pos`` by ``step_size`` toward the target at
+    ``steps_per_sec``. Steps are timed from the start of the move on the
+    monotonic clock rather than counted per wakeup, so if the loop is busy
+    serving HTTP the steps that fell due in the meantime are all taken on
+    the next wakeup and none are lost. ``tick()`` does the work for a given
+    time and can be driven directly with a simulated clock.
+
+    Everything runs on the one event loop, so ``Halt()`` and the ``Move*()``
+    methods change the target (or stop) between steps, never during one.
+    A move started while moving retargets the move in progress.
+    ``state()`` reads the DeviceState properties together, and
+    ``state_changes`` counts the starts, stops and syncs so that a saved
+    copy of them can tell when it is out of date. Functions passed to
+    ``subscribe()`` are called on every change, steps included.
 
     **Mechanical vs Virtual Position**
 
@@ -68,10 +86,7 @@ class RotatorDevice:
     the ``Sync()`` offset is applied.
 
     """
-    #
-    # Only override __init_()  and run() (pydoc 17.1.2)
-    #
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, clock = monotonic):
         self.name: str = 'device'
         self.logger = logger
         #
@@ -95,8 +110,14 @@ class RotatorDevice:
         #
         # Rotator engine
         #
+        self._clock = clock
         self._interval: float = 1.0 / self._steps_per_sec
         self._stopped: bool = True
+        self._move_t0: float = 0.0      # Step n of a move is due at _move_t0 + n * _interval
+        self._steps: int = 0
+        self._wake = asyncio.Event()
+        self.state_changes: int = 0     # Bumped on start, stop and sync (not on steps)
+        self._listeners = []            # See subscribe()
         #
         # Connect delay
         #
@@ -117,52 +138,98 @@ class RotatorDevice:
             pos += 360.0
         return pos
 
+    def subscribe(self, listener) -> None:
+        """Call ``listener()`` whenever the state changes"""
+        self._listeners.append(listener)
+
+    def _changed(self) -> None:
+        for listener in self._listeners:
+            listener()
+
     def _conn_complete(self):
         self._connlock.acquire()
         self.logger.info('[connected]')
         self._connecting = False
         self._connected = True
         self._connlock.release()
+        self._changed()
 
-    def start(self, from_run: bool = False) -> None:
-        #print('[start]')
-        #print('[start] got lock')
-        if from_run or self._stopped:
+    def start(self) -> None:
+        self.state_changes += 1
+        if self._stopped:
+            if not self._step(0.0):                 # Already there
+                self.stop()
+                return
             self._stopped = False
+            self._move_t0 = self._clock()
+            self._steps = 0
+            self._wake.set()
+        self._changed()
 
-
-    def _run(self) -> None:
+    def _step(self, step_size: float) -> bool:
+        """Step toward the target; False once there (without stepping if it already was)"""
         delta = self._tgt_mech_pos - self._mech_pos
         if delta < -180.0:
            delta += 360.0
         if delta >= 180.0:
            delta -= 360.0
-        #print(f'[_run] final delta={str(delta)}')
-        if abs(delta) > (self._step_size / 2.0):
-            self._is_moving = True
-            if delta > 0:
-                #print('[_run] delta > 0 go positive')
-                self._mech_pos += self._step_size
-                if self._mech_pos >= 360.0:
-                    self._mech_pos -= 360.0
-            else:
-                #print('[_run] delta < 0 go negative')
-                self._mech_pos -= self._step_size
-                if self._mech_pos < 0.0:
-                    self._mech_pos += 360.0
-            #print(f'[_run] new pos = {str(self._mech_to_pos(self._mech_pos))}')
+        if abs(delta) <= (self._step_size / 2.0):  # Retargeted to where it is
+            self._mech_pos = self._tgt_mech_pos
+            return False
+        if delta > 0:
+            self._mech_pos += step_size
+            if self._mech_pos >= 360.0:
+                self._mech_pos -= 360.0
+            delta -= step_size
         else:
-            self._is_moving = False
-            self._stopped = True
-        #print('[_run] lock released')
-        if self._is_moving:
-            #print('[_run] more motion needed, start another timer interval')
-            self.start(from_run = True)
+            self._mech_pos -= step_size
+            if self._mech_pos < 0.0:
+                self._mech_pos += 360.0
+            delta += step_size
+        if abs(delta) <= (self._step_size / 2.0):
+            self._mech_pos = self._tgt_mech_pos
+            return False
+        return True
+
+    def tick(self, now: float) -> float:
+        """Take the steps due by ``now``
+
+        Returns:
+            When the next step is due, or None if not moving.
+        """
+        while not self._stopped:
+            due = self._move_t0 + (self._steps + 1) * self._interval
+            if now < due:
+                return due
+            self._steps += 1
+            if not self._step(self._step_size):
+                self.stop()
+            else:
+                self._changed()
+        return None
+
+    def next_due(self) -> float:
+        """When the next step is due, or None if not moving"""
+        if self._stopped:
+            return None
+        return self._move_t0 + (self._steps + 1) * self._interval
+
+    async def run(self):
+        """Motion engine task"""
+        while True:
+            due = self.tick(self._clock())
+            if due is None:
+                await self._wake.wait()
+                self._wake.clear()
+            else:
+                await asyncio.sleep(max(0.0, due - self._clock()))
 
     def stop(self) -> None:
         #print('[stop] Stopping...')
         self._stopped = True
         self._is_moving = False
+        self.state_changes += 1
+        self._changed()
 
     #
     # Guarded properties
@@ -183,6 +250,7 @@ class RotatorDevice:
     @reverse.setter
     def reverse (self, reverse: bool):
         self._reverse = reverse
+        self._changed()
 
     @property
     def step_size(self) -> float:
@@ -199,6 +267,7 @@ class RotatorDevice:
     @steps_per_sec.setter
     def steps_per_sec (self, steps_per_sec: int):
         self._steps_per_sec = steps_per_sec
+        self._interval = 1.0 / steps_per_sec
 
     @property
     def sync_write_connected(self) -> float:
@@ -211,28 +280,31 @@ class RotatorDevice:
     @property
     def position(self) -> float:
         res = self._mech_to_pos(self._mech_pos)
-        self.logger.debug(f'[position] {str(res)}')
+        self.logger.debug('[position] %s', res)
         return res
 
     @property
     def mechanical_position(self) -> float:
         res = self._mech_pos
-        self.logger.debug(f'[mech position] {str(res)}')
+        self.logger.debug('[mech position] %s', res)
         return res
 
     @property
     def target_position(self) -> float:
         res =  self._mech_to_pos(self._tgt_mech_pos)
-        self.logger.debug(f'[target_position] {str(res)}')
+        self.logger.debug('[target_position] %s', res)
         return res
 
     @property
     def is_moving(self) -> bool:
         res =  self._is_moving
-        self.logger.debug(f'[is_moving] {str(res)}')
-        self.logger.debug(f'[is_moving] {str(res)}')
+        self.logger.debug('[is_moving] %s', res)
         return res
 
+    def state(self) -> tuple:
+        """``(is_moving, mechanical_position, position)`` as of one instant"""
+        return (self._is_moving, self._mech_pos, self._mech_to_pos(self._mech_pos))
+
     @property
     def connected(self) -> bool:
         res = self._connected
@@ -251,6 +323,7 @@ class RotatorDevice:
         else:
             self._connected = False
             self.logger.info('[instant disconnected]')
+        self._changed()
 
     @property
     def connecting(self) -> bool:
@@ -262,58 +335,54 @@ class RotatorDevice:
     # =======
 
     def Connect(self) -> None:
-        self.logger.debug(f'[Connect]')
+        self.logger.debug('[Connect]')
         if self._connected:
             self._connecting = False
-            self.logger.debug(f'[Already connected]')
+            self.logger.debug('[Already connected]')
             return
         self._connecting = True
         self._connected = False
+        self._changed()
 
     def Disconnect(self) -> None:
-        self.logger.debug(f'[Disconnect]')
+        self.logger.debug('[Disconnect]')
         if not self._connected:
             self._connecting = False
-            self.logger.debug(f'[Already disconnected]')
+            self.logger.debug('[Already disconnected]')
             return
         if self._is_moving:
             # Yes you could call Halt() but this is for illustration
             raise RuntimeError('Cannot disconnect while rotator is moving')
         self._connected = False
+        self._changed()
 
     # TODO - This is supposed to throw if the final position is outside 0-360, but WHICH position? Mech or user????
     #
     def Move(self, delta_pos: float) -> None:
-        self.logger.debug(f'[Move] pos={str(delta_pos)}')
-        if self._is_moving:
-            raise RuntimeError('Cannot start a move while the rotator is moving')
+        self.logger.debug('[Move] pos=%s', delta_pos)
         self._is_moving = True
         self._tgt_mech_pos = self._mech_pos + delta_pos - self._pos_offset
         if self._tgt_mech_pos >= 360.0:
             self._tgt_mech_pos -= 360.0
         if self._tgt_mech_pos < 0.0:
             self._tgt_mech_pos += 360.0
-        self.logger.debug(f'       targetpos={self._mech_to_pos(self._tgt_mech_pos)}')
+        self.logger.debug('       targetpos=%s', self._mech_to_pos(self._tgt_mech_pos))
         self.start()
 
     def MoveAbsolute(self, pos: float) -> None:
-        self.logger.debug(f'[MoveAbs] pos={str(pos)}')
-        if self._is_moving:
-            raise RuntimeError('Cannot start a move while the rotator is moving')
+        self.logger.debug('[MoveAbs] pos=%s', pos)
         self._is_moving = True
         self._tgt_mech_pos = self._pos_to_mech(pos)
         self.start()
 
     def MoveMechanical(self, pos: float) -> None:
-        if self._is_moving:
-            raise RuntimeError('Cannot start a move while the rotator is moving')
-        self.logger.debug(f'[MoveMech] pos={str(pos)}')
+        self.logger.debug('[MoveMech] pos=%s', pos)
         self._is_moving = True
         self._tgt_mech_pos = pos
         self.start()
 
     def Sync(self, pos: float) -> None:
-        self.logger.debug(f'[Sync] newpos={str(pos)}')
+        self.logger.debug('[Sync] newpos=%s', pos)
         if self._is_moving:
             raise RuntimeError('Cannot sync while rotator is moving')
         self._pos_offset = pos - self._mech_pos
@@ -321,6 +390,8 @@ class RotatorDevice:
            self._pos_offset += 360.0
         if self._pos_offset >= 180.0:
            self._pos_offset -= 360.0
+        self.state_changes += 1
+        self._changed()
 
     def Halt(self) -> None:
         self.logger.debug('[Halt]')
@@ -0,0 +1,664 @@
+from adafruit_logging import Logger
+import asyncio
+import select
+from errno import EAGAIN, ECONNRESET
+from time import monotonic
+from adafruit_httpserver import Server, Request, JSONResponse, SSEResponse, Headers, QueryParams
+from config import Config
+
+logger: Logger = None
+
+REQUEST_BUFFER_BYTES = 2048     # Largest request (headers and body). Alpaca's are a few hundred bytes
+SHED_CONNECTIONS = 2            # Extra sockets used to turn clients away when the table is full
+BUSY_TEXT = 'Server busy, try again shortly'
+
+def _fd(sock):
+    # select.poll() hands back socket objects on CircuitPython but file
+    # descriptors on CPython. Key the connection table by whichever it uses.
+    try:
+        return sock.fileno()
+    except AttributeError:
+        return sock
+
+try:
+    bytearray(1).find(b'\0', 0, 1)
+    _find_in_place = True
+except AttributeError:
+    _find_in_place = False          # Ports without bytearray.find() search a bytes copy
+
+def _find(buf: bytearray, sub: bytes, start: int, end: int) -> int:
+    if _find_in_place:
+        return buf.find(sub, start, end)
+    # Only for ranges not searched before, so each byte is copied about once
+    i = bytes(memoryview(buf)[start:end]).find(sub)
+    return i if i < 0 else start + i
+
+class BufferPool:
+    """Receive buffers allocated once at startup and lent to connections."""
+    def __init__(self, count: int, size: int):
+        self.size = size
+        self._free = [bytearray(size) for _ in range(count)]
+
+    def take(self) -> bytearray:
+        return self._free.pop() if self._free else None
+
+    def give(self, buf: bytearray) -> None:
+        self._free.append(buf)
+
+class AlpacaRequest(Request):
+    """``Request`` parsed in place in a connection's receive buffer.
+
+    ``Request`` wants the request as one ``bytes`` object, which it then
+    splits and decodes again. Here the request line and each header line
+    are decoded straight from their own slice of the buffer, so the only
+    new objects are the strings the handlers use. The server sets ``body``
+    once all of it has arrived.
+    """
+    def __init__(self, server: Server, conn: 'Connection', header_end: int):
+        self.server = server
+        self.connection = conn
+        self.client_address = conn.client_address
+        self._form_data = None
+        self._cookies = None
+        self._body = b''
+        self.size = header_end + 4          # Bytes received, for the debug log
+        view = conn.view
+        # The buffer itself, or one copy of the headers, not one per line
+        head = conn.buf if _find_in_place else bytes(view[:header_end])
+        line_end = head.find(b'\r\n', 0, header_end)
+        if line_end < 0:
+            line_end = header_end
+        self.method, target, self.http_version = str(view[:line_end], 'utf-8').split()
+        target = target.split('?', 1)
+        self.path = target[0]
+        self.query_params = QueryParams(target[1] if len(target) > 1 else '')
+        self.headers = Headers()
+        pos = line_end + 2
+        while pos < header_end:
+            eol = head.find(b'\r\n', pos, header_end)
+            if eol < 0:
+                eol = header_end
+            name, value = str(view[pos:eol], 'utf-8').split(':', 1)
+            self.headers.add(name, value.strip())
+            pos = eol + 2
+
+    @property
+    def body(self) -> bytes:
+        return self._body
+
+    @body.setter
+    def body(self, body: bytes) -> None:
+        self._body = body
+        self.size += len(body)
+
+def _debug_response_sent(response, time_elapsed: float):
+    # As adafruit_httpserver's, which wants request.raw_request
+    request = response._request
+    path = request.path + (f'?{request.query_params}' if request.query_params else '')
+    print(f'{request.client_address[0]} -- "{request.method} {path}" {request.size} -- '
+          f'"{response._status}" {response._size} -- {round(time_elapsed * 1000)}ms')
+
+class Connection:
+    """A client socket in the server's connection table.
+
+    Each connection has its own receive buffer and request deadline, so a
+    client that stalls part way through a request only holds up itself. It
+    may carry several requests (HTTP/1.1 keep-alive). The buffer is lent by
+    the server's :py:class:`BufferPool` for as long as the connection is
+    open; ``fill`` bytes of it are in use.
+
+    Passed to ``Request`` in place of the raw socket. The response classes call
+    ``close()`` when they finish sending; that only closes the socket if the
+    server has not decided to keep the connection alive.
+    """
+    def __init__(self, sock, client_address, buf: bytearray):
+        self.sock = sock
+        self.key = _fd(sock)
+        self.client_address = client_address
+        self.buf = buf
+        self.view = memoryview(buf)
+        self.fill = 0
+        self.scanned = 0            # Where to resume looking for the end of the headers
+        self.request = None         # Headers parsed, waiting for the body
+        self.body_start = 0
+        self.content_length = 0
+        self.deadline = None        # Set while a request is being received
+        self.arrived = 0.0          # When its first bytes came in
+        self.requests = 0
+        self.last_active = monotonic()
+        self.keep_alive = False
+        self.closed = False
+        self.stream = None          # SSEResponse that has taken over the connection
+        self.shed = False           # Accepted only to be sent the 503
+
+    @property
+    def idle(self) -> bool:
+        return self.deadline is None
+
+    def send(self, data) -> int:
+        return self.sock.send(data)
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        return self.sock.recv_into(buffer, nbytes)
+
+    def close(self) -> None:
+        if not self.keep_alive:
+            self.closed = True
+            self.sock.close()
+
+    def hang_up(self) -> None:
+        """Close even if kept alive. The server drops it on its next pass."""
+        self.keep_alive = False
+        if not self.closed:
+            self.close()
+
+class AlpacaServer(Server):
+    """HTTP server driven by socket readiness, serving several clients at once.
+
+    The listening socket, every open client socket and any other socket
+    given to ``watch()`` (the discovery responder's) are registered with one
+    ``select.poll``. The serve task is the app's only I/O loop. It blocks
+    in the poller until a socket is ready or the earliest timer is due,
+    services whatever is ready and then yields to the asyncio loop so the
+    tasks that were woken, or whose timers are due, can run. The timers are
+    the connection deadlines below and the ``next_due()`` of each source
+    given to ``add_timer()`` (motion steps, stream events). With nothing
+    due the poller blocks for up to ``poll_timeout_ms``.
+
+    Client sockets are non-blocking; a request is answered once its headers
+    and body are complete, so a slow client never delays the others.
+
+    At most ``max_connections`` clients are held. When the table is full the
+    longest-idle kept-alive connection is closed to make room; if none is idle,
+    new connections wait in the listen backlog. A client that takes longer than
+    ``request_timeout`` seconds to send a request is dropped.
+
+    HTTP/1.1 connections stay open between requests until the client asks to
+    close, the connection has been idle for ``keepalive_timeout`` seconds, or it
+    has carried ``keepalive_max_requests`` requests.
+
+    A responder that returns an ``SSEResponse`` (see :py:mod:`stream`) keeps
+    the connection for as long as the stream lasts. It is never timed out or
+    evicted, and anything more the client sends on it is ignored.
+
+    Admission control keeps latency bounded under overload. Each pass reads
+    every readable client first, then answers the complete requests oldest
+    first. At most ``max_inflight`` clients are answered in one pass, a
+    client's pipelined requests counting once, and none whose request has
+    waited more than ``queue_budget`` seconds since its first bytes came
+    in; the rest are sent a prebuilt ``503`` with ``Retry-After`` and the
+    connection is closed. A client that connects while the table is full is
+    accepted on one of ``SHED_CONNECTIONS`` spare sockets and sent the same
+    ``503`` instead of waiting in the listen backlog until it times out.
+    ``max_inflight = 0`` turns all of this off.
+
+    ``stats()`` (``/diagnostics/server``) reports the connection reuse and
+    admission control counters.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._api_routes = {}           # (method, version, devicetype, member) -> handler
+        self._static_routes = {}        # (method, path) -> handler
+        self._conns = {}
+        self._poller = select.poll()
+        self._watched = {}              # Key of another socket -> its handler
+        self._timers = []               # See add_timer()
+        self._idle = []                 # See add_idle()
+        self._next_expiry = None
+        self._buffers = BufferPool(Config.max_connections, REQUEST_BUFFER_BYTES)
+        self._drain = bytearray(512)    # Shared by connections that are turned away
+        self._shedding = 0
+        self._admitted = 0
+        self._busy = (f'HTTP/1.1 503 Service Unavailable\r\nContent-Type: text/plain\r\n'
+                      f'Content-Length: {len(BUSY_TEXT)}\r\nRetry-After: {Config.retry_after}\r\n'
+                      f'Connection: close\r\n\r\n{BUSY_TEXT}').encode()
+        self._accepting = True
+        self._nodelay = getattr(self._socket_source, 'TCP_NODELAY', None)
+        self.max_connections = Config.max_connections
+        self.poll_timeout_ms = Config.poll_timeout_ms
+        self.request_timeout = Config.request_timeout
+        self.keepalive_timeout = Config.keepalive_timeout
+        self.keepalive_max_requests = Config.keepalive_max_requests
+        self.max_inflight = Config.max_inflight
+        self.queue_budget = Config.queue_budget
+        #
+        # Connection reuse counters
+        #
+        self.connections_opened = 0
+        self.requests_served = 0
+        self.requests_reused = 0
+        self.closed_idle = 0
+        self.closed_max_requests = 0
+        self.closed_stalled = 0
+        self.closed_evicted = 0
+        #
+        # Admission control counters
+        #
+        self.shed_inflight = 0          # Over max_inflight clients in one pass
+        self.shed_late = 0              # Waited longer than queue_budget
+        self.shed_connections = 0       # Connected while the table was full
+        self.wakeups = 0                # Times the poller returned
+
+    def start(self, host: str, port: int) -> None:
+        super().start(host, port)
+        self._poller.register(self._sock, select.POLLIN)
+        self._listen_key = _fd(self._sock)
+
+    def watch(self, sock, handler) -> None:
+        """Call ``handler()`` from the I/O loop whenever ``sock`` is readable"""
+        self._poller.register(sock, select.POLLIN)
+        self._watched[_fd(sock)] = handler
+
+    def add_timer(self, next_due) -> None:
+        """Wake the I/O loop by ``next_due()``
+
+        ``next_due()`` returns the ``monotonic()`` time a task needs to run
+        next, or None if it is waiting on something else.
+        """
+        self._timers.append(next_due)
+
+    def add_idle(self, hook, min_gap_ms: int) -> None:
+        """Call ``hook()`` when the I/O loop is about to wait
+
+        Only when no request is part-received and nothing is due for at
+        least ``min_gap_ms``, so the hook does not hold up a client.
+        """
+        self._idle.append((hook, min_gap_ms))
+
+    def _run_idle(self, timeout: int) -> bool:
+        if not self._idle:
+            return False
+        for conn in self._conns.values():
+            if conn.deadline is not None and not conn.shed:
+                return False
+        ran = False
+        for hook, min_gap_ms in self._idle:
+            if timeout >= min_gap_ms:
+                hook()
+                ran = True
+        return ran
+
+    def add_routes(self, routes) -> None:
+        """Add routes to the dispatch tables.
+
+        Alpaca device routes of the form ``/api/v{N}/{devicetype}/<devnum>/{member}``
+        go into a dict keyed by ``(method, v{N}, devicetype, member)``, and routes
+        with no URL parameters into a dict keyed by ``(method, path)``. Only anything
+        else is left for ``Server``'s linear pattern scan. As with ``Server``, the
+        first route added for a given method and path wins.
+        """
+        for route in routes:
+            parts = route.path.split('/')
+            if len(parts) == 6 and parts[1] == 'api' and parts[4] == '<devnum>' \
+                            and '<' not in parts[3] + parts[5]:
+                for method in route.methods:
+                    self._api_routes.setdefault((method, parts[2], parts[3], parts[5]), route.handler)
+            elif '<' not in route.path and '...' not in route.path \
+                            and not route.matches(next(iter(route.methods)), route.path + '/')[0]:
+                # (the last test leaves append_slash routes to the pattern scan)
+                for method in route.methods:
+                    self._static_routes.setdefault((method, route.path), route.handler)
+            else:
+                self._routes.append(route)
+
+    def _find_handler(self, method: str, path: str):
+        parts = path.split('/')
+        if len(parts) == 6 and parts[1] == 'api':
+            handler = self._api_routes.get((method, parts[2], parts[3], parts[5]))
+            if handler is not None and parts[4]:
+                devnum = parts[4]
+                return lambda request: handler(request, devnum=devnum)
+        handler = self._static_routes.get((method, path))
+        if handler is not None:
+            return handler
+        return super()._find_handler(method, path)
+
+    @staticmethod
+    def _wants_keep_alive(request: Request) -> bool:
+        hdr = request.headers.get('Connection', '').lower()
+        if request.http_version == 'HTTP/1.0':
+            return hdr == 'keep-alive'
+        return hdr != 'close'
+
+    def stats(self) -> dict:
+        return {
+            'Connections': len(self._conns),
+            'ConnectionsOpened': self.connections_opened,
+            'RequestsServed': self.requests_served,
+            'RequestsReused': self.requests_reused,
+            'ClosedIdle': self.closed_idle,
+            'ClosedMaxRequests': self.closed_max_requests,
+            'ClosedStalled': self.closed_stalled,
+            'ClosedEvicted': self.closed_evicted,
+            'ShedInflight': self.shed_inflight,
+            'ShedLate': self.shed_late,
+            'ShedConnections': self.shed_connections,
+            'Wakeups': self.wakeups,
+        }
+
+    def on_diagnostics(self, req: Request):
+        return JSONResponse(req, self.stats())
+
+    @property
+    def shed(self) -> int:
+        """Requests turned away with a 503"""
+        return self.shed_inflight + self.shed_late + self.shed_connections
+
+    def _make_room(self) -> bool:
+        if len(self._conns) - self._shedding < self.max_connections:
+            return True
+        oldest = None
+        for conn in self._conns.values():
+            if conn.idle and conn.requests and conn.stream is None \
+                            and (oldest is None or conn.last_active < oldest.last_active):
+                oldest = conn
+        if oldest is None:
+            return False
+        if self.max_inflight and monotonic() - oldest.last_active < self.queue_budget:
+            return False                # Likely to send again soon. Turn the newcomer away instead
+        self.closed_evicted += 1
+        self._drop(oldest)
+        return True
+
+    def _set_accepting(self, accepting: bool) -> None:
+        # Stop polling the listener while the table is full, or the poller
+        # would report the pending connection on every pass.
+        if accepting != self._accepting:
+            self._accepting = accepting
+            self._poller.modify(self._sock, select.POLLIN if accepting else 0)
+
+    def _accept(self) -> int:
+        """Accept connections waiting in the listen backlog while there is room."""
+        accepted = 0
+        while True:
+            shed = not self._make_room()
+            if shed and (not self.max_inflight or self._shedding >= SHED_CONNECTIONS):
+                self._set_accepting(False)
+                return accepted
+            try:
+                sock, client_address = self._sock.accept()
+            except OSError as ex:
+                if ex.errno == EAGAIN:
+                    return accepted
+                raise
+            sock.setblocking(False)
+            if self._nodelay is not None:
+                # Responses go out as separate header and body writes. On a
+                # kept-alive socket Nagle would hold the body for the client's
+                # delayed ACK (~40 ms per request).
+                sock.setsockopt(self._socket_source.IPPROTO_TCP, self._nodelay, 1)
+            stale = self._conns.get(_fd(sock))
+            if stale is not None:       # Hung up by its stream, descriptor reused
+                self._drop(stale)
+            if shed:
+                conn = Connection(sock, client_address, self._drain)
+                conn.shed = True
+                conn.deadline = monotonic() + self.request_timeout
+                self._shedding += 1
+            else:
+                conn = Connection(sock, client_address, self._buffers.take())
+            self._conns[conn.key] = conn
+            self._poller.register(sock, select.POLLIN)
+            self.connections_opened += 1
+            accepted += 1
+
+    def _drop(self, conn: Connection) -> None:
+        if self._conns.get(conn.key) is not conn:
+            return
+        del self._conns[conn.key]
+        if conn.shed:
+            self._shedding -= 1
+        else:
+            self._buffers.give(conn.buf)
+        try:
+            self._poller.unregister(conn.key)
+        except (KeyError, ValueError, OSError):
+            pass
+        conn.keep_alive = False
+        if conn.stream is not None:
+            conn.stream.closed = True
+        if not conn.closed:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        self._set_accepting(True)
+
+    def _receive(self, conn: Connection) -> bool:
+        """Read whatever the client has sent into the free end of its buffer.
+
+        Returns:
+            False if the client has hung up.
+        """
+        while conn.fill < len(conn.buf):
+            try:
+                length = conn.sock.recv_into(conn.view[conn.fill:])
+            except OSError as ex:
+                if ex.errno == EAGAIN:
+                    return True
+                raise
+            if length == 0:
+                return False
+            if conn.deadline is None:
+                conn.arrived = monotonic()
+                conn.deadline = conn.arrived + self.request_timeout
+            conn.fill += length
+        return True                     # Full; the rest waits until a request is taken out
+
+    def _next_request(self, conn: Connection) -> Request:
+        """Return the next complete request in the buffer, or None."""
+        if conn.request is None:
+            end = _find(conn.buf, b'\r\n\r\n', conn.scanned, conn.fill)
+            if end < 0:
+                if conn.fill == len(conn.buf):
+                    raise ValueError('Request headers too large')
+                conn.scanned = max(0, conn.fill - 3)
+                return None
+            conn.body_start = end + 4
+            conn.request = AlpacaRequest(self, conn, end)
+            conn.content_length = int(conn.request.headers.get_directive('Content-Length', 0))
+            if conn.body_start + conn.content_length > len(conn.buf):
+                raise ValueError('Request body too large')
+        body_end = conn.body_start + conn.content_length
+        if conn.fill < body_end:
+            return None
+        request = conn.request
+        if conn.content_length:
+            request.body = bytes(conn.view[conn.body_start:body_end])
+        # Move anything after it (a pipelined request) to the front, in steps
+        # that do not overlap
+        rest = conn.fill - body_end
+        for pos in range(0, rest, body_end):
+            n = min(body_end, rest - pos)
+            conn.buf[pos:pos + n] = conn.view[body_end + pos:body_end + pos + n]
+        conn.fill = rest
+        conn.scanned = 0
+        conn.request = None
+        conn.deadline = monotonic() + self.request_timeout if rest else None
+        return request
+
+    def _respond(self, conn: Connection, request: Request) -> None:
+        if self.debug:
+            start_time = monotonic()
+        conn.requests += 1
+        self.requests_served += 1
+        if conn.requests > 1:
+            self.requests_reused += 1
+        handler = self._find_handler(request.method, request.path)
+        response = self._handle_request(request, handler)
+        if response is None:
+            self._drop(conn)
+            return
+        self._set_default_server_headers(response)
+        if isinstance(response, SSEResponse):
+            conn.keep_alive = True
+            conn.stream = response
+            response._send()
+            return
+        conn.keep_alive = self._wants_keep_alive(request)
+        if conn.keep_alive:
+            remaining = self.keepalive_max_requests - conn.requests
+            if remaining <= 0:
+                conn.keep_alive = False
+                self.closed_max_requests += 1
+            else:
+                response._headers.setdefault('Connection', 'keep-alive')
+                response._headers.setdefault('Keep-Alive',
+                                f'timeout={self.keepalive_timeout}, max={remaining}')
+        response._send()
+        if self.debug:
+            _debug_response_sent(response, monotonic() - start_time)
+        if conn.closed:
+            self._drop(conn)
+        else:
+            conn.last_active = monotonic()
+
+    def _refuse(self, conn: Connection) -> None:
+        """Send the prebuilt 503 and close, without waiting on the socket."""
+        try:
+            conn.sock.send(self._busy)
+        except OSError:
+            pass
+        self._drop(conn)
+
+    def _admit(self, conn: Connection) -> bool:
+        if self.max_inflight:
+            if self._admitted >= self.max_inflight:
+                self.shed_inflight += 1
+                return False
+            if monotonic() - conn.arrived > self.queue_budget:
+                self.shed_late += 1
+                return False
+        self._admitted += 1
+        return True
+
+    def _read(self, conn: Connection) -> bool:
+        """Read from a readable client.
+
+        Returns:
+            True if it may have completed a request.
+        """
+        if not self._receive(conn):
+            self._drop(conn)            # Hung up, possibly mid-request
+            return False
+        if conn.shed:
+            self.shed_connections += 1
+            self._refuse(conn)
+            return False
+        if conn.stream is not None:
+            conn.fill = 0
+            conn.deadline = None
+            return False
+        return True
+
+    def _service(self, conn: Connection) -> None:
+        """Answer (or turn away) every request the client has completed."""
+        request = self._next_request(conn)
+        if request is None:
+            return
+        if not self._admit(conn):       # Once per client, not per pipelined request
+            self._refuse(conn)
+            return
+        while request is not None:
+            self._respond(conn, request)
+            if conn.closed:
+                return
+            request = self._next_request(conn)
+
+    def _failed(self, conn: Connection, ex: Exception) -> None:
+        if not isinstance(ex, OSError) or ex.errno != ECONNRESET:
+            logger.error(f'{conn.client_address} request failed: {ex}')
+        self._drop(conn)
+
+    def _expire(self, now: float) -> None:
+        """Drop expired connections and note when the next one expires"""
+        expiry = None
+        for conn in list(self._conns.values()):
+            if conn.closed:
+                self._drop(conn)        # Hung up by its stream
+                continue
+            elif conn.stream is not None:
+                continue
+            elif conn.deadline is not None:
+                if now > conn.deadline:
+                    self.closed_stalled += 1
+                    logger.warning(f'{conn.client_address} request timed out')
+                    self._drop(conn)
+                    continue
+                due = conn.deadline
+            elif now - conn.last_active > self.keepalive_timeout:
+                self.closed_idle += 1
+                self._drop(conn)
+                continue
+            else:
+                due = conn.last_active + self.keepalive_timeout
+            if expiry is None or due < expiry:
+                expiry = due
+        self._next_expiry = expiry
+
+    def _poll_timeout(self, now: float) -> int:
+        """Milliseconds until the earliest timer is due, at most ``poll_timeout_ms``"""
+        timeout = self.poll_timeout_ms
+        due = self._next_expiry
+        for next_due in self._timers:
+            t = next_due()
+            if t is not None and (due is None or t < due):
+                due = t
+        if due is not None:
+            # Round up, or the loop wakes just before the timer and spins
+            timeout = max(0, min(timeout, int((due - now) * 1000) + 1))
+        return timeout
+
+    def process(self, timeout: int) -> int:
+        """Wait up to ``timeout`` ms for socket readiness and service it.
+
+        Returns:
+            The number of sockets that were serviced.
+        """
+        evts = self._poller.poll(timeout)
+        self.wakeups += 1
+        ready = []
+        for obj, evt in evts:
+            key = _fd(obj)
+            if key == self._listen_key:
+                self._accept()
+                continue
+            conn = self._conns.get(key)
+            if conn is None:
+                handler = self._watched.get(key)
+                if handler is not None:
+                    try:
+                        handler()
+                    except Exception as ex:
+                        logger.error(f'Socket handler failed: {ex}')
+                continue
+            if evt & (select.POLLHUP | select.POLLERR) and not evt & select.POLLIN:
+                self._drop(conn)
+                continue
+            try:
+                if self._read(conn):
+                    ready.append(conn)
+            except Exception as ex:
+                self._failed(conn, ex)
+        if len(ready) > 1:
+            ready.sort(key=lambda conn: conn.arrived)
+        shed = self.shed
+        self._admitted = 0
+        for conn in ready:
+            try:
+                self._service(conn)
+            except Exception as ex:
+                self._failed(conn, ex)
+        if self.shed != shed:
+            logger.warning(f'Overloaded, turned away {self.shed - shed} request(s)')
+        self._expire(monotonic())
+        return len(evts)
+
+    async def serve(self, host: str, port: int):
+        self.start(host, port)
+        while True:
+            timeout = self._poll_timeout(monotonic())
+            if self._run_idle(timeout):
+                timeout = self._poll_timeout(monotonic())
+            self.process(timeout)
+            await asyncio.sleep(0)
@@ -35,7 +35,8 @@
 
 from exceptions import Success
 import json
-from adafruit_httpserver import Request, Response, InvalidPathError, BAD_REQUEST_400, FormData
+from time import monotonic
+from adafruit_httpserver import Request, Response, InvalidPathError, BAD_REQUEST_400
 
 global logger
 logger = None                   # Safe on Python 3.7 but no intellisense in VSCode etc.
@@ -78,45 +79,136 @@ def to_bool(str: str) -> bool:
 # missing. In any case, raise a 400 BAD REQUEST. Optional
 # caseless (mostly for the ClientID and ClientTransactionID)
 # ---------------------------------------------------------
-def get_request_field(name: str, req: Request, caseless: bool = False, default: str = None) -> str:
-    bad_desc = f'Missing, empty, or misspelled parameter "{name}"'
-    lcName = name.lower()
-    if req.method == 'GET':
-        for param in req.query_params.items():        # [name,value] tuples
-            if param[0].lower() == lcName:
-                if param[1] == None:
-                    return default
-                return param[1]
-        if default == None:
-            raise InvalidPathError(_bad_title, bad_desc)                # Missing or incorrect casing
-        return default                          # not in args, return default
-    else:                                       # Assume PUT since we never route other methods
-        formdata = get_form_data(req)
+class RequestFields:
+    """Read-only index of a request's query string (GET) or form (PUT) fields
+
+    Built in one pass the first time a responder asks for a field, then kept
+    on the request. Holds the first value of each field both by its exact
+    name and by its lowercased name.
+    """
+    def __init__(self):
+        self._exact = {}
+        self._caseless = {}
+
+    def _add(self, name: str, value: str):
+        if name not in self._exact:
+            self._exact[name] = value
+            lcName = name.lower()
+            if lcName not in self._caseless:
+                self._caseless[lcName] = value
+
+    @classmethod
+    def from_query(cls, query_params):
+        fields = cls()
+        for name, values in query_params._storage.items():     # Raw values, not HTML-escaped
+            fields._add(name, values[0])
+        return fields
+
+    @classmethod
+    def from_form(cls, body: bytes):
+        """Parse an ``application/x-www-form-urlencoded`` body"""
+        fields = cls()
+        if b'%' in body or b'+' in body:
+            for pair in body.split(b'&'):
+                if pair:                        # Skip empty pairs ('&&', trailing '&')
+                    kv = pair.split(b'=', 1)
+                    fields._add(_unquote(kv[0]), _unquote(kv[1]) if len(kv) > 1 else '')
+        else:                                   # Nothing escaped, split the decoded text
+            for pair in _decode(body).split('&'):
+                if pair:
+                    kv = pair.split('=', 1)
+                    fields._add(kv[0], kv[1] if len(kv) > 1 else '')
+        return fields
+
+    def get(self, name: str, caseless: bool = False) -> str:
         if caseless:
-            for fn in formdata.keys():
-                if fn.lower() == lcName:
-                    return formdata[fn]
+            return self._caseless.get(name.lower())
+        return self._exact.get(name)
+
+    def __repr__(self) -> str:
+        return f'{self._exact}'
+
+def _hexval(c: int) -> int:
+    if 48 <= c <= 57:                           # 0-9
+        return c - 48
+    c |= 0x20                                   # Fold to lower case
+    if 97 <= c <= 102:                          # a-f
+        return c - 87
+    return -1
+
+def _decode(raw) -> str:
+    try:
+        return str(raw, 'utf-8')
+    except UnicodeError:
+        raise InvalidPathError(_bad_title, 'Form field is not valid UTF-8')
+
+def _unquote(raw: bytes) -> str:
+    """Decode %XX escapes and '+' in a form field name or value
+
+    A '%' not followed by two hex digits is kept as is. Raises
+    ``InvalidPathError`` (400) if the result is not valid UTF-8.
+    """
+    if b'%' not in raw and b'+' not in raw:
+        return _decode(raw)
+    out = bytearray()
+    i = 0
+    n = len(raw)
+    while i < n:
+        c = raw[i]
+        if c == 43:                             # '+'
+            out.append(32)
+        elif c == 37 and i + 2 < n:             # '%XX'
+            hi = _hexval(raw[i + 1])
+            lo = _hexval(raw[i + 2])
+            if hi >= 0 and lo >= 0:
+                out.append((hi << 4) | lo)
+                i += 2
+            else:
+                out.append(c)
         else:
-            if name in formdata and formdata[name] != '':
-                return formdata[name]
-        if default == None:
-            raise InvalidPathError(_bad_title, bad_desc)                # Missing or incorrect casing
+            out.append(c)
+        i += 1
+    return _decode(out)
+
+_FORM_TYPE = 'application/x-www-form-urlencoded'
+
+def get_request_fields(req: Request) -> RequestFields:
+    fields = getattr(req, '_alpaca_fields', None)
+    if fields is None:
+        if req.method == 'GET':
+            fields = RequestFields.from_query(req.query_params)
+        elif req.headers.get_directive('Content-Type') == _FORM_TYPE:
+            fields = RequestFields.from_form(req.body)
+        else:                                   # Alpaca PUTs are always form encoded
+            fields = RequestFields()
+        req._alpaca_fields = fields
+    return fields
+
+def get_request_field(name: str, req: Request, caseless: bool = False, default: str = None) -> str:
+    fields = get_request_fields(req)
+    if req.method == 'GET' or caseless:         # GET is always caseless
+        val = fields.get(name, True)
+    else:
+        val = fields.get(name)
+        if val == '':                           # Empty PUT field counts as missing
+            val = None
+    if val is None:
+        if default == None:                     # Missing or incorrect casing
+            raise InvalidPathError(_bad_title, f'Missing, empty, or misspelled parameter "{name}"')
         return default
-    
-def get_form_data(req: Request):
-    if req._form_data == None: # adafruit_httpserver only parses form data on POST, so we have to do it manually ourselves
-        req._form_data = FormData(req.body, req.headers, debug=req.server.debug)
-    return req.form_data
+    return val
 
 #
 # Log the request as soon as the resource handler gets it so subsequent
 # logged messages are in the right order. Logs PUT body as well.
 #
 def log_request(req: Request):
-    msg = f'{req.client_address} -> {req.method} {req.path}'
-    logger.info(msg)
-    if req.method == 'PUT' and req.body.count != 0:
-        logger.info(f'{req.client_address} -> {get_form_data(req)}')
+    logger.info('%s -> %s %s', req.client_address, req.method, req.path)
+    if req.method == 'PUT' and req.body:
+        try:
+            logger.info('%s -> %s', req.client_address, get_request_fields(req))
+        except InvalidPathError:                # Malformed, PreProcessRequest will 400 it
+            logger.info('%s -> %s', req.client_address, req.body)
 
 # ------------------------------------------------
 # Incoming Pre-Logging and Request Quality Control
@@ -209,7 +301,7 @@ class PropertyResponse():
         self.ClientTransactionID = int(get_request_field('ClientTransactionID', req, False, 0))  #Caseless on GET
         if err.Number == 0 and not value is None:
             self.Value = value
-            logger.info(f'{req.client_address} <- {str(value)}')
+            logger.info('%s <- %s', req.client_address, value)
         self.ErrorNumber = err.Number
         self.ErrorMessage = err.Message
 
@@ -257,7 +349,7 @@ class MethodResponse():
         self.ClientTransactionID = int(get_request_field('ClientTransactionID', req, False, 0))
         if err.Number == 0 and not value is None:
             self.Value = value
-            logger.info(f'{req.client_address} <- {str(value)}')
+            logger.info('%s <- %s', req.client_address, value)
         self.ErrorNumber = err.Number
         self.ErrorMessage = err.Message
 
@@ -284,6 +376,197 @@ class MethodResponse():
         return response_obj
 
 
+# -------------------------
+# Alpaca JSON Response Body
+# -------------------------
+# PropertyResponse and MethodResponse bodies are written straight into one
+# preallocated buffer instead of going through .dict and json.dumps(). The
+# output is byte for byte what json.dumps() gives for .dict. Anything that
+# does not fit the buffer, or a Value with no fast path here (dicts, lists of
+# dicts), is handed to json.dumps() as before.
+RESPONSE_BUFFER_BYTES = 1024
+
+_buf = bytearray(RESPONSE_BUFFER_BYTES)
+_view = memoryview(_buf)
+
+class _Overflow(Exception):
+    pass
+
+def _put(pos: int, data: bytes) -> int:
+    end = pos + len(data)
+    if end > RESPONSE_BUFFER_BYTES:
+        raise _Overflow()
+    _view[pos:end] = data
+    return end
+
+_state_names = {}               # StateValue name -> b'{"Name": "name", "Value": '
+
+def _state_name(name) -> bytes:
+    prefix = _state_names.get(name)
+    if prefix is None:
+        prefix = b'{"Name": ' + json.dumps(name).encode() + b', "Value": '
+        if isinstance(name, str):
+            _state_names[name] = prefix
+    return prefix
+
+def _put_value(pos: int, value) -> int:
+    if value is True:
+        return _put(pos, b'true')
+    if value is False:
+        return _put(pos, b'false')
+    if value is None:
+        return _put(pos, b'null')
+    if isinstance(value, int):
+        return _put(pos, str(value).encode())
+    if isinstance(value, float) and value - value == 0.0:    # Finite; NaN/inf spellings differ by port
+        return _put(pos, repr(value).encode())
+    if isinstance(value, str):
+        return _put(pos, json.dumps(value).encode() if value else b'""')
+    if isinstance(value, list):
+        if not value:
+            return _put(pos, b'[]')
+        pos = _put(pos, b'[')
+        for i, item in enumerate(value):
+            if i:
+                pos = _put(pos, b', ')
+            if isinstance(item, StateValue):
+                pos = _put(pos, _state_name(item.Name))
+                pos = _put(_put_value(pos, item.Value), b'}')
+            else:
+                pos = _put_value(pos, item)
+        return _put(pos, b']')
+    return _put(pos, json.dumps(value).encode())
+
+def encode_response(resp) -> memoryview:
+    """JSON body for a ``PropertyResponse`` or ``MethodResponse``
+
+    Returns a view of the shared buffer, valid until the next call, or
+    bytes if the body did not fit.
+    """
+    try:
+        pos = _put(0, b'{"ServerTransactionID": ')
+        pos = _put(pos, str(resp.ServerTransactionID).encode())
+        pos = _put(pos, b', "ClientTransactionID": ')
+        pos = _put(pos, str(resp.ClientTransactionID).encode())
+        pos = _put(pos, b', "ErrorNumber": ')
+        pos = _put(pos, str(resp.ErrorNumber).encode())
+        pos = _put(pos, b', "ErrorMessage": ')
+        pos = _put_value(pos, resp.ErrorMessage)
+        if hasattr(resp, 'Value'):
+            pos = _put(pos, b', "Value": ')
+            pos = _put_value(pos, resp.Value)
+        pos = _put(pos, b'}')
+    except _Overflow:
+        return json.dumps(resp.dict).encode('utf-8')
+    return _view[:pos]
+
+class AlpacaResponse(Response):
+    """Sends a ``PropertyResponse`` or ``MethodResponse`` as JSON
+
+    Use in place of ``JSONResponse(req, resp.dict)``.
+    """
+    def __init__(self, req: Request, resp):
+        super().__init__(req)
+        self._resp = resp
+
+    def _send(self) -> None:
+        body = encode_response(self._resp)
+        self._send_headers(len(body), 'application/json')
+        self._send_bytes(self._request.connection, body)
+        self._close_connection()
+
+# ------------------------------
+# Pre-serialized Constant Values
+# ------------------------------
+# Members like Name, DriverInfo or the management ConfiguredDevices list never
+# change while the device runs, so their response is serialized once when the
+# responder module is imported. Only the two transaction IDs at the front of
+# the body differ between requests. (DeviceState uses the same thing for each
+# snapshot, see StateSnapshot.)
+class StaticProperty:
+    """A property value serialized once
+
+    ``tail`` is everything in the response body after ClientTransactionID,
+    exactly as ``json.dumps(PropertyResponse(value, req).dict)`` writes it.
+    """
+    def __init__(self, value):
+        self.value = value
+        try:
+            pos = _put(0, b', "ErrorNumber": 0, "ErrorMessage": "", "Value": ')
+            self.tail = bytes(_view[:_put(_put_value(pos, value), b'}')])
+        except _Overflow:
+            if isinstance(value, list):
+                value = [{'Name': v.Name, 'Value': v.Value} if isinstance(v, StateValue) else v
+                            for v in value]
+            body = json.dumps({'ErrorNumber': 0, 'ErrorMessage': '', 'Value': value})
+            self.tail = b', ' + body[1:].encode('utf-8')
+
+class StaticResponse(Response):
+    """Sends a :py:class:`StaticProperty` as a successful property response
+
+    Use in place of ``AlpacaResponse(req, PropertyResponse(value, req))``.
+    """
+    def __init__(self, req: Request, prop: StaticProperty):
+        super().__init__(req)
+        self._stid = getNextTransId()
+        self._ctid = int(get_request_field('ClientTransactionID', req, False, 0))
+        self._tail = prop.tail
+        logger.info('%s <- %s', req.client_address, prop.value)
+
+    def encode(self):
+        """JSON body, as a view of the shared buffer like ``encode_response()``"""
+        try:
+            pos = _put(0, b'{"ServerTransactionID": ')
+            pos = _put(pos, str(self._stid).encode())
+            pos = _put(pos, b', "ClientTransactionID": ')
+            pos = _put(pos, str(self._ctid).encode())
+            return _view[:_put(pos, self._tail)]
+        except _Overflow:
+            return (f'{{"ServerTransactionID": {self._stid}, '
+                    f'"ClientTransactionID": {self._ctid}').encode() + self._tail
+
+    def _send(self) -> None:
+        body = self.encode()
+        self._send_headers(len(body), 'application/json')
+        self._send_bytes(self._request.connection, body)
+        self._close_connection()
+
+# ------------------------
+# Shared DeviceState Value
+# ------------------------
+# Several clients may poll DeviceState at once. Rather than read and encode
+# the device state for each of them, one snapshot is taken and sent to every
+# reader until it is too old or the device reports a change.
+class StateSnapshot:
+    """DeviceState value shared by concurrent readers
+
+    ``capture()`` returns the device's list of :py:class:`StateValue`, all
+    read at one instant. ``get(changes)`` returns it as a
+    :py:class:`StaticProperty`, taking a new snapshot only if the last one
+    is ``interval`` seconds old or ``changes`` (the device's count of moves
+    started and stopped, syncs etc.) is not what it was then.
+    """
+    def __init__(self, capture, interval: float, clock = monotonic):
+        self._capture = capture
+        self.interval = interval
+        self._clock = clock
+        self._prop = None
+        self._taken = 0.0
+        self._changes = None
+        self.captures = 0
+        self.reads = 0
+
+    def get(self, changes: int) -> StaticProperty:
+        self.reads += 1
+        now = self._clock()
+        if self._prop is None or changes != self._changes or now - self._taken >= self.interval:
+            self._prop = StaticProperty(self._capture())
+            self._taken = now
+            self._changes = changes
+            self.captures += 1
+        return self._prop
+
+
 _stid = 0
 
 def getNextTransId() -> int:
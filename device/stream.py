@@ -0,0 +1,182 @@
+from adafruit_logging import Logger
+import asyncio
+from errno import EAGAIN
+from time import monotonic
+from adafruit_httpserver import Request, SSEResponse
+
+logger: Logger = None
+
+MAX_BACKLOG_BYTES = 1024        # Unsent event text before a stream is given up on
+
+class EventStream(SSEResponse):
+    """One client's server-sent event stream.
+
+    A responder returns it like any other response. The server sends the
+    headers and then leaves the connection open for the stream, which
+    :py:class:`StreamHub` writes events to. ``min_interval`` is the least
+    time between two state events, ``heartbeat`` the longest the stream is
+    left silent (an SSE comment line keeps proxies and the client's read
+    timeout happy).
+
+    Writes never block the event loop. Whatever the socket will not take is
+    kept and sent first next time, and no new state event is started until
+    it has gone. A client that still has not taken it when the next
+    heartbeat is due, or lets ``MAX_BACKLOG_BYTES`` pile up, is cut off.
+    """
+    def __init__(self, request: Request, min_interval: float, heartbeat: float):
+        super().__init__(request)
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.dirty = True               # Send the current state first
+        self.closed = False
+        self.last_event = None          # When the last state event was sent
+        self.last_write = 0.0
+        self._backlog = b''
+
+    @property
+    def backlogged(self) -> bool:
+        return len(self._backlog) > 0
+
+    def write(self, data: bytes = b'') -> bool:
+        """Send ``data`` after any backlog, as far as the socket takes it.
+
+        Returns:
+            False if the stream is (now) closed.
+        """
+        if self.closed:
+            return False
+        if data:
+            self._backlog += data
+        try:
+            while self._backlog:
+                sent = self._request.connection.send(self._backlog)
+                self._backlog = self._backlog[sent:]
+        except OSError as ex:
+            if ex.errno != EAGAIN:
+                self.close()
+                return False
+        if len(self._backlog) > MAX_BACKLOG_BYTES:
+            logger.warning('%s event stream backlog full, closing', self._request.client_address)
+            self.close()
+            return False
+        return True
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._request.connection.hang_up()
+
+class StreamHub:
+    """Sends a device's state to all of its open event streams.
+
+    ``notify()`` is the device's change hook. It only flags the streams and
+    wakes ``run()``; the state is read (``encode()``, which returns the
+    event's JSON text) once per pass and the same event sent to every
+    stream whose ``min_interval`` has passed. Changes within a stream's
+    ``min_interval`` are folded into one event carrying the latest state.
+    ``pump()`` does the work for a given time, so it can be driven with a
+    simulated clock.
+    """
+    def __init__(self, encode, max_streams: int, clock = monotonic):
+        self._encode = encode
+        self.max_streams = max_streams
+        self._clock = clock
+        self._streams = []
+        self._wake = asyncio.Event()
+        self._seq = 0
+        self._due = None
+        #
+        # Counters
+        #
+        self.notifications = 0
+        self.events_sent = 0
+        self.heartbeats_sent = 0
+
+    @property
+    def streams(self) -> int:
+        return len(self._streams)
+
+    def add(self, stream: EventStream) -> bool:
+        """Start sending to ``stream``; False if there are already ``max_streams``"""
+        self._streams = [s for s in self._streams if not s.closed]
+        if len(self._streams) >= self.max_streams:
+            return False
+        stream.last_write = self._clock()
+        self._streams.append(stream)
+        self._wake_now()
+        return True
+
+    def notify(self) -> None:
+        self.notifications += 1
+        wake = False
+        for stream in self._streams:
+            if not stream.dirty:
+                stream.dirty = True
+                wake = True
+        if wake:
+            self._wake_now()
+
+    def _wake_now(self) -> None:
+        # Due now, so the I/O loop polls without blocking until run() has pumped
+        self._due = self._clock()
+        self._wake.set()
+
+    def pump(self, now: float) -> float:
+        """Send the events and heartbeats due by ``now``
+
+        Returns:
+            When the next one is due, or None if nothing is waiting.
+        """
+        event = None
+        due = None
+        streams = []
+        for stream in self._streams:
+            if not stream.write():                  # Flush any backlog
+                continue
+            if stream.dirty and not stream.backlogged:
+                ready = now if stream.last_event is None else stream.last_event + stream.min_interval
+                if now >= ready:
+                    if event is None:
+                        self._seq += 1
+                        event = f'id: {self._seq}\nevent: state\ndata: {self._encode()}\n\n'.encode()
+                    stream.dirty = False
+                    stream.last_event = stream.last_write = now
+                    self.events_sent += 1
+                    if not stream.write(event):
+                        continue
+            if now - stream.last_write >= stream.heartbeat:
+                if stream.backlogged:
+                    logger.warning('%s event stream stalled, closing', stream._request.client_address)
+                    stream.close()
+                    continue
+                stream.last_write = now
+                self.heartbeats_sent += 1
+                if not stream.write(b': heartbeat\n\n'):
+                    continue
+            streams.append(stream)
+            ready = stream.last_write + stream.heartbeat
+            if stream.backlogged:
+                ready = min(ready, now + 0.1)       # Try the socket again shortly
+            elif stream.dirty:
+                ready = min(ready, stream.last_event + stream.min_interval)
+            if due is None or ready < due:
+                due = ready
+        self._streams = streams
+        return due
+
+    def next_due(self) -> float:
+        """When ``run()`` next has an event or heartbeat to send, or None"""
+        return self._due
+
+    async def run(self):
+        """Event stream task"""
+        while True:
+            due = self._due = self.pump(self._clock())
+            self._wake.clear()
+            if due is None:
+                await self._wake.wait()
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, due - self._clock()))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,14 @@
+"""Host stand-in for ``adafruit_connection_manager``.
+
+The real library works out which socketpool module goes with a radio;
+on the host there is only the one.
+"""
+from socketpool import SocketPool
+
+_pools = {}
+
+
+def get_radio_socketpool(radio):
+    if radio not in _pools:
+        _pools[radio] = SocketPool(radio)
+    return _pools[radio]
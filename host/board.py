@@ -0,0 +1,22 @@
+"""Host stand-in for CircuitPython's ``board`` module.
+
+Any pin name (``board.D6``, ``board.LED`` ...) is a ``Pin``; there is no
+hardware behind them.
+"""
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'board.{self.name}'
+
+
+_pins = {}
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    return _pins.setdefault(name, Pin(name))
@@ -0,0 +1,227 @@
+"""Build a precompiled CIRCUITPY bundle from device/.
+
+CircuitPython compiles every imported ``.py`` on the board at each boot,
+which takes seconds and, while it runs, a parse tree's worth of heap. This
+compiles every module in ``device/`` to ``.mpy`` with ``mpy-cross`` ahead
+of time. ``boot.py`` and ``code.py`` stay as source, since CircuitPython
+only runs them under those names. The bundle also gets ``config.toml``.
+
+Before anything is written the build checks that
+ - mpy-cross accepts every module (it is CircuitPython's compiler, so this
+   catches syntax the board does not have), and each ``.mpy`` has the
+   expected format version
+ - every module imports on CPython with the host/ stand-ins for the
+   CircuitPython modules, in dependency order
+and stops with a non-zero exit if either fails.
+
+It then prints a report per module: source and ``.mpy`` size, and two
+heap figures measured on CPython while importing with the stand-ins: the
+peak while compiling the source (which the board no longer pays) and what
+the module keeps once imported (which it still does). The CPython figures
+are larger than the board's but in proportion. ``/diagnostics/memory``
+and the startup log line give the board's own startup time and free heap.
+
+Use the mpy-cross that matches the board's CircuitPython version (from
+https://adafruit-circuit-python.s3.amazonaws.com/index.html?prefix=bin/mpy-cross/)
+or set MPY_CROSS. ``--drive`` copies the bundle to a mounted CIRCUITPY
+drive. It removes each ``.py`` that now has an ``.mpy``, because an old
+``.py`` would be imported instead. It leaves an existing ``config.toml``
+alone.
+
+    python host/build.py --mpy-cross ~/bin/mpy-cross-9.2 --drive /media/$USER/CIRCUITPY
+"""
+import argparse
+import ast
+import gc
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+DEVICE_DIR = os.path.abspath(os.path.join(HOST_DIR, '..', 'device'))
+SOURCE_ONLY = ('boot.py', 'code.py')     # Run by name, cannot be .mpy
+DATA_FILES = ('config.toml',)
+
+
+def modules() -> list:
+    return sorted(f[:-3] for f in os.listdir(DEVICE_DIR) if f.endswith('.py') and f not in SOURCE_ONLY)
+
+
+def imports(name: str, names: set) -> tuple:
+    """Top-level imports of a module: (device modules, everything else)"""
+    with open(os.path.join(DEVICE_DIR, name + '.py')) as f:
+        tree = ast.parse(f.read())
+    local, other = set(), set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            found = [a.name.split('.')[0] for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            found = [node.module.split('.')[0]]
+        else:
+            continue
+        for mod in found:
+            (local if mod in names else other).add(mod)
+    local.discard(name)
+    return local, other
+
+
+def import_order(names: list) -> tuple:
+    """Device modules with each after the ones it imports, and the outside imports"""
+    deps, outside = {}, set()
+    for name in names:
+        deps[name], other = imports(name, set(names))
+        outside |= other
+    order, done = [], set()
+    while len(order) < len(names):
+        ready = [n for n in names if n not in done and deps[n] <= done]
+        if not ready:                               # A cycle, Python copes; take the rest as they come
+            ready = [n for n in names if n not in done]
+        for n in ready:
+            order.append(n)
+            done.add(n)
+    return order, sorted(outside)
+
+
+def compile_mpy(mpy_cross: str, name: str, out_dir: str, version: int) -> str:
+    """Compile one module; returns an error message or None"""
+    out = os.path.join(out_dir, name + '.mpy')
+    result = subprocess.run([mpy_cross, '-s', name + '.py', '-o', out, os.path.join(DEVICE_DIR, name + '.py')],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return (result.stderr or result.stdout).strip()
+    with open(out, 'rb') as f:
+        header = f.read(2)
+    if len(header) < 2 or header[0] != ord('M'):
+        return 'output is not an .mpy file'
+    if header[1] != version:
+        return f'.mpy format version {header[1]}, the board needs {version}'
+    return None
+
+
+def measure(order: list, outside: list) -> dict:
+    """Import every module on CPython with the stand-ins.
+
+    Returns:
+        ``{name: (compile peak, heap kept) or error text}``. Libraries are
+        imported first, and what they allocate later (toml's regular
+        expressions on first use, say) is left out, so it is not charged
+        to the first module that uses them.
+    """
+    sys.path[:0] = [HOST_DIR, DEVICE_DIR]
+    drive = tempfile.mkdtemp(prefix='alpyca-build-')
+    cwd = os.getcwd()
+    shutil.copy(os.path.join(DEVICE_DIR, 'config.toml'), drive)
+    os.chdir(drive)                         # config.py reads ./config.toml at import
+    results = {}
+    try:
+        libs = []
+        for lib in outside:
+            try:
+                mod = importlib.import_module(lib)
+            except ImportError:
+                continue                    # Reported against the module that needs it
+            path = getattr(mod, '__file__', None)
+            if path:
+                libs.append(tracemalloc.Filter(False, os.path.dirname(path) + os.sep + '*'
+                                               if path.endswith('__init__.py') else path, all_frames=True))
+        for name in order:
+            with open(os.path.join(DEVICE_DIR, name + '.py')) as f:
+                source = f.read()
+            tracemalloc.start()
+            compile(source, name + '.py', 'exec')
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            gc.collect()
+            tracemalloc.start(32)
+            try:
+                importlib.import_module(name)
+            except Exception as ex:
+                results[name] = f'{type(ex).__name__}: {ex}'
+                continue
+            finally:
+                gc.collect()
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            results[name] = (peak, sum(t.size for t in snapshot.filter_traces(libs).traces))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(drive, ignore_errors=True)
+    return results
+
+
+def deploy(bundle: str, drive: str, compiled: list):
+    for name in compiled:
+        stale = os.path.join(drive, name + '.py')
+        if os.path.exists(stale):
+            os.remove(stale)
+            print(f'removed {stale}')
+    for f in sorted(os.listdir(bundle)):
+        target = os.path.join(drive, f)
+        if f in DATA_FILES and os.path.exists(target):
+            print(f'kept {target}')
+            continue
+        shutil.copy(os.path.join(bundle, f), target)
+    print(f'copied to {drive}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--mpy-cross', default=os.environ.get('MPY_CROSS', 'mpy-cross'),
+                    help='mpy-cross to compile with (default $MPY_CROSS or mpy-cross on the PATH)')
+    ap.add_argument('--mpy-version', type=int, default=6, help='.mpy format the board loads (6 for CircuitPython 8 and 9)')
+    ap.add_argument('-o', '--out', default=os.path.join(HOST_DIR, '..', 'dist', 'CIRCUITPY'),
+                    help='bundle directory, emptied first')
+    ap.add_argument('--drive', help='mounted CIRCUITPY drive to copy the bundle to')
+    args = ap.parse_args()
+
+    names = modules()
+    order, outside = import_order(names)
+    staging = tempfile.mkdtemp(prefix='alpyca-mpy-')
+    failed = False
+    try:
+        for name in names:
+            try:
+                err = compile_mpy(args.mpy_cross, name, staging, args.mpy_version)
+            except FileNotFoundError:
+                sys.exit(f'{args.mpy_cross} not found, see --mpy-cross')
+            if err:
+                print(f'{name}.py: {err}')
+                failed = True
+        results = measure(order, outside)
+        for name in order:
+            if isinstance(results[name], str):
+                print(f'{name}.py does not import: {results[name]}')
+                failed = True
+        if failed:
+            sys.exit(1)
+
+        if os.path.isdir(args.out):
+            shutil.rmtree(args.out)
+        os.makedirs(args.out)
+        for name in names:
+            shutil.move(os.path.join(staging, name + '.mpy'), args.out)
+        for f in SOURCE_ONLY + DATA_FILES:
+            shutil.copy(os.path.join(DEVICE_DIR, f), args.out)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    print(f'{"module":<16} {"source":>8} {".mpy":>8} {"compile peak":>13} {"heap kept":>10}')
+    totals = [0, 0, 0, 0]
+    for name in order:
+        row = [os.path.getsize(os.path.join(DEVICE_DIR, name + '.py')),
+               os.path.getsize(os.path.join(args.out, name + '.mpy'))] + list(results[name])
+        totals = [t + v for t, v in zip(totals, row)]
+        print(f'{name:<16} {row[0]:>8} {row[1]:>8} {row[2]:>13} {row[3]:>10}')
+    print(f'{"total":<16} {totals[0]:>8} {totals[1]:>8} {max(r[0] for r in results.values()):>13} {totals[3]:>10}')
+    print('(bytes; compile peak total is the largest one, as modules compile one at a time)')
+    print(f'bundle in {os.path.abspath(args.out)}')
+    if args.drive:
+        deploy(args.out, args.drive, names)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Host stand-in for CircuitPython's ``digitalio`` module.
+
+Inputs read their pull (False when floating or pulled down, True when
+pulled up); outputs read back what was written.
+"""
+
+
+class Direction:
+    INPUT = 'INPUT'
+    OUTPUT = 'OUTPUT'
+
+
+class Pull:
+    UP = 'UP'
+    DOWN = 'DOWN'
+
+
+class DriveMode:
+    PUSH_PULL = 'PUSH_PULL'
+    OPEN_DRAIN = 'OPEN_DRAIN'
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.drive_mode = DriveMode.PUSH_PULL
+        self._value = False
+
+    @property
+    def value(self) -> bool:
+        if self.direction == Direction.INPUT:
+            return self.pull == Pull.UP
+        return self._value
+
+    @value.setter
+    def value(self, value: bool):
+        if self.direction == Direction.INPUT:
+            raise AttributeError('Cannot set value when direction is input.')
+        self._value = bool(value)
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.drive_mode = drive_mode
+        self._value = bool(value)
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
@@ -0,0 +1,57 @@
+"""Run the device app on a Linux host.
+
+Puts the stand-ins in this directory ahead of everything else on
+``sys.path``, followed by ``device/``. It then runs ``boot.py`` and
+``code.py`` unmodified, the way CircuitPython does at power-up. The app
+runs in a scratch directory in RAM that holds a copy of ``config.toml``
+and plays the part of the CIRCUITPY drive. The server listens on
+127.0.0.1 at the configured port unless ``--address`` says otherwise.
+
+Needs the libraries the board gets from circup, installed with pip::
+
+    pip install -r host/requirements.txt
+    python host/run.py --writable
+"""
+import argparse
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+DEVICE_DIR = os.path.join(HOST_DIR, '..', 'device')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--address', default='127.0.0.1', help='address to serve on')
+    ap.add_argument('--config', default=os.path.join(DEVICE_DIR, 'config.toml'),
+                    help='config.toml to run with')
+    ap.add_argument('--writable', action='store_true',
+                    help='let the app write to its drive (enables the log file)')
+    ap.add_argument('--keep', action='store_true', help='keep the scratch drive on exit')
+    args = ap.parse_args()
+
+    sys.path[:0] = [HOST_DIR, os.path.abspath(DEVICE_DIR)]
+    import storage
+    import wifi
+    storage.remount('/', readonly=not args.writable)
+    wifi.radio.ipv4_address = args.address
+
+    drive = tempfile.mkdtemp(prefix='alpyca-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    shutil.copy(args.config, os.path.join(drive, 'config.toml'))
+    os.chdir(drive)
+    print(f'CIRCUITPY drive is {drive}')
+    try:
+        runpy.run_path(os.path.join(DEVICE_DIR, 'boot.py'))
+        runpy.run_path(os.path.join(DEVICE_DIR, 'code.py'), run_name='__main__')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if not args.keep:
+            shutil.rmtree(drive, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
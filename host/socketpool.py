@@ -0,0 +1,41 @@
+"""Host stand-in for CircuitPython's ``socketpool`` module.
+
+Hands out real BSD sockets, which already have the methods the device
+code uses (``recv_into``, ``recvfrom_into``, ``sendto``, ``setblocking``
+...). Non-blocking calls that would block raise ``BlockingIOError``, an
+``OSError`` with errno EAGAIN, just as CircuitPython's sockets do.
+"""
+import socket as _socket
+
+
+class SocketPool:
+    AF_INET = _socket.AF_INET
+    AF_INET6 = _socket.AF_INET6
+    SOCK_STREAM = _socket.SOCK_STREAM
+    SOCK_DGRAM = _socket.SOCK_DGRAM
+    SOCK_RAW = _socket.SOCK_RAW
+    SOL_SOCKET = _socket.SOL_SOCKET
+    SO_REUSEADDR = _socket.SO_REUSEADDR
+    SO_BROADCAST = _socket.SO_BROADCAST
+    IPPROTO_IP = _socket.IPPROTO_IP
+    IPPROTO_IPV6 = _socket.IPPROTO_IPV6
+    IPPROTO_TCP = _socket.IPPROTO_TCP
+    IPPROTO_UDP = _socket.IPPROTO_UDP
+    IP_MULTICAST_TTL = _socket.IP_MULTICAST_TTL
+    IP_ADD_MEMBERSHIP = _socket.IP_ADD_MEMBERSHIP
+    IPV6_JOIN_GROUP = _socket.IPV6_JOIN_GROUP
+    IPV6_MULTICAST_HOPS = _socket.IPV6_MULTICAST_HOPS
+    IPV6_V6ONLY = _socket.IPV6_V6ONLY
+    TCP_NODELAY = _socket.TCP_NODELAY
+    EAI_NONAME = _socket.EAI_NONAME
+
+    gaierror = _socket.gaierror
+
+    def __init__(self, radio=None):
+        self.radio = radio
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM, proto=0):
+        return _socket.socket(family, type, proto)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        return _socket.getaddrinfo(host, port, family, type, proto, flags)
@@ -0,0 +1,26 @@
+"""Host stand-in for CircuitPython's ``storage`` module.
+
+The launcher runs the app in a scratch directory in RAM (``/dev/shm`` where
+there is one) holding a copy of ``config.toml``; that directory plays the
+part of the CIRCUITPY drive. Whether the code may write to it (and so keep
+a log file) is set by the launcher, read-only by default as on a board.
+"""
+
+
+class VfsFat:
+    def __init__(self, readonly=True):
+        self.readonly = readonly
+        self.label = 'CIRCUITPY'
+
+
+_root = VfsFat()
+
+
+def getmount(mount_path):
+    if mount_path != '/':
+        raise OSError(19, 'No such device')     # ENODEV
+    return _root
+
+
+def remount(mount_path, readonly=False, *, disable_concurrent_write_protection=False):
+    getmount(mount_path).readonly = readonly
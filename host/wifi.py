@@ -0,0 +1,26 @@
+"""Host stand-in for CircuitPython's ``wifi`` module.
+
+The host is already on the network, so ``connect()`` does nothing and
+``radio.ipv4_address`` is the address the server binds to (127.0.0.1
+unless the launcher is told otherwise). ``radio.mac_address`` is the
+host's.
+"""
+import uuid
+
+
+class Radio:
+    def __init__(self):
+        self.enabled = True
+        self.hostname = 'alpyca-host'
+        self.ipv4_address = '127.0.0.1'
+        self.mac_address = uuid.getnode().to_bytes(6, 'big')
+        self.connected = False
+
+    def connect(self, ssid=None, password=None, *, channel=0, bssid=None, timeout=None):
+        self.connected = True
+
+    def stop_station(self):
+        self.connected = False
+
+
+radio = Radio()